@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+リゾルババックエンド（dns_backend.py）の問い合わせ処理量の計測
+
+応答を組み立てずにバイト列をそのまま返す軽量な反射サーバを子プロセスで起動し、
+クライアント側の1コアあたりの処理量（問い合わせ数 / クライアントのCPU秒）を比べる。
+tests/dns_standin.py は応答毎に dnspython で組み立てるため、そちらを相手にするとサーバ側が先に詰まる。
+
+    python benchmarks/bench_backend.py --names 50000 --output artifacts/bench-backend.json
+
+    resolve_many     UdpBackend.resolve_many で A をまとめて問い合わせる
+    batch_udp        fqdn2ips.BatchResolver(backend="udp")（キャッシュ・メトリクス込みで A/AAAA）
+    batch_dnspython  fqdn2ips.BatchResolver（従来の ResolverPool）
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "src")]
+
+log = logging.getLogger(__name__)
+
+MODES = ["resolve_many", "batch_udp", "batch_dnspython"]
+
+
+# --- 反射サーバ ---
+
+def reflect(sock: socket.socket) -> None:
+    """
+    問い合わせをそのまま応答に作り替えて返す
+
+    A には問い合わせIDから作った 10.x.y.z を1件返し、それ以外の種別は NODATA、
+    "nx" で始まる名前は NXDOMAIN にする。EDNS0 の OPT は落とす。
+    """
+    head = struct.Struct("!HHHHH")
+    rr = struct.Struct("!HHIH")
+    while True:
+        wire, addr = sock.recvfrom(4096)
+        if len(wire) < 17:
+            continue
+        end = 12
+        while wire[end]:
+            end += 1 + wire[end]
+        qtype = wire[end + 1] << 8 | wire[end + 2]
+        question = wire[12:end + 5]
+        if wire[13:15] == b"nx":
+            sock.sendto(wire[:2] + head.pack(0x8583, 1, 0, 0, 0) + question, addr)
+        elif qtype == 1:
+            answer = b"\xc0\x0c" + rr.pack(1, 1, 300, 4) + b"\x0a" + wire[:2] + b"\x01"
+            sock.sendto(wire[:2] + head.pack(0x8580, 1, 1, 0, 0) + question + answer, addr)
+        else:
+            sock.sendto(wire[:2] + head.pack(0x8580, 1, 0, 0, 0) + question, addr)
+
+
+def start_reflector() -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "--reflect"], stdout=subprocess.PIPE, text=True,
+    )
+    proc.port = int(proc.stdout.readline())
+    return proc
+
+
+# --- 計測 ---
+
+def names_for(n: int) -> List[str]:
+    # 1割は存在しない名前
+    return [f"nx{i}.bench.test" if i % 10 == 9 else f"h{i}.bench.test" for i in range(n)]
+
+
+def measure(fn: Callable[[], int], queries: int) -> Dict:
+    cpu, wall = time.process_time(), time.perf_counter()
+    found = fn()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {
+        "queries": queries,
+        "found": found,
+        "elapsed_s": round(wall, 3),
+        "qps": round(queries / wall, 1),
+        "cpu_s": round(cpu, 3),
+        "qps_per_cpu": round(queries / cpu, 1) if cpu else 0.0,
+    }
+
+
+def run_mode(mode: str, port: int, n: int, concurrency: int) -> Dict:
+    from dns_backend import UdpBackend
+    from dns_cache import CachingResolver, DNSCache
+    from fqdn2ips import BatchResolver
+
+    names = names_for(n)
+    if mode == "resolve_many":
+        backend = UdpBackend(["127.0.0.1"], port=port, timeout=1, max_inflight=concurrency)
+
+        def go() -> int:
+            return sum(1 for _, _, res in backend.resolve_many((f, "A") for f in names)
+                       if not isinstance(res, Exception) and res.rrset)
+
+        res = measure(go, n)
+        res.update(backend.stats())
+        backend.close()
+        return res
+
+    engine = BatchResolver(
+        ["127.0.0.1"], concurrency=concurrency, port=port, timeout=1, lifetime=3,
+        resolver=CachingResolver(["127.0.0.1"], cache=DNSCache(), port=port),
+        backend="udp" if mode == "batch_udp" else "dnspython",
+    )
+
+    async def drain() -> int:
+        return sum([1 async for _, ips in engine.stream(names) if ips])
+
+    res = measure(lambda: asyncio.run(drain()), 2 * n)
+    if engine.backend is not None:
+        res.update(engine.backend.stats())
+    engine.close()
+    return res
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="リゾルババックエンドの処理量の計測")
+    p.add_argument("--modes", default=",".join(MODES), help="計測する方式（カンマ区切り）")
+    p.add_argument("--names", type=int, default=20000, help="問い合わせる名前の数")
+    p.add_argument("--concurrency", type=int, default=1000, help="同時に応答を待つ問い合わせ数の上限")
+    p.add_argument("--output", default="artifacts/bench-backend.json", help="結果の JSON")
+    p.add_argument("--reflect", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.reflect:
+        # 子プロセス: ポート番号を出力して応答し続ける
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        sock.bind(("127.0.0.1", 0))
+        print(sock.getsockname()[1], flush=True)
+        reflect(sock)
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    server = start_reflector()
+    results: Dict[str, Dict] = {}
+    try:
+        for mode in modes:
+            res = run_mode(mode, server.port, args.names, args.concurrency)
+            results[mode] = res
+            log.info(
+                f"{mode:16s} {res['elapsed_s']}s {res['qps']} qps "
+                f"({res['qps_per_cpu']} per client CPU second) found={res['found']}"
+            )
+    finally:
+        server.kill()
+        server.wait()
+
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {"names": args.names, "concurrency": args.concurrency},
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    log.info(f"saved: {out}")
+
+
+if __name__ == "__main__":
+    main()
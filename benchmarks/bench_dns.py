@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ローカルの DNS スタンドインを相手にした列挙・解決のベンチマーク
+
+合成ゾーン（数千ホスト・多段の委任・ワイルドカード）を tests/dns_standin.py で配信し、
+DomainEnumerator.run / fqdn2ips のバッチ解決（dnspython・udp バックエンド） / パイプライン全体 を計測する。
+各シナリオは子プロセスで実行し、ピークRSSがシナリオごとに分かれるようにする。
+
+    python benchmarks/bench_dns.py --hosts 2000 --depth 3 --latency 0.005 --loss 0.01 \\
+        --output artifacts/bench.json
+    python benchmarks/bench_dns.py --compare artifacts/bench-old.json artifacts/bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "src"), str(ROOT / "tests")]
+
+import dns.resolver  # noqa: E402
+
+from dns_cache import CachingResolver, DNSCache  # noqa: E402
+from dns_standin import StandinServer, StandinZoneData  # noqa: E402
+
+log = logging.getLogger(__name__)
+
+SCENARIOS = ["enumerate", "enumerate_async", "resolve", "resolve_udp", "pipeline"]
+# 委任ゾーンのラベル（DomainEnumerator.DELEGATION_LABELS に含まれるもの）
+ZONE_LABELS = ["dev", "stage", "api", "app", "cdn", "static", "blog", "shop"]
+
+
+# --- 合成ゾーン ---
+
+def synthetic_zone(
+    root: str = "bench.test", hosts: int = 1000, depth: int = 3, wildcard: bool = True
+) -> Tuple[StandinZoneData, List[str], List[str]]:
+    """
+    root から depth 段の委任チェーンを作り、hosts 件のホストを各ゾーンへ振り分ける
+
+    Returns:
+        (ゾーンデータ, ワードリスト用のラベル, 存在するFQDN)
+    """
+    d = StandinZoneData()
+    zones = [root]
+    for i in range(depth):
+        zones.append(f"{ZONE_LABELS[i % len(ZONE_LABELS)]}.{zones[-1]}")
+    for z in zones:
+        d.add_zone(z)
+        d.add(z, "NS", f"ns1.{root}.")
+    d.add(f"ns1.{root}", "A", "127.0.0.1")
+    d.add(root, "A", "192.0.2.1")
+    labels = [f"h{i:05d}" for i in range(hosts)]
+    fqdns = []
+    for i, label in enumerate(labels):
+        fqdn = f"{label}.{zones[i % len(zones)]}"
+        d.add(fqdn, "A", f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+        if i % 4 == 0:
+            d.add(fqdn, "AAAA", f"2001:db8::{i:x}")
+        fqdns.append(fqdn)
+    if wildcard:
+        # 最も深いゾーンはワイルドカード応答を返す
+        d.add(f"*.{zones[-1]}", "A", "192.0.2.250")
+    return d, labels, fqdns
+
+
+# --- 計測 ---
+
+class TimedResolver(CachingResolver):
+    """キャッシュミス時の問い合わせごとの所要時間を記録する CachingResolver"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.samples: List[float] = []
+
+    def _make(self, cls):
+        r = super()._make(cls)
+        if cls is dns.resolver.Resolver:
+            inner = r.resolve
+
+            def timed(*a, **kw):
+                start = time.perf_counter()
+                try:
+                    return inner(*a, **kw)
+                finally:
+                    self.samples.append(time.perf_counter() - start)
+
+            r.resolve = timed
+        return r
+
+    async def _aquery(self, name: str, rdtype: str, query) -> List[str]:
+        start = time.perf_counter()
+        try:
+            return await super()._aquery(name, rdtype, query)
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+
+def peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト単位
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_scenario(name: str, port: int, params: Dict) -> Dict:
+    """1つのシナリオを実行し、所要時間・発見数・問い合わせ遅延を返す"""
+    root = params["root"]
+    _, labels, fqdns = synthetic_zone(root, params["hosts"], params["depth"], params["wildcard"])
+    resolver = TimedResolver(["127.0.0.1"], cache=DNSCache(), port=port, timeout=1, lifetime=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        wordlist = Path(tmp) / "words.txt"
+        wordlist.write_text("\n".join(labels) + "\n", encoding="utf-8")
+        start = time.perf_counter()
+        if name == "enumerate":
+            from domain2fqdns import DomainEnumerator
+
+            en = DomainEnumerator(root, resolver=resolver, wordlist=wordlist)
+            en.authoritative_port = port
+            found = len(en.run()["fqdns"])
+        elif name == "enumerate_async":
+            from async_enum import AsyncDomainEnumerator
+
+            en = AsyncDomainEnumerator(
+                root, concurrency=params["concurrency"], rate_per_ns=0,
+                nameservers=["127.0.0.1"], port=port, timeout=1, lifetime=3,
+                resolver=resolver, wordlist=wordlist,
+            )
+            en.authoritative_port = port
+            found = len(en.run()["fqdns"])
+        elif name in ("resolve", "resolve_udp"):
+            from fqdn2ips import BatchResolver
+
+            # 存在しない名前も1割混ぜる
+            names = fqdns + [f"nx{i}.{root}" for i in range(len(fqdns) // 10)]
+            engine = BatchResolver(
+                ["127.0.0.1"], concurrency=params["concurrency"], port=port,
+                timeout=1, lifetime=3, resolver=resolver,
+                backend="udp" if name == "resolve_udp" else "dnspython",
+            )
+
+            async def drain() -> int:
+                return sum([1 async for _, ips in engine.stream(names) if ips])
+
+            found = asyncio.run(drain())
+        elif name == "pipeline":
+            from pipeline import Pipeline
+
+            pipe = Pipeline(
+                root, io.StringIO(), nameservers=["127.0.0.1"], port=port,
+                concurrency=params["concurrency"], rate_per_ns=0, wordlist=wordlist,
+                resolver=resolver,
+            )
+            pipe.enumerator.authoritative_port = port
+            found = asyncio.run(pipe.run())["resolved"]
+        else:
+            raise ValueError(f"unknown scenario: {name}")
+        elapsed = time.perf_counter() - start
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "found": found,
+        "client_queries": len(resolver.samples),
+        "p50_ms": round(percentile(resolver.samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(resolver.samples, 99) * 1000, 2),
+        "cache": resolver.stats(),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def bench(scenarios: List[str], params: Dict, timeout: float) -> Dict:
+    """スタンドインを起動し、各シナリオを子プロセスで計測する"""
+    data, _, _ = synthetic_zone(params["root"], params["hosts"], params["depth"], params["wildcard"])
+    results: Dict[str, Dict] = {}
+    with StandinServer(data, latency=params["latency"], loss=params["loss"], seed=params["seed"]) as srv:
+        for name in scenarios:
+            before = srv.queries
+            cmd = [
+                sys.executable, __file__, "--run-scenario", name,
+                "--port", str(srv.port), "--params", json.dumps(params),
+            ]
+            log.info(f"{name}: running")
+            try:
+                proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                results[name] = {"error": f"timeout after {timeout}s"}
+                continue
+            if proc.returncode != 0:
+                results[name] = {"error": proc.stderr.strip().splitlines()[-1:]}
+                continue
+            res = json.loads(proc.stdout.strip().splitlines()[-1])
+            res["queries"] = srv.queries - before
+            res["qps"] = round(res["queries"] / res["elapsed_s"], 1) if res["elapsed_s"] else 0.0
+            results[name] = res
+            log.info(
+                f"{name}: {res['elapsed_s']}s {res['queries']} queries {res['qps']} qps "
+                f"p50={res['p50_ms']}ms p99={res['p99_ms']}ms rss={res['peak_rss_kb']}KB"
+            )
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    """2つの結果ファイルの qps / p99 / RSS を並べて表示する"""
+    old = json.loads(Path(old_path).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for name, res in new["results"].items():
+        prev = old["results"].get(name)
+        if not prev or "error" in prev or "error" in res:
+            print(f"{name:16s} (比較不可)")
+            continue
+        cells = []
+        for key in ("qps", "elapsed_s", "p99_ms", "peak_rss_kb"):
+            ratio = res[key] / prev[key] if prev[key] else 0.0
+            cells.append(f"{key}={prev[key]}->{res[key]} ({ratio:.2f}x)")
+        print(f"{name:16s} " + "  ".join(cells))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="ローカル DNS スタンドインによるベンチマーク")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS), help="実行するシナリオ（カンマ区切り）")
+    p.add_argument("--hosts", type=int, default=1000, help="合成ゾーンのホスト数")
+    p.add_argument("--depth", type=int, default=3, help="委任の段数")
+    p.add_argument("--no-wildcard", dest="wildcard", action="store_false", help="ワイルドカードを置かない")
+    p.add_argument("--latency", type=float, default=0.0, help="応答の遅延（秒）")
+    p.add_argument("--loss", type=float, default=0.0, help="応答を落とす割合")
+    p.add_argument("--concurrency", type=int, default=200, help="並行版の同時クエリ数")
+    p.add_argument("--seed", type=int, default=0, help="パケットロスの乱数シード")
+    p.add_argument("--timeout", type=float, default=600, help="シナリオごとの制限時間（秒）")
+    p.add_argument("--output", default="artifacts/bench.json", help="結果の JSON")
+    p.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="2つの結果を比較して終了")
+    p.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    p.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--params", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.run_scenario:
+        # 子プロセス: 結果を1行の JSON で返す
+        logging.disable(logging.CRITICAL)
+        print(json.dumps(run_scenario(args.run_scenario, args.port, json.loads(args.params))))
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    params = {
+        "root": "bench.test", "hosts": args.hosts, "depth": args.depth,
+        "wildcard": args.wildcard, "latency": args.latency, "loss": args.loss,
+        "concurrency": args.concurrency, "seed": args.seed,
+    }
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": params,
+        "results": bench(scenarios, params, args.timeout),
+    }
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    log.info(f"saved: {out}")
+
+
+if __name__ == "__main__":
+    main()
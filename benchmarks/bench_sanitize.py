@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+レポート匿名化のスループット計測
+
+合成したレポート（ドメイン・IP・会社名・日本語の混在した行）を一時ファイルに書き、
+sanitize() で全文を一度に処理する場合と StreamSanitizer でチャンクごとに処理する場合の
+MB/s とピークRSSを比べる。各方式は子プロセスで実行する。
+
+    python benchmarks/bench_sanitize.py --mb 50 --output artifacts/bench-sanitize.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "examples")]
+
+from sanitize_report import sanitize, sanitize_file  # noqa: E402
+
+log = logging.getLogger(__name__)
+
+MODES = ["sanitize", "stream", "stream_pseudonyms"]
+
+LINE_TEMPLATES = [
+    "[+] {host} -> {ip} (AS{asn} 株式会社{org})",
+    "スキャン元IPアドレス: {ip}",
+    "  https://{host}/login  status=200 title=ログイン",
+    "{ip}\t{host}\t{host2}",
+    "対象: 株式会社{org} / 管理者: admin@{host}",
+    "  - 備考: ポート 443/tcp open, 証明書の CN は {host}",
+]
+
+
+def synthetic_report(size: int, seed: int = 0) -> Iterator[str]:
+    """おおよそ size 文字の合成レポートを1行ずつ返す"""
+    rng = random.Random(seed)
+    words = ["www", "mail", "vpn", "api", "dev", "portal", "cdn", "static", "a1", "x-gw"]
+    zones = ["foresight-net.co.jp", "example-corp.jp", "acme.co.jp", "shop.example.net", "corp.local"]
+    orgs = ["テスト", "サンプル", "Foo", "ABC商事", "xyz"]
+    total = 0
+    while total < size:
+        line = rng.choice(LINE_TEMPLATES).format(
+            host=f"{rng.choice(words)}{rng.randint(0, 999)}.{rng.choice(zones)}",
+            host2=f"{rng.choice(words)}.{rng.choice(zones)}",
+            ip=".".join(str(rng.randint(1, 254)) for _ in range(4)),
+            asn=rng.randint(1000, 65000),
+            org=rng.choice(orgs),
+        )
+        total += len(line) + 1
+        yield line + "\n"
+
+
+class NullWriter:
+    def __init__(self) -> None:
+        self.chars = 0
+
+    def write(self, s: str) -> int:
+        self.chars += len(s)
+        return len(s)
+
+
+def peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト単位
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_mode(mode: str, path: Path, chunk_size: int) -> Dict:
+    """1つの方式で path を匿名化し、所要時間とピークRSSを返す"""
+    size_mb = path.stat().st_size / 1e6
+    start = time.perf_counter()
+    if mode == "sanitize":
+        out = sanitize(path.read_text(encoding="utf-8")).strip()
+        written = len(out)
+    else:
+        # 出力は数えて捨てる（書き出し先のメモリは計測に含めない）
+        sink = NullWriter()
+        sanitize_file(path, sink, chunk_size, pseudonyms=mode == "stream_pseudonyms")
+        written = sink.chars
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "mb_per_s": round(size_mb / elapsed, 2) if elapsed else 0.0,
+        "output_chars": written,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="レポート匿名化のスループット計測")
+    p.add_argument("--mb", type=float, default=20, help="合成レポートの大きさ（MB相当の文字数）")
+    p.add_argument("--chunk-size", type=int, default=1 << 20, help="ストリーミング時の読込単位（文字）")
+    p.add_argument("--modes", default=",".join(MODES), help="計測する方式（カンマ区切り）")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--output", default="artifacts/bench-sanitize.json", help="結果の JSON")
+    p.add_argument("--run-mode", help=argparse.SUPPRESS)
+    p.add_argument("--input", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, Path(args.input), args.chunk_size)))
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "raw_report.txt"
+        # 親プロセスで全文を持つと子のピークRSSに引き継がれるので、1行ずつ書く
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(synthetic_report(int(args.mb * 1e6), args.seed))
+        log.info(f"input: {path.stat().st_size / 1e6:.1f} MB")
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            cmd = [
+                sys.executable, __file__, "--run-mode", mode, "--input", str(path),
+                "--chunk-size", str(args.chunk_size),
+            ]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                results[mode] = {"error": proc.stderr.strip().splitlines()[-1:]}
+                continue
+            res = results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+            log.info(f"{mode}: {res['elapsed_s']}s {res['mb_per_s']} MB/s rss={res['peak_rss_kb']}KB")
+
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {"mb": args.mb, "chunk_size": args.chunk_size, "seed": args.seed},
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    log.info(f"saved: {out}")
+
+
+if __name__ == "__main__":
+    main()
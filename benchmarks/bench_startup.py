@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CLI の起動時間とモジュールの import 時間の計測
+
+各モジュールの import と代表的なコマンド（--help、--demo など）を新しいプロセスで繰り返し実行し、
+所要時間の中央値と、読み込まれた重い依存（dnspython・asyncio・requests・dotenv・playwright・
+http.server）を JSON に記録する。シェルから何千回も呼ぶ使い方での起動コストを追うためのもの。
+
+    python benchmarks/bench_startup.py --repeat 10 --output artifacts/bench-startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+
+log = logging.getLogger(__name__)
+
+# 起動時に読み込まれていないことを確認したいパッケージ
+HEAVY = ("dns", "asyncio", "requests", "dotenv", "playwright", "http.server", "sqlite3")
+
+MODULES = ["domain2fqdns", "fqdn2ips", "html_fetcher", "metrics", "asn_db", "name_store"]
+
+COMMANDS: Dict[str, List[str]] = {
+    "python": ["-c", "pass"],
+    "cli_help": ["-m", "src", "--help"],
+    "enum_help": ["-m", "src", "enum", "--help"],
+    "enum_demo": ["-m", "src", "enum", "--demo", "--domain", "example.com"],
+    "resolve_help": ["-m", "src", "resolve", "--help"],
+}
+
+# 子プロセスで import して、所要時間と読み込まれた重い依存を出す
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+heavy = sorted({{h for h in {heavy!r} for m in sys.modules if m == h or m.startswith(h + ".")}})
+import logging
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy, "log_handlers": len(logging.root.handlers)}}))
+"""
+
+
+def probe_import(module: str) -> Dict:
+    """新しいプロセスで module を import し、{"ms", "heavy", "log_handlers"} を返す"""
+    code = _PROBE.format(src=str(SRC), module=module, heavy=HEAVY)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def time_command(args: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], capture_output=True, cwd=ROOT, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(repeat: int) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    for module in MODULES:
+        samples = [probe_import(module) for _ in range(repeat)]
+        if any("error" in s for s in samples):
+            results[f"import:{module}"] = next(s for s in samples if "error" in s)
+            continue
+        results[f"import:{module}"] = {
+            "median_ms": round(statistics.median(s["ms"] for s in samples), 1),
+            "heavy": samples[0]["heavy"],
+        }
+    for name, args in COMMANDS.items():
+        try:
+            samples = [time_command(args) for _ in range(repeat)]
+        except subprocess.CalledProcessError as e:
+            results[name] = {"error": f"exit {e.returncode}"}
+            continue
+        results[name] = {"median_ms": round(statistics.median(samples), 1)}
+    return results
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="CLI の起動時間の計測")
+    p.add_argument("--repeat", type=int, default=10, help="各項目の実行回数")
+    p.add_argument("--output", default="artifacts/bench-startup.json", help="結果の JSON")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    results = bench(args.repeat)
+    for name, res in results.items():
+        extra = f" heavy={','.join(res['heavy']) or '-'}" if "heavy" in res else ""
+        log.info(f"{name:22s} {res.get('median_ms', res.get('error'))} ms{extra}")
+
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "params": {"repeat": args.repeat},
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    log.info(f"saved: {out}")
+
+
+if __name__ == "__main__":
+    main()
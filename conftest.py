@@ -2,6 +2,6 @@ from pathlib import Path
 import sys
 
 root = Path(__file__).resolve().parent
-examples_dir = root / "examples"
-if str(examples_dir) not in sys.path:
-    sys.path.insert(0, str(examples_dir))
+for d in (root / "examples", root / "src"):
+    if str(d) not in sys.path:
+        sys.path.insert(0, str(d))
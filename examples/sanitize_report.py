@@ -2,9 +2,22 @@
 # -*- coding: utf-8 -*-
 """
 実レポート(raw_report.txt)を匿名化して anonymized_report.md を生成するツール
+
+数百MBのレポートは StreamSanitizer で一定サイズずつ読み、1回の走査で置換する。
+出力は sanitize() と同一。--pseudonyms を付けると、ドメイン・IPを一律の値ではなく
+元の値ごとに一貫した仮名へ置き換える。
 """
+import argparse
+import ipaddress
 import re
+import sys
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, TextIO
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "src")]
+
+from public_suffix import registrable_domain  # noqa: E402
 
 SRC = Path("examples/raw_report.txt")
 DST = Path("examples/anonymized_report.md")
@@ -34,15 +47,258 @@ def sanitize(text: str) -> str:
 
     return text
 
+
+# --- ストリーミング版 ---
+#
+# sanitize() の4回の置換は前の置換結果に対して次の規則が効くので、規則ごとの
+# 結果を単純に合成すると一致しない（例: "a.株式会社X" は会社名の置換後に
+# "a.ACME" がドメインとして置換される）。ここでは1つの正規表現で
+#   会社名 / スキャン元IPの前置き / ドメイン文字 [A-Za-z0-9.-] の連なり（直後の会社名を含む）
+# を切り出し、連なりの内側でだけ元の規則を順に当てる。連なりは改行を跨がないので、
+# 改行の直後で区切れば読み込み単位の境界で結果が変わらない。
+
+COMPANY = r"株式会社[一-龠ぁ-んァ-ンA-Za-z0-9]+"
+# 繰り返しの直後に来る文字はその文字クラスに含まれないので、欲張りの繰り返しでも後戻りしない
+SCAN_PREFIX = r"スキャン元IPアドレス[\s:]*"
+IPV4 = r"\b\d{1,3}(?:\.\d{1,3}){3}\b"
+# 英字の前の [0-9.-] の連なりを後戻りせずに読み飛ばす先読み（先読みで取った連なりを後方参照で読み、
+# 3.11 より前でも使える形で所有的な繰り返し *+ の代わりにする）
+ALPHA_AHEAD = r"(?=(?=(?P<lead>[0-9.-]*))(?P=lead)[A-Za-z])"
+
+# ドット無しの連なりはどの規則にも掛からないので、ドットを含む連なりだけを先頭から切り出す
+_RUN = rf"(?P<run>[A-Za-z0-9-]*\.[A-Za-z0-9.-]*)(?P<tail>{COMPANY})?"
+_TOKEN = re.compile(
+    rf"(?P<company>{COMPANY})"
+    rf"|(?P<scan>{SCAN_PREFIX})(?={IPV4})"
+    rf"|(?<![A-Za-z0-9.-]){_RUN}"
+)
+# 会社名の直後から始まる連なり（直前が英数字でも置換後は「社」に続く）
+_RUN_AT = re.compile(_RUN)
+# sanitize() のドメイン規則と同じ意味で、先読みが後戻りしない形
+_DOMAIN = re.compile(rf"{ALPHA_AHEAD}[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+")
+_IPV4 = re.compile(IPV4)
+_LEADING_IPV4 = re.compile(r"\d{1,3}(?:\.\d{1,3}){3}")
+_HAS_ALPHA = re.compile(r"[A-Za-z]")
+_PLAIN = re.compile(
+    rf"(?P<domain>{ALPHA_AHEAD}[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+)|\d{{1,3}}(?:\.\d{{1,3}}){{3}}"
+)
+_UNSAFE_TAIL = re.compile(r"スキャン元IPアドレス[\s:]*\Z")
+
+SCAN_SOURCE_IP = "198.51.100.5"
+OTHER_IP = "203.0.113.10"
+# 仮名のIPを割り当てる帯（198.18.0.0/15 のベンチマーク用、使い切ったら 240.0.0.0/4 の将来利用の予約帯）
+PSEUDONYM_NETWORKS = (ipaddress.ip_network("198.18.0.0/15"), ipaddress.ip_network("240.0.0.0/4"))
+
+
+def _is_word(ch: str) -> bool:
+    # re の \w と同じ判定（空文字は境界扱い）
+    return ch.isalnum() or ch == "_"
+
+
+class StreamSanitizer:
+    """
+    チャンク単位で匿名化する
+
+    feed() に渡した文字列のうち確定した部分を返し、残りは次の feed()/close() まで持つ。
+    保持するのは最後の安全な区切り（改行の直後）以降だけなので、
+    メモリは chunk_size と最長行の長さで抑えられる。
+
+    Args:
+        pseudonyms: True ならドメイン・IPを元の値ごとの仮名にする（sanitize() とは異なる出力）。
+            ドメインは登録可能ドメイン（www.a.co.jp なら a.co.jp）ごとに exampleN.com にし、
+            その下のラベルだけを残す
+    """
+
+    def __init__(self, pseudonyms: bool = False) -> None:
+        self.pseudonyms = pseudonyms
+        self._buf = ""
+        # 仮名の対応（元の値 → 仮名）。同じ値は常に同じ仮名になる
+        self._bases: Dict[str, int] = {}
+        self._ips: Dict[str, str] = {}
+
+    # --- 置換規則 ---
+
+    def _domain(self, m: re.Match) -> str:
+        parts = m.group(0).split(".")
+        if not self.pseudonyms:
+            return (parts[0] + ".example.com") if len(parts) >= 3 else "example.com"
+        name = m.group(0).lower()
+        # 組織の単位（公開接尾辞の1つ下）で仮名を決め、そのラベルは出力に残さない
+        base = registrable_domain(name) or name
+        n = self._bases.setdefault(base, len(self._bases) + 1)
+        sub = name[:-len(base)]
+        return f"{sub}example{n}.com"
+
+    def _ip(self, m: re.Match) -> str:
+        if not self.pseudonyms:
+            return OTHER_IP
+        ip = m.group(0)
+        alias = self._ips.get(ip)
+        if alias is None:
+            alias = self._ips[ip] = self._ip_alias(len(self._ips) + 1)
+        return alias
+
+    @staticmethod
+    def _ip_alias(n: int) -> str:
+        """n 番目の仮名のIP。予約帯を使い切ったら別のIPと同じ仮名にはせず止める"""
+        for net in PSEUDONYM_NETWORKS:
+            if n < net.num_addresses:
+                return str(net[n])
+            n -= net.num_addresses
+        raise ValueError("仮名に使えるIPアドレスを使い切りました")
+
+    def _run(self, text: str, m: re.Match, scan: bool, after_company: bool) -> str:
+        """ドメイン文字の連なり1つに ドメイン → IP の規則を順に当てる"""
+        run, tail = m.group("run"), m.group("tail")
+        if not (tail or scan or after_company):
+            # よくある形（ドメイン1つ・前後が区切りのIP1つ）は規則を当てずに置き換える
+            plain = _PLAIN.fullmatch(run)
+            if plain is not None:
+                if plain.group("domain") is not None:
+                    return self._domain(plain)
+                start, end = m.start(), m.end()
+                if not (start and _is_word(text[start - 1])) and not _is_word(text[end:end + 1]):
+                    return self._ip(plain)
+        # 会社名の置換後の文字列として扱う
+        body = run + "ACME" if tail else run
+        lead = ""
+        if scan:
+            ip = _LEADING_IPV4.match(body).group(0)
+            if self.pseudonyms:
+                lead, body = SCAN_SOURCE_IP, body[len(ip):]
+            else:
+                body = SCAN_SOURCE_IP + body[len(ip):]
+        # 前後の1文字は \b の判定のためだけに付ける（置換後の文字列ではどちらもドメイン文字ではない）
+        start, end = m.start(), m.end("run")
+        if lead or after_company:
+            before = lead[-1:] or "社"
+        else:
+            before = text[start - 1] if start else ""
+        after = "株" if tail else text[end:end + 1]
+        s = before + body + after
+        if _HAS_ALPHA.search(s):
+            s = _DOMAIN.sub(self._domain, s)
+        s = _IPV4.sub(self._ip, s)
+        out = lead + s[len(before):len(s) - len(after)]
+        return out + "株式会社" if tail else out
+
+    def _scan(self, text: str) -> str:
+        out = []
+        pos = 0
+        scan = False
+        while True:
+            m = _TOKEN.search(text, pos)
+            if m is None:
+                break
+            out.append(text[pos:m.start()])
+            pos = m.end()
+            if m.group("scan") is not None:
+                out.append(m.group("scan"))
+                scan = True
+                continue
+            if m.group("company") is not None:
+                out.append("ACME株式会社")
+                company = True
+            else:
+                out.append(self._run(text, m, scan, False))
+                company = m.group("tail") is not None
+            scan = False
+            while company and text[pos:pos + 1] in (".", "-"):
+                m = _RUN_AT.match(text, pos)
+                if m is None:
+                    break
+                out.append(self._run(text, m, False, True))
+                pos = m.end()
+                company = m.group("tail") is not None
+        out.append(text[pos:])
+        return "".join(out)
+
+    # --- ストリーム ---
+
+    def _cut(self) -> int:
+        """先頭から匿名化してよい長さ（改行の直後で、スキャン元IPの前置きを分断しない位置）"""
+        buf = self._buf
+        cut = buf.rfind("\n")
+        while cut >= 0:
+            # 前置きと IP の間の空白が 4096 文字を超える入力は想定しない
+            if not _UNSAFE_TAIL.search(buf, max(0, cut + 1 - 4096), cut + 1):
+                return cut + 1
+            cut = buf.rfind("\n", 0, cut)
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        self._buf += chunk
+        cut = self._cut()
+        if not cut:
+            return ""
+        head, self._buf = self._buf[:cut], self._buf[cut:]
+        return self._scan(head)
+
+    def close(self) -> str:
+        head, self._buf = self._buf, ""
+        return self._scan(head)
+
+    def stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        for chunk in chunks:
+            out = self.feed(chunk)
+            if out:
+                yield out
+        out = self.close()
+        if out:
+            yield out
+
+
+def read_chunks(f: TextIO, chunk_size: int = 1 << 20) -> Iterator[str]:
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def sanitize_file(
+    src: Path, dst: TextIO, chunk_size: int = 1 << 20, pseudonyms: bool = False
+) -> None:
+    """src を匿名化して dst へ書く。前後の空白を落とす点も含めて main() の出力と同じ"""
+    pending = ""
+    started = False
+    with open(src, encoding="utf-8") as f:
+        for out in StreamSanitizer(pseudonyms).stream(read_chunks(f, chunk_size)):
+            if not started:
+                out = out.lstrip()
+                if not out:
+                    continue
+                started = True
+            # 末尾の空白は後に続く文字が来るまで書かずに持っておく
+            body = out.rstrip()
+            if body:
+                dst.write(pending + body)
+                pending = out[len(body):]
+            else:
+                pending += out
+
+
 def main() -> None:
-    if not SRC.exists():
-        raise SystemExit("examples/raw_report.txt がありません。")
-    raw = SRC.read_text(encoding="utf-8")
-    out = sanitize(raw).strip()
-
-    md = f"# ORG2VULN REPORT (Anonymized Sample)\n\n```\n{out}\n```\n"
-    DST.write_text(md, encoding="utf-8")
-    print(f"Sanitized -> {DST}")
+    p = argparse.ArgumentParser(description="レポートの匿名化")
+    p.add_argument("--input", default=str(SRC), help="元のレポート")
+    p.add_argument("--output", default=str(DST), help="匿名化した Markdown（- で標準出力）")
+    p.add_argument("--chunk-size", type=int, default=1 << 20, help="1回に読む文字数")
+    p.add_argument("--pseudonyms", action="store_true", help="ドメイン・IPを値ごとの仮名にする")
+    args = p.parse_args()
+
+    src = Path(args.input)
+    if not src.exists():
+        raise SystemExit(f"{src} がありません。")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        dst.write("# ORG2VULN REPORT (Anonymized Sample)\n\n```\n")
+        sanitize_file(src, dst, args.chunk_size, args.pseudonyms)
+        dst.write("\n```\n")
+    finally:
+        if dst is not sys.stdout:
+            dst.close()
+    if dst is not sys.stdout:
+        print(f"Sanitized -> {args.output}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各ツールをサブコマンドでまとめた CLI
+
+    python -m src enum --domain example.com
+    python -m src resolve --batch --input fqdns.txt
+    python src pipeline --domain example.com
+
+サブコマンドのモジュールは選ばれた時に初めて読み込む。残りの引数はそのモジュールの main() がそのまま解釈する。
+"""
+
+import sys
+from pathlib import Path
+
+# src/ のモジュールは互いにトップレベル名で import し合う
+SRC = Path(__file__).resolve().parent
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+PROG = "python -m src"
+
+# サブコマンド → (モジュール, 説明)
+COMMANDS = {
+    "enum": ("domain2fqdns", "ドメイン→FQDN探索"),
+    "resolve": ("fqdn2ips", "FQDN→IP/ISP解決"),
+    "vt": ("html_fetcher", "VirusTotalスクレイピング補完"),
+    "pipeline": ("pipeline", "ドメイン→FQDN→IP の一括ストリーミング実行"),
+    "schedule": ("scheduler", "複数 apex ドメインの一括列挙"),
+    "rescan": ("rescan", "前回結果との差分スキャン"),
+    "cache": ("persistent_cache", "永続キャッシュの統計・削除"),
+    "asn": ("asn_db", "IP→ASN/ISP 索引の作成・検索"),
+    "ct": ("ct_logs", "CTログのエクスポートから候補を取込み"),
+}
+
+
+def usage() -> str:
+    width = max(map(len, COMMANDS))
+    lines = [f"usage: {PROG} <command> [args...]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {desc}" for name, (_, desc) in COMMANDS.items()]
+    lines += ["", f"各コマンドの引数は {PROG} <command> --help で表示します。"]
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    cmd = COMMANDS.get(argv[0])
+    if cmd is None:
+        print(f"{PROG}: unknown command {argv[0]!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    import importlib
+
+    module = importlib.import_module(cmd[0])
+    # argparse の prog と残りの引数をサブコマンドの main() に渡す
+    sys.argv = [f"{PROG} {argv[0]}", *argv[1:]]
+    module.main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
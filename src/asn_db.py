@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+オフラインの IP → ASN/ISP 検索
+
+iptoasn の TSV（ip2asn-v4.tsv / ip2asn-combined.tsv、.gz 可）や MaxMind の ASN データベース
+（.mmdb、maxminddb がある場合のみ）を、開始アドレスでソートした区間表の索引ファイルへ変換する。
+索引は mmap で開いて配列のまま二分探索するので、読込みは一瞬でメモリもほとんど使わない。
+
+    python src/asn_db.py build ip2asn-combined.tsv.gz --output artifacts/asn.idx
+    python src/asn_db.py lookup --db artifacts/asn.idx 1.1.1.1 2606:4700::1111
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import gzip
+import ipaddress
+import json
+import logging
+import mmap
+import socket
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"ASNIDX1\0"
+# マジック, バイト順（0=little 1=big）, IPv4 区間数, IPv6 区間数, レコード数
+_HEADER = struct.Struct("<8sB3xIII")
+# IPv4 の上位16ビット毎に区間番号の範囲を引く表（二分探索の範囲を数件に絞る）
+DIR_BITS = 16
+INDEX_DIR = Path("artifacts")
+# lookup() の結果を覚えておく IP の数
+CACHE_SIZE = 1 << 16
+_MISSING = object()
+
+# (開始, 終了, レコード番号)
+Range = Tuple[int, int, int]
+
+
+class AsnInfo:
+    """1つの IP の検索結果"""
+
+    __slots__ = ("asn", "as_name", "country", "prefix")
+
+    def __init__(self, asn: int, as_name: str, country: str, prefix: str) -> None:
+        self.asn = asn
+        self.as_name = as_name
+        self.country = country
+        self.prefix = prefix
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"asn": self.asn, "as_name": self.as_name, "country": self.country, "prefix": self.prefix}
+
+    def __repr__(self) -> str:
+        return f"AsnInfo(AS{self.asn} {self.prefix} {self.as_name!r} {self.country})"
+
+
+# --- 元データの読込み ---
+
+def _open_text(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def read_iptoasn(path: Path) -> Iterator[Tuple[str, str, int, str, str]]:
+    """iptoasn の TSV（開始, 終了, AS番号, 国, AS名）を返す。AS0（未ルーティング）は除く"""
+    with _open_text(path) as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 5 or not cols[2].isdigit():
+                continue
+            asn = int(cols[2])
+            if asn:
+                yield cols[0], cols[1], asn, cols[3], cols[4]
+
+
+def read_mmdb(path: Path) -> Iterator[Tuple[str, str, int, str, str]]:
+    """MaxMind ASN 形式の .mmdb を iptoasn と同じ形で返す（maxminddb が必要）"""
+    try:
+        import maxminddb
+    except ImportError:
+        raise SystemExit("mmdb を読むには maxminddb が必要です（pip install maxminddb）")
+    with maxminddb.open_database(str(path)) as reader:
+        for network, rec in reader:
+            asn = (rec or {}).get("autonomous_system_number")
+            if asn:
+                yield (
+                    str(network.network_address), str(network.broadcast_address), int(asn),
+                    "", (rec.get("autonomous_system_organization") or ""),
+                )
+
+
+# --- 索引の作成 ---
+
+def build_index(src: Path, dst: Path) -> int:
+    """src（TSV/.gz/.mmdb）から索引ファイル dst を作り、区間数を返す"""
+    rows = read_mmdb(src) if src.suffix == ".mmdb" else read_iptoasn(src)
+    records: List[Tuple[int, str, str]] = []
+    rec_ids: Dict[Tuple[int, str, str], int] = {}
+    v4: List[Range] = []
+    v6: List[Range] = []
+    for start, end, asn, country, name in rows:
+        try:
+            a, b = ipaddress.ip_address(start), ipaddress.ip_address(end)
+        except ValueError:
+            continue
+        if a.version != b.version or int(a) > int(b):
+            continue
+        key = (asn, country, name)
+        rid = rec_ids.get(key)
+        if rid is None:
+            rid = rec_ids[key] = len(records)
+            records.append(key)
+        (v4 if a.version == 4 else v6).append((int(a), int(b), rid))
+    v4.sort()
+    v6.sort()
+
+    mask = (1 << 64) - 1
+    starts = [r[0] for r in v4]
+    shift = 32 - DIR_BITS
+    sections = [
+        array("I", (bisect.bisect_left(starts, h << shift) for h in range((1 << DIR_BITS) + 1))),
+        array("I", starts), array("I", (r[1] for r in v4)), array("I", (r[2] for r in v4)),
+        array("Q", (r[0] >> 64 for r in v6)), array("Q", (r[0] & mask for r in v6)),
+        array("Q", (r[1] >> 64 for r in v6)), array("Q", (r[1] & mask for r in v6)),
+        array("I", (r[2] for r in v6)),
+    ]
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, sys.byteorder == "big", len(v4), len(v6), len(records)))
+        for arr in sections:
+            # 配列は8バイト境界に置く（mmap 上でそのまま cast する）
+            f.write(b"\0" * (-f.tell() % 8))
+            arr.tofile(f)
+        f.write(json.dumps(records, ensure_ascii=False).encode("utf-8"))
+    tmp.replace(dst)
+    log.info(f"ASN index: {len(v4)} IPv4 + {len(v6)} IPv6 ranges, {len(records)} records -> {dst}")
+    return len(v4) + len(v6)
+
+
+def is_index(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# --- 検索 ---
+
+class AsnDatabase:
+    """
+    mmap した索引ファイルへの IP → ASN 検索
+
+    区間の開始・終了は型つき配列のまま memoryview で参照し、bisect で探す。
+    IPv6 は上位・下位64ビットに分けて持ち、上位が同じ範囲の中で下位を二分探索する。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, big, n4, n6, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: not an ASN index")
+        if bool(big) != (sys.byteorder == "big"):
+            raise ValueError(f"{self.path}: built on a machine with different byte order; rebuild it")
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+        sections = []
+        n_dir = (1 << DIR_BITS) + 1
+        for fmt, size, n in (("I", 4, n_dir),) + (("I", 4, n4),) * 3 + (("Q", 8, n6),) * 4 + (("I", 4, n6),):
+            pos += -pos % 8
+            sections.append(view[pos:pos + size * n].cast(fmt))
+            pos += size * n
+        (self._dir4, self._start4, self._end4, self._rec4,
+         self._shi6, self._slo6, self._ehi6, self._elo6, self._rec6) = sections
+        self._records = [tuple(r) for r in json.loads(bytes(view[pos:]).decode("utf-8"))]
+        self._views = [view] + sections
+        self._cache: Dict[str, Optional[AsnInfo]] = {}
+
+    @classmethod
+    def open(cls, path: Path, index_dir: Path = INDEX_DIR) -> "AsnDatabase":
+        """索引ならそのまま、元データなら index_dir に索引を作って（古ければ作り直して）開く"""
+        path = Path(path)
+        if is_index(path):
+            return cls(path)
+        idx = index_dir / (path.name + ".idx")
+        if not idx.exists() or idx.stat().st_mtime < path.stat().st_mtime:
+            build_index(path, idx)
+        return cls(idx)
+
+    def __len__(self) -> int:
+        return len(self._start4) + len(self._shi6)
+
+    def close(self) -> None:
+        for v in reversed(self._views):
+            v.release()
+        self._views = []
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "AsnDatabase":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # --- 区間の検索 ---
+
+    def find4(self, n: int) -> int:
+        """IPv4 アドレス（整数）を含む区間の番号。無ければ -1"""
+        h = n >> (32 - DIR_BITS)
+        # 区間の開始が前のバケットにある場合も、lo - 1 がその区間を指す
+        i = bisect.bisect_right(self._start4, n, self._dir4[h], self._dir4[h + 1]) - 1
+        return i if i >= 0 and n <= self._end4[i] else -1
+
+    def find6(self, n: int) -> int:
+        hi, lo = n >> 64, n & 0xFFFFFFFFFFFFFFFF
+        shi = self._shi6
+        i = bisect.bisect_right(self._slo6, lo, bisect.bisect_left(shi, hi), bisect.bisect_right(shi, hi)) - 1
+        if i < 0:
+            return -1
+        ehi = self._ehi6[i]
+        return i if hi < ehi or (hi == ehi and lo <= self._elo6[i]) else -1
+
+    def _range(self, version: int, i: int) -> Tuple[int, int]:
+        if version == 4:
+            return self._start4[i], self._end4[i]
+        return (self._shi6[i] << 64) | self._slo6[i], (self._ehi6[i] << 64) | self._elo6[i]
+
+    def _prefix(self, version: int, i: int, n: int) -> str:
+        """区間内で n を含む最大の CIDR（区間が CIDR 1つならその区間そのもの）"""
+        start, end = self._range(version, i)
+        bits = 32 if version == 4 else 128
+        k = (start ^ end).bit_length()
+        while k:
+            mask = (1 << k) - 1
+            base = n & ~mask
+            if base >= start and base | mask <= end:
+                break
+            k -= 1
+        family = socket.AF_INET if version == 4 else socket.AF_INET6
+        return f"{socket.inet_ntop(family, (n & ~((1 << k) - 1)).to_bytes(bits // 8, 'big'))}/{bits - k}"
+
+    # --- 公開API ---
+
+    def asn(self, ip: str) -> int:
+        """IP の AS 番号だけを返す（データに無い・不正な IP は 0）。集計用の速い経路"""
+        try:
+            if ":" in ip:
+                i = self.find6(int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big"))
+                return self._records[self._rec6[i]][0] if i >= 0 else 0
+            i = self.find4(int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big"))
+            return self._records[self._rec4[i]][0] if i >= 0 else 0
+        except OSError:
+            return 0
+
+    def lookup(self, ip: str) -> Optional[AsnInfo]:
+        """IP の ASN・AS名・国・プレフィックス。データに無い・不正な IP は None"""
+        info = self._cache.get(ip, _MISSING)
+        if info is not _MISSING:
+            return info
+        try:
+            if ":" in ip:
+                version, n = 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+                i = self.find6(n)
+                rec = self._rec6[i] if i >= 0 else -1
+            else:
+                version, n = 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+                i = self.find4(n)
+                rec = self._rec4[i] if i >= 0 else -1
+        except OSError:
+            return None
+        info = None
+        if rec >= 0:
+            asn, country, name = self._records[rec]
+            info = AsnInfo(asn, name, country, self._prefix(version, i, n))
+        # CDN 等の同じ IP が何度も出るので、上限まで結果を覚えておく
+        if len(self._cache) < CACHE_SIZE:
+            self._cache[ip] = info
+        return info
+
+    def lookup_many(self, ips: Iterable[str]) -> List[Optional[AsnInfo]]:
+        return [self.lookup(ip) for ip in ips]
+
+
+# --- ASN・プレフィックス別の集計 ---
+
+class AsnGrouper:
+    """FQDN を ASN → プレフィックス → FQDN の順にまとめる"""
+
+    UNKNOWN = "unknown"
+
+    def __init__(self) -> None:
+        self._groups: Dict[str, Dict[str, object]] = {}
+
+    def add(self, fqdn: str, ips: List[str], infos: List[Optional[AsnInfo]]) -> None:
+        for ip, info in zip(ips, infos):
+            if info is None:
+                key, prefix = self.UNKNOWN, ip
+                meta = {"asn": None, "as_name": "", "country": ""}
+            else:
+                key, prefix = f"AS{info.asn}", info.prefix
+                meta = {"asn": info.asn, "as_name": info.as_name, "country": info.country}
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = dict(meta, prefixes={})
+            names = group["prefixes"].setdefault(prefix, set())
+            names.add(fqdn)
+
+    def as_dict(self) -> Dict[str, Dict[str, object]]:
+        """FQDN の多い ASN から順に、プレフィックスと FQDN はソートして返す"""
+        out = {}
+        for key, group in self._groups.items():
+            prefixes = {p: sorted(names) for p, names in sorted(group["prefixes"].items())}
+            fqdns = {n for names in prefixes.values() for n in names}
+            out[key] = dict(group, fqdn_count=len(fqdns), prefixes=prefixes)
+        return dict(sorted(out.items(), key=lambda kv: (-kv[1]["fqdn_count"], kv[0])))
+
+    def write(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.as_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    p = argparse.ArgumentParser(description="オフラインの IP → ASN/ISP 索引")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="iptoasn TSV / mmdb から索引を作る")
+    b.add_argument("source", help="ip2asn-*.tsv(.gz) または .mmdb")
+    b.add_argument("--output", help="索引の出力先（省略時は artifacts/<元の名前>.idx）")
+    q = sub.add_parser("lookup", help="IP を検索する")
+    q.add_argument("--db", required=True, help="索引または元データ")
+    q.add_argument("ips", nargs="+")
+    args = p.parse_args()
+
+    if args.cmd == "build":
+        src = Path(args.source)
+        build_index(src, Path(args.output) if args.output else INDEX_DIR / (src.name + ".idx"))
+        return
+    with AsnDatabase.open(Path(args.db)) as db:
+        for ip in args.ips:
+            info = db.lookup(ip)
+            print(f"{ip}\t" + (f"AS{info.asn}\t{info.prefix}\t{info.as_name}\t{info.country}" if info else "-"))
+
+
+if __name__ == "__main__":
+    main()
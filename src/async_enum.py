@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+dns.asyncresolver を用いた DomainEnumerator の並行版
+
+同じ再帰深さのゾーンをまとめて並行探索し、run() と同じ
+{"subdomains", "fqdns"} を返す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from dns_cache import CachingResolver, ResolverPool
+from domain2fqdns import DomainEnumerator
+from metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+
+class AsyncDomainEnumerator(DomainEnumerator):
+    """同時実行数とネームサーバ毎のレート制限つきで並行列挙する"""
+
+    def __init__(
+        self,
+        domain: str,
+        shodan_api_key: Optional[str] = None,
+        concurrency: int = 100,
+        rate_per_ns: float = 50.0,
+        nameservers: Optional[List[str]] = None,
+        port: int = 53,
+        timeout: float = 3,
+        lifetime: float = 6,
+        resolver: Optional[CachingResolver] = None,
+        wordlist: Optional[Path] = None,
+        query: Optional[Callable[[str, str], Awaitable]] = None,
+        charge: Optional[Callable[[str], None]] = None,
+        zone_walk: bool = True,
+        direct: bool = False,
+        backend=None,
+        ct_files: Iterable[Path] = (),
+        permute_budget: int = 0,
+    ) -> None:
+        super().__init__(
+            domain, shodan_api_key, resolver, wordlist, zone_walk, direct, backend, ct_files, permute_budget,
+        )
+        self.concurrency = concurrency
+        self.rate_per_ns = rate_per_ns
+        self.nameservers = list(nameservers) if nameservers else None
+        self.port = port
+        self.timeout = timeout
+        self.lifetime = lifetime
+        self._pool: Optional[ResolverPool] = None
+        # 指定時はプールの代わりにこの関数で問い合わせる（スケジューラ用）
+        self._query = query
+        self._external_query = query
+        # 指定時はゾーン走査の問い合わせも送る前にこれで数える（問い合わせ予算用）
+        self._charge = charge
+        # 指定時は新しく見つかったFQDNを (名前, 情報源) として流す（パイプライン用）
+        self.found: Optional[asyncio.Queue] = None
+
+    # --- DNS解決 ---
+
+    def _build_pool(self) -> None:
+        """ネームサーバ毎にリゾルバとレート制限を用意する"""
+        if self._external_query is not None:
+            self._query = self._external_query
+        elif self.backend is not None:
+            # 同時実行数と再送はバックエンドが受け持つ
+            self._query = self.backend.aquery
+        else:
+            self._pool = ResolverPool(
+                self.nameservers, port=self.port, timeout=self.timeout, lifetime=self.lifetime,
+                concurrency=self.concurrency, rate_per_ns=self.rate_per_ns,
+            )
+            self._query = self._pool.query
+        if self.direct:
+            from authoritative import AuthoritativeResolver
+
+            # レート制限はイベントループ毎に作り直す。ゾーン外の名前は上の問い合わせ先へ回す
+            self.authoritative = AuthoritativeResolver(
+                self.resolver, port=self.authoritative_port, timeout=self.timeout,
+                afallback=self._query, rate_per_ns=self.rate_per_ns,
+            )
+            self._query = self.authoritative.aquery
+
+    async def _aresolve(self, host: str, rtype: str) -> List[str]:
+        # キャッシュミス時のみプールへレート制限つきで問い合わせる
+        return await self.resolver.aresolve(host, rtype, query=self._query)
+
+    async def _aexists(self, host: str) -> bool:
+        a, aaaa = await asyncio.gather(
+            self._aresolve(host, "A"), self._aresolve(host, "AAAA")
+        )
+        return bool(a or aaaa)
+
+    async def _ais_delegated(self, zone: str) -> bool:
+        return bool(await self._aresolve(zone, "NS"))
+
+    async def _awildcard_fingerprint(self, zone: str) -> None:
+        z = self._norm(zone)
+        if z in self.wildcards:
+            return
+        probes = self._wildcard_probe_names(z)
+        fp = {"A": set(), "AAAA": set(), "NS": set()}
+        queries = [(n, rt) for n in probes for rt in ("A", "AAAA")]
+        answers = await asyncio.gather(*(self._aresolve(n, rt) for n, rt in queries))
+        for (_, rt), values in zip(queries, answers):
+            fp[rt].update(values)
+        if fp["A"] or fp["AAAA"]:
+            log.info(f"wildcard: *.{z}")
+            for values in await asyncio.gather(*(self._aresolve(n, "NS") for n in probes)):
+                fp["NS"].update(values)
+        self.wildcards[z] = fp
+
+    async def _arecord(self, host: str, delegated: bool, source: str = "dns") -> None:
+        """分類結果を登録し、found キューがあれば新しいFQDNを流す"""
+        target = self.subdomains if delegated else self.fqdns
+        if host in target:
+            return
+        target.add(host)
+        if self.found is not None and not delegated:
+            await self.found.put((host, source))
+
+    async def _aadd(self, host: str, source: str = "dns") -> None:
+        h = self._norm(host)
+        if not self._in_scope(h):
+            return
+        if h == self.root:
+            await self._arecord(h, False, source)
+            return
+        await self._arecord(h, await self._ais_delegated(h), source)
+
+    async def _aadd_if_exists(self, host: str, source: str = "dns") -> None:
+        if await self._aexists(host):
+            await self._aadd(host, source)
+
+    # --- 列挙手法 ---
+
+    async def _ashodan_search(self, zone: str) -> None:
+        if not self.api_key:
+            return
+        cands = await asyncio.to_thread(self._shodan_candidates, zone)
+        for h, delegated in (await self.avalidate_candidates(cands)).items():
+            await self._arecord(h, delegated, "shodan")
+
+    async def _act_search(self, zone: str) -> None:
+        # エクスポートの読込みと永続キャッシュの読み書きはスレッドで行う
+        cands = await asyncio.to_thread(self._ct_candidates, zone)
+        for h, delegated in (await self.avalidate_candidates(cands)).items():
+            await self._arecord(h, delegated, "ct")
+
+    async def _agather_dns(self, zone: str) -> None:
+        z = self._norm(zone)
+        ns, mx = await asyncio.gather(self._aresolve(z, "NS"), self._aresolve(z, "MX"))
+        hosts: Set[str] = {self._norm(n) for n in ns} | self._mx_hosts(mx)
+        for h, delegated in (await self.avalidate_candidates(hosts)).items():
+            await self._arecord(h, delegated)
+
+    async def _aprobe_delegations(self, zone: str) -> None:
+        z = self._norm(zone)
+
+        async def probe(sub: str) -> None:
+            ns = await self._aresolve(sub, "NS")
+            if ns and not self._matches_wildcard(z, {"NS": ns}):
+                await self._arecord(sub, True)
+
+        await asyncio.gather(*(probe(f"{label}.{z}") for label in self.DELEGATION_LABELS))
+
+    async def _abruteforce_hosts(self, zone: str) -> None:
+        z = self._norm(zone)
+
+        async def probe(fqdn: str) -> None:
+            a, aaaa = await asyncio.gather(self._aresolve(fqdn, "A"), self._aresolve(fqdn, "AAAA"))
+            if (a or aaaa) and not self._matches_wildcard(z, {"A": a, "AAAA": aaaa}):
+                await self._aadd(fqdn)
+
+        await asyncio.gather(*(probe(f"{label}.{z}") for label in self.HOST_LABELS))
+
+    async def _awordlist_bruteforce(self, zone: str) -> None:
+        z = self._norm(zone)
+        hits = await self._bruteforce_stage().run(
+            z, known=self._known,
+            is_wildcard=lambda ans: self._matches_wildcard(z, ans),
+            query=self._query,
+        )
+        for h, delegated in hits.items():
+            await self._arecord(h, delegated, "bruteforce")
+
+    async def _apermute(self, zone: str) -> None:
+        z = self._norm(zone)
+        # 同じ深さの他のゾーンが並行して名前を加えるので、元の名前と語はここで確定させる
+        hits = await self._permutation_stage().run(
+            z, self._zone_names(z), self._permutation_model(), known=self._known,
+            is_wildcard=lambda ans: self._matches_wildcard(z, ans),
+            query=self._query,
+        )
+        for h, delegated in hits.items():
+            await self._arecord(h, delegated, "permutation")
+
+    async def _aauthoritative_addresses(self, zone: str) -> List[str]:
+        ns = sorted(self._norm(n) for n in await self._aresolve(zone, "NS"))
+        answers = await asyncio.gather(
+            *(self._aresolve(n, rt) for n in ns for rt in ("A", "AAAA"))
+        )
+        return list(dict.fromkeys(a for values in answers for a in values))
+
+    async def _azone_transfer(self, zone: str) -> bool:
+        if not self.zone_walk:
+            return False
+        from zone_walk import enumerate_zone
+
+        z = self._norm(zone)
+        addrs = await self._aauthoritative_addresses(z)
+        # AXFR/NSEC の問い合わせは少数なので同期APIをスレッドで実行する
+        listing = await asyncio.to_thread(
+            enumerate_zone, z, addrs, self.authoritative_port, words=self._crack_words(),
+            charge=self._charge,
+        )
+        if listing is None:
+            return False
+        for h, delegated in self._listing_hits(listing).items():
+            await self._arecord(h, delegated, listing.method)
+        if listing.complete:
+            self.complete_zones.add(z)
+        return listing.complete
+
+    # --- 再帰（深さ単位の幅優先） ---
+
+    @staticmethod
+    async def _staged(name: str, coro: Awaitable):
+        """coro 内の問い合わせを段 name として計測する"""
+        with METRICS.stage(name):
+            return await coro
+
+    async def _awalk_zone(self, zone: str, depth: int) -> None:
+        complete = await self._staged("zone_walk", self._azone_transfer(zone))
+        stages = [self._staged("gather_dns", self._agather_dns(zone))]
+        # 全名前が得られたゾーンは総当たりしない
+        if not complete:
+            # 総当たり系の前にワイルドカードの応答を確定させる
+            await self._staged("wildcard", self._awildcard_fingerprint(zone))
+            stages.append(self._staged("probe_delegations", self._aprobe_delegations(zone)))
+            stages.append(self._staged("bruteforce_hosts", self._abruteforce_hosts(zone)))
+            if self.wordlist:
+                stages.append(self._staged("wordlist", self._awordlist_bruteforce(zone)))
+        if depth == 0:
+            stages.append(self._staged("shodan", self._ashodan_search(zone)))
+            stages.append(self._staged("ct", self._act_search(zone)))
+            stages.append(self._staged("apex", self._aadd_if_exists(zone)))
+        await asyncio.gather(*stages)
+        # 他の手法で見つけた名前を元にするので最後に行う
+        if self.permute_budget and not complete:
+            await self._staged("permute", self._apermute(zone))
+
+    async def awalk(self, zone: str) -> None:
+        level = [self._norm(zone)]
+        depth = 0
+        while level:
+            self.visited.update(level)
+            log.debug(f"depth {depth}: {len(level)} zones")
+            await asyncio.gather(*(self._awalk_zone(z, depth) for z in level))
+            level = [s for s in self.subdomains.under(self.root) if s not in self.visited]
+            depth += 1
+
+    # --- 公開API ---
+
+    async def arun(
+        self, known: Optional[Dict[str, Iterable[str]]] = None
+    ) -> Dict[str, List[str]]:
+        self._reset(known)
+        self._build_pool()
+        await self.awalk(self.root)
+        if self.authoritative is not None:
+            self.authoritative.log_summary()
+        return {
+            "subdomains": sorted(self.subdomains),
+            "fqdns": sorted(self.fqdns),
+        }
+
+    def run(self, known: Optional[Dict[str, Iterable[str]]] = None) -> Dict[str, List[str]]:
+        return asyncio.run(self.arun(known))
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ゾーンの権威サーバへ直接問い合わせる解決モード
+
+再帰リゾルバを経由せず、名前を含むゾーンの権威サーバ（NS）へ RD なしで問い合わせる。
+サーバ毎に平滑化RTT（SRTT）を記録して速いサーバを優先し、タイムアウトしたサーバは
+SRTT を引き上げて次のサーバへ切り替える。選ばれなかったサーバの SRTT は少しずつ
+減衰させるので、遅いサーバにも時々問い合わせが回って値が更新される。
+
+委任（リファーラル）は子ゾーンの NS とグルーを覚えて辿る。ゾーンが分からない名前や
+ゾーン外への CNAME は従来の再帰リゾルバで解決する。
+
+CachingResolver.resolve / aresolve の query に resolve / aquery を渡して使う。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Generator, List, Optional, Tuple
+
+import dns.asyncquery
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.query
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+
+from dns_cache import CachingResolver, RateLimiter
+from public_suffix import registrable_domain
+
+log = logging.getLogger(__name__)
+
+# 新しい測定値の重み（SRTT = (1-w)*SRTT + w*RTT）
+SRTT_WEIGHT = 0.3
+# 選ばれなかったサーバの SRTT に掛ける係数
+SRTT_DECAY = 0.98
+# SRTT の上限（秒）。タイムアウトが続いたサーバもいずれ再試行される
+MAX_SRTT = 30.0
+
+# _steps が yield する要求: ("ask", サーバ, 問い合わせ) / ("lookup", 名前, 種別)
+Request = Tuple[str, object, object]
+
+
+class NotAuthoritative(Exception):
+    """権威サーバへ直接問い合わせられない（再帰リゾルバで解決する）"""
+
+
+class ServerStats:
+    """1つの権威サーバの SRTT と問い合わせ結果の集計"""
+
+    __slots__ = ("srtt", "queries", "timeouts", "failures")
+
+    def __init__(self) -> None:
+        # 未計測のサーバは 0 として一度は試す
+        self.srtt = 0.0
+        self.queries = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def observe(self, rtt: float) -> None:
+        self.queries += 1
+        self.srtt = rtt if not self.srtt else (1 - SRTT_WEIGHT) * self.srtt + SRTT_WEIGHT * rtt
+
+    def penalize(self, timeout: float, timed_out: bool) -> None:
+        self.queries += 1
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.failures += 1
+        self.srtt = min(MAX_SRTT, max(self.srtt, timeout) * 2)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "srtt_ms": round(self.srtt * 1000, 2),
+            "queries": self.queries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+
+class AuthoritativeResolver:
+    """
+    名前の属するゾーンの権威サーバへ直接問い合わせるリゾルバ
+
+    Args:
+        resolver: 再帰側のリゾルバ（fallback 省略時はその問い合わせ先を使う）
+        port: 権威サーバのポート（テスト用）
+        timeout: 1サーバあたりの待ち時間（秒）
+        fallback / afallback: 直接問い合わせられない名前の問い合わせ先
+            （省略時は resolver の再帰リゾルバ）
+        rate_per_ns: 非同期時のサーバ毎の秒間クエリ数上限（0で無制限）
+    """
+
+    MAX_REFERRALS = 8
+
+    def __init__(
+        self,
+        resolver: CachingResolver,
+        port: int = 53,
+        timeout: float = 2,
+        fallback: Optional[Callable[[str, str], object]] = None,
+        afallback: Optional[Callable[[str, str], Awaitable]] = None,
+        rate_per_ns: float = 0,
+    ) -> None:
+        self.resolver = resolver
+        self.port = port
+        self.timeout = timeout
+        self.fallback = fallback or resolver.upstream
+        self.afallback = afallback or resolver.aupstream
+        self.rate_per_ns = rate_per_ns
+        # ゾーン → 権威サーバのアドレス（None はまだ引いていない）
+        self.zones: Dict[str, Optional[List[str]]] = {}
+        # リファーラルで知った NS ホスト名（グルーが無い場合に引く）
+        self._ns_hosts: Dict[str, List[str]] = {}
+        # NS を持たないと分かった名前
+        self._not_zones: set = set()
+        self.servers: Dict[str, ServerStats] = {}
+        self._limiters: Dict[str, RateLimiter] = {}
+        # ゾーン探索用の NS・A の問い合わせ結果。CachingResolver の完了待ちに合流すると、
+        # 直接問い合わせ中の名前自身（NS ホストの A など）を待って止まることがあるので別に持つ
+        self._lookups: Dict[Tuple[str, str], List[str]] = {}
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    # --- ゾーンとサーバ ---
+
+    def add_zone(self, zone: str, servers: Optional[List[str]] = None) -> None:
+        """直接問い合わせるゾーンを登録する（servers 省略時は最初の問い合わせで NS を引く）"""
+        self.zones[_norm(zone)] = list(servers) if servers else None
+
+    def _known_zone(self, name: str) -> Optional[str]:
+        """登録済みのゾーンのうち name を含む最も深いもの"""
+        labels = name.split(".")
+        for i in range(len(labels)):
+            z = ".".join(labels[i:])
+            if z in self.zones:
+                return z
+        return None
+
+    def _zone_for(self, name: str) -> Generator[Request, object, Optional[str]]:
+        zone = self._known_zone(name)
+        if zone is not None:
+            return zone
+        # 登録可能ドメイン（co.jp 等の公開接尾辞の1つ下）から順に NS を探す（接尾辞の
+        # レジストリの権威サーバへは直接問い合わせない）。
+        # より深い委任はリファーラルで辿るので、見つかった最初のゾーンから始めればよい
+        registrable = registrable_domain(name)
+        if registrable is None:
+            return None
+        labels = name.split(".")
+        for i in range(len(labels) - registrable.count(".") - 1, -1, -1):
+            z = ".".join(labels[i:])
+            if z in self._not_zones:
+                continue
+            ns = yield ("lookup", z, "NS")
+            if ns:
+                self.zones[z] = None
+                self._ns_hosts[z] = [_norm(h) for h in ns]
+                return z
+            self._not_zones.add(z)
+        return None
+
+    def _servers_of(self, zone: str) -> Generator[Request, object, List[str]]:
+        servers = self.zones.get(zone)
+        if servers:
+            return servers
+        hosts = self._ns_hosts.get(zone)
+        if hosts is None:
+            hosts = [_norm(h) for h in (yield ("lookup", zone, "NS"))]
+        addrs: List[str] = []
+        for host in hosts:
+            addrs.extend((yield ("lookup", host, "A")))
+        if not addrs:
+            raise NotAuthoritative(f"{zone}: no authoritative servers")
+        servers = self.zones[zone] = sorted(set(addrs))
+        log.debug(f"{zone}: authoritative servers {servers}")
+        return servers
+
+    def _ordered(self, servers: List[str]) -> List[str]:
+        """SRTT の小さい順（未計測は先頭）"""
+        return sorted(servers, key=lambda s: self._stats(s).srtt)
+
+    def _stats(self, server: str) -> ServerStats:
+        st = self.servers.get(server)
+        if st is None:
+            st = self.servers[server] = ServerStats()
+        return st
+
+    # --- 応答の判定 ---
+
+    @staticmethod
+    def _referral(resp: dns.message.Message, zone: str, qname: dns.name.Name) -> Optional[dns.rrset.RRset]:
+        """zone より深い、qname を含むゾーンへの委任なら その NS を返す"""
+        origin = dns.name.from_text(zone)
+        for rrset in resp.authority:
+            if (
+                rrset.rdtype == dns.rdatatype.NS
+                and rrset.name != origin
+                and rrset.name.is_subdomain(origin)
+                and qname.is_subdomain(rrset.name)
+            ):
+                return rrset
+        return None
+
+    def _learn_referral(self, resp: dns.message.Message, ns: dns.rrset.RRset) -> str:
+        child = _norm(ns.name)
+        hosts = [_norm(r.target) for r in ns]
+        glue = [
+            str(r) for rrset in resp.additional
+            if rrset.rdtype == dns.rdatatype.A and _norm(rrset.name) in hosts
+            for r in rrset
+        ]
+        self.zones[child] = sorted(set(glue)) or None
+        self._ns_hosts[child] = hosts
+        return child
+
+    # --- 問い合わせ手順 ---
+
+    def _ask_zone(
+        self, zone: str, servers: List[str], qname: dns.name.Name, rdtype: str
+    ) -> Generator[Request, object, Tuple[dns.message.Message, str]]:
+        """速い順にサーバへ問い合わせ、権威ある応答かリファーラルを返す"""
+        timeouts = 0
+        for server in self._ordered(servers):
+            q = dns.message.make_query(qname, rdtype)
+            q.flags &= ~dns.flags.RD
+            resp, rtt = yield ("ask", server, q)
+            st = self._stats(server)
+            if isinstance(resp, Exception):
+                timed_out = isinstance(resp, dns.exception.Timeout)
+                timeouts += timed_out
+                st.penalize(self.timeout, timed_out)
+                log.debug(f"{zone}: @{server} {qname} {rdtype}: {resp!r}")
+                continue
+            authoritative = resp.flags & dns.flags.AA and resp.rcode() in (
+                dns.rcode.NOERROR, dns.rcode.NXDOMAIN
+            )
+            if not authoritative and self._referral(resp, zone, qname) is None:
+                # REFUSED/SERVFAIL や上位への誘導（lame delegation）
+                st.penalize(self.timeout, False)
+                log.debug(f"{zone}: @{server} lame ({dns.rcode.to_text(resp.rcode())})")
+                continue
+            st.observe(rtt)
+            for other in servers:
+                if other != server:
+                    self._stats(other).srtt *= SRTT_DECAY
+            return resp, server
+        if timeouts == len(servers):
+            raise dns.exception.Timeout(f"{zone}: all authoritative servers timed out")
+        raise NotAuthoritative(f"{zone}: no usable authoritative server")
+
+    def _steps(self, name: str, rdtype: str) -> Generator[Request, object, dns.resolver.Answer]:
+        """
+        1件の解決手順。("ask", サーバ, 問い合わせ) には (応答または例外, RTT) を、
+        ("lookup", 名前, 種別) にはレコードの一覧を send で返す
+        """
+        name = _norm(name)
+        qname = dns.name.from_text(name)
+        zone = yield from self._zone_for(name)
+        if zone is None:
+            raise NotAuthoritative(name)
+        for _ in range(self.MAX_REFERRALS):
+            servers = yield from self._servers_of(zone)
+            resp, server = yield from self._ask_zone(zone, servers, qname, rdtype)
+            ns = None if resp.flags & dns.flags.AA else self._referral(resp, zone, qname)
+            if ns is None:
+                break
+            zone = self._learn_referral(resp, ns)
+        else:
+            raise NotAuthoritative(f"{name}: too many referrals")
+        if resp.rcode() == dns.rcode.NXDOMAIN:
+            raise dns.resolver.NXDOMAIN(qnames=[qname], responses={qname: resp})
+        ans = dns.resolver.Answer(
+            qname, dns.rdatatype.from_text(rdtype), dns.rdataclass.IN, resp, server, self.port
+        )
+        if ans.rrset is None and ans.canonical_name != qname:
+            # CNAME の先がゾーン外
+            raise NotAuthoritative(f"{name}: CNAME to {ans.canonical_name}")
+        return ans
+
+    @staticmethod
+    def _records(ans) -> List[str]:
+        return [] if ans.rrset is None else [str(r).strip() for r in ans]
+
+    # --- 同期 ---
+
+    def _lookup(self, name: str, rdtype: str) -> List[str]:
+        key = (name, rdtype)
+        records = self._lookups.get(key)
+        if records is None:
+            try:
+                records = self._records(self.fallback(name, rdtype))
+            except Exception as e:
+                log.debug(f"direct: {name} {rdtype}: {e!r}")
+                records = []
+            self._lookups[key] = records
+        return records
+
+    def _do(self, req: Request):
+        kind, target, arg = req
+        if kind == "lookup":
+            return self._lookup(target, arg)
+        start = time.perf_counter()
+        try:
+            resp, _ = dns.query.udp_with_fallback(arg, target, timeout=self.timeout, port=self.port)
+        except Exception as e:
+            return e, time.perf_counter() - start
+        return resp, time.perf_counter() - start
+
+    def resolve(self, name: str, rdtype: str):
+        """CachingResolver.resolve の query に渡す同期版"""
+        steps = self._steps(name, rdtype)
+        try:
+            req = next(steps)
+            while True:
+                req = steps.send(self._do(req))
+        except StopIteration as stop:
+            return stop.value
+        except NotAuthoritative as e:
+            log.debug(f"direct: {e}; using recursive resolver")
+            return self.fallback(name, rdtype)
+
+    # --- 非同期 ---
+
+    async def _alookup(self, name: str, rdtype: str) -> List[str]:
+        key = (name, rdtype)
+        records = self._lookups.get(key)
+        if records is not None:
+            return records
+        pending = self._pending.get(key)
+        if pending is not None:
+            return list(await asyncio.shield(pending))
+        fut = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            try:
+                records = self._records(await self.afallback(name, rdtype))
+            except Exception as e:
+                log.debug(f"direct: {name} {rdtype}: {e!r}")
+                records = []
+            self._lookups[key] = records
+            fut.set_result(records)
+            return records
+        finally:
+            if not fut.done():
+                fut.set_result([])
+            del self._pending[key]
+
+    async def _ado(self, req: Request):
+        kind, target, arg = req
+        if kind == "lookup":
+            return await self._alookup(target, arg)
+        limiter = self._limiters.get(target)
+        if limiter is None:
+            limiter = self._limiters[target] = RateLimiter(self.rate_per_ns)
+        await limiter.acquire()
+        start = time.perf_counter()
+        try:
+            resp, _ = await dns.asyncquery.udp_with_fallback(
+                arg, target, timeout=self.timeout, port=self.port
+            )
+        except Exception as e:
+            return e, time.perf_counter() - start
+        return resp, time.perf_counter() - start
+
+    async def aquery(self, name: str, rdtype: str):
+        """CachingResolver.aresolve の query に渡す非同期版"""
+        steps = self._steps(name, rdtype)
+        try:
+            req = next(steps)
+            while True:
+                req = steps.send(await self._ado(req))
+        except StopIteration as stop:
+            return stop.value
+        except NotAuthoritative as e:
+            log.debug(f"direct: {e}; using recursive resolver")
+            return await self.afallback(name, rdtype)
+
+    # --- 集計 ---
+
+    def server_stats(self) -> Dict[str, Dict[str, float]]:
+        """サーバ毎の SRTT と問い合わせ数（SRTT の小さい順）"""
+        return {
+            s: st.as_dict()
+            for s, st in sorted(self.servers.items(), key=lambda kv: kv[1].srtt)
+        }
+
+    def log_summary(self) -> None:
+        for server, st in self.server_stats().items():
+            log.info(
+                f"authoritative {server}: srtt={st['srtt_ms']}ms queries={st['queries']} "
+                f"timeouts={st['timeouts']} failures={st['failures']}"
+            )
+
+
+def _norm(name) -> str:
+    return str(name).strip().rstrip(".").lower()
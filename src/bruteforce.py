@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大規模ワードリストによるホスト名総当たり
+
+ワードリストはファイルから1行ずつ読み、全体をメモリに載せない。
+同時問い合わせ数はタイムアウト/SERVFAILの割合に応じて自動で増減させる（AIMD）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+import dns.exception
+import dns.resolver
+
+from dns_cache import CachingResolver, ResolverPool
+
+log = logging.getLogger(__name__)
+
+_LABEL_RE = re.compile(r"^[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?(?:\.[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?)*$")
+
+
+def iter_wordlist(path: Path) -> Iterator[str]:
+    """ワードリストを1行ずつ読み、ラベルとして使えるものだけを返す"""
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            label = line.strip().lower().rstrip(".")
+            if not label or label.startswith("#"):
+                continue
+            if _LABEL_RE.match(label):
+                yield label
+
+
+class AdaptiveLimiter:
+    """
+    失敗率に応じて同時実行数を増減させる制限
+
+    interval 件ごとにタイムアウト+SERVFAIL の割合を見て、
+    high を超えたら半減、low 未満なら step だけ増やす。
+    """
+
+    def __init__(
+        self,
+        initial: int = 100,
+        minimum: int = 10,
+        maximum: int = 2000,
+        step: int = 20,
+        interval: int = 200,
+        high: float = 0.05,
+        low: float = 0.01,
+    ) -> None:
+        self.window = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.interval = interval
+        self.high = high
+        self.low = low
+        self.inflight = 0
+        self._samples = 0
+        self._failures = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < self.window)
+            self.inflight += 1
+
+    async def release(self, failed: bool) -> None:
+        async with self._cond:
+            self.inflight -= 1
+            self._samples += 1
+            self._failures += int(failed)
+            if self._samples >= self.interval:
+                rate = self._failures / self._samples
+                if rate > self.high:
+                    self.window = max(self.minimum, self.window // 2)
+                elif rate < self.low:
+                    self.window = min(self.maximum, self.window + self.step)
+                self._samples = self._failures = 0
+            self._cond.notify_all()
+
+
+class BruteforceStage:
+    """
+    ワードリストの各ラベルについて A/AAAA を問い合わせ、存在したものの委任有無を判定する
+
+    Args:
+        wordlist: ワードリストのパス
+        resolver: 共有キャッシュつきリゾルバ
+        nameservers: 問い合わせ先（省略時はシステム設定）
+        max_inflight: 同時問い合わせ数の上限
+        report_every: 進捗（qps）を出力する間隔（秒）
+    """
+
+    def __init__(
+        self,
+        wordlist: Path,
+        resolver: Optional[CachingResolver] = None,
+        nameservers: Optional[List[str]] = None,
+        port: int = 53,
+        max_inflight: int = 2000,
+        initial_inflight: int = 100,
+        report_every: float = 10.0,
+    ) -> None:
+        self.wordlist = Path(wordlist)
+        self.resolver = resolver or CachingResolver()
+        self.nameservers = nameservers
+        self.port = port
+        self.max_inflight = max_inflight
+        self.initial_inflight = initial_inflight
+        self.report_every = report_every
+        self.queries = 0
+        self.failures = 0
+        self.elapsed = 0.0
+
+    @property
+    def qps(self) -> float:
+        return self.queries / self.elapsed if self.elapsed else 0.0
+
+    async def run(
+        self,
+        zone: str,
+        known: Callable[[str], bool] = lambda h: False,
+        is_wildcard: Callable[[Dict[str, List[str]]], bool] = lambda ans: False,
+        query: Optional[Callable[[str, str], Awaitable]] = None,
+    ) -> Dict[str, bool]:
+        """
+        zone 直下を総当たりし、見つかったホスト → 委任されているか を返す
+
+        Args:
+            known: 既に発見済みの名前なら True を返す関数（問い合わせを省く）
+            is_wildcard: A/AAAA応答がゾーンのワイルドカード応答なら True を返す関数
+            query: 実際の問い合わせ関数（省略時はこのステージ専用のプールを作る）
+        """
+        if query is None:
+            pool = ResolverPool(
+                self.nameservers, port=self.port, concurrency=self.max_inflight
+            )
+            query = pool.query
+        limiter = AdaptiveLimiter(initial=self.initial_inflight, maximum=self.max_inflight)
+        self.queries = self.failures = 0
+        hits: Dict[str, bool] = {}
+        labels = iter_wordlist(self.wordlist)
+        start = last_report = time.monotonic()
+
+        async def tracked(name: str, rdtype: str):
+            await limiter.acquire()
+            failed = False
+            try:
+                return await query(name, rdtype)
+            except (dns.exception.Timeout, dns.resolver.NoNameservers):
+                failed = True
+                raise
+            finally:
+                self.queries += 1
+                self.failures += int(failed)
+                await limiter.release(failed)
+
+        async def check(fqdn: str) -> None:
+            a, aaaa = await asyncio.gather(
+                self.resolver.aresolve(fqdn, "A", query=tracked),
+                self.resolver.aresolve(fqdn, "AAAA", query=tracked),
+            )
+            if (a or aaaa) and not is_wildcard({"A": a, "AAAA": aaaa}):
+                ns = await self.resolver.aresolve(fqdn, "NS", query=tracked)
+                hits[fqdn] = bool(ns)
+
+        async def worker() -> None:
+            nonlocal last_report
+            for label in labels:
+                fqdn = f"{label}.{zone}"
+                if known(fqdn):
+                    continue
+                await check(fqdn)
+                now = time.monotonic()
+                if now - last_report >= self.report_every:
+                    last_report = now
+                    self.elapsed = now - start
+                    log.info(
+                        f"bruteforce {zone}: {self.queries} queries, {self.qps:.0f} qps, "
+                        f"inflight<={limiter.window}, failures={self.failures}"
+                    )
+
+        # ワーカーは同じイテレータを共有するので、読み込みは常に1行ずつ進む
+        await asyncio.gather(*(worker() for _ in range(self.max_inflight)))
+        self.elapsed = time.monotonic() - start
+        log.info(
+            f"bruteforce {zone}: {len(hits)} hits, {self.queries} queries, {self.qps:.0f} qps"
+        )
+        return hits
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Certificate Transparency ログのエクスポートから候補ホスト名を取り出す
+
+crt.sh の JSON（?output=json の配列）・JSON Lines・CSV（いずれも .gz 可）を1件ずつ読み、
+SAN（name_value）と CN（common_name）の名前のうち対象ドメイン配下のものだけを残す。
+ファイル全体は読み込まないので、数GBのエクスポートでも使うメモリは一致した名前の分だけで済む。
+対象ドメインの判定は逆順ラベルのトライ（name_store.NameTrie）で行い、ドメイン数によらずラベル数に比例する。
+
+    python src/ct_logs.py scan crtsh-example.json --domains example.com
+    python src/ct_logs.py import ct-export.csv.gz --domains-file apex.txt
+
+import は結果を永続キャッシュの候補リスト（source="ct"）に保存する。以降の列挙は --cache を付ければ
+ダンプを指定しなくてもこの候補を検証に回すので、多数のドメインを1回の読込みでまとめて補完できる。
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, TextIO
+
+from name_store import NameTrie
+
+log = logging.getLogger(__name__)
+
+# 名前を含む列（CSV の見出しは小文字にして照合する）
+NAME_FIELDS = ("name_value", "common_name", "dns_names", "san", "sans", "subject_alt_names", "cn")
+# JSON を読み進める単位（文字数）
+CHUNK_SIZE = 1 << 16
+# これを超えても閉じないレコードは壊れているとみなす
+MAX_RECORD = 64 << 20
+# 判定済みとして覚えておく生の名前の数（超えたら忘れてやり直す）
+SEEN_LIMIT = 1 << 18
+
+_SEPARATORS = frozenset(" \t\r\n,[]")
+_SPLIT = re.compile(r"[\s,;]+")
+_HOSTNAME = re.compile(r"[a-z0-9_-]+(?:\.[a-z0-9_-]+)+")
+
+
+def normalize(name: str) -> str:
+    """証明書の名前を候補ホスト名にする。ワイルドカードは親の名前にし、ホスト名でないもの（メール・IP等）は空文字"""
+    h = name.strip().rstrip(".").lower()
+    while h.startswith("*."):
+        h = h[2:]
+    if len(h) > 253 or not _HOSTNAME.fullmatch(h) or h.replace(".", "").isdigit():
+        return ""
+    return h
+
+
+# --- エクスポートの読込み ---
+
+def _open_text(path: Path) -> TextIO:
+    # CSV の値は改行を含むので newline="" で開く
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, encoding="utf-8", errors="replace", newline="")
+
+
+def iter_json(f: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    JSON の配列・JSON Lines・連結したオブジェクトから、オブジェクトを1件ずつ返す
+
+    chunk_size ずつ読んで raw_decode で切り出し、途中で切れたレコードは続きを読んでから解析し直す。
+    """
+    decode = json.JSONDecoder().raw_decode
+    buf, pos = "", 0
+    while True:
+        # レコード間の区切り（配列の括弧・カンマ・空白）を読み飛ばす
+        while pos < len(buf) and buf[pos] in _SEPARATORS:
+            pos += 1
+        if pos >= len(buf):
+            buf, pos = f.read(chunk_size), 0
+            if not buf:
+                return
+            continue
+        try:
+            obj, pos = decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if len(buf) - pos > MAX_RECORD:
+                raise ValueError(f"JSON を解析できません: {e}") from None
+            # 読む量を倍々にして、大きなレコードでも解析し直しの回数を抑える
+            more = f.read(max(chunk_size, len(buf) - pos))
+            if not more:
+                raise ValueError(f"JSON を解析できません: {e}") from None
+            buf, pos = buf[pos:] + more, 0
+            continue
+        if isinstance(obj, dict):
+            yield obj
+
+
+def iter_csv(f: TextIO) -> Iterator[dict]:
+    """見出し行つきの CSV を、小文字の見出し → 値 の dict で1行ずつ返す"""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    keys = [k.strip().lower() for k in header]
+    for row in reader:
+        yield dict(zip(keys, row))
+
+
+def _format(path: Path, f: TextIO) -> str:
+    """拡張子、無ければ先頭の文字で "json" / "csv" を決める"""
+    suffixes = [s.lower() for s in path.suffixes if s.lower() != ".gz"]
+    if suffixes and suffixes[-1] in (".json", ".jsonl", ".ndjson"):
+        return "json"
+    if suffixes and suffixes[-1] == ".csv":
+        return "csv"
+    head = f.read(4096).lstrip()
+    f.seek(0)
+    return "json" if head[:1] in ("[", "{") else "csv"
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """エクスポート1つ分のレコード（証明書1枚分）を1件ずつ返す"""
+    path = Path(path)
+    with _open_text(path) as f:
+        yield from (iter_json(f) if _format(path, f) == "json" else iter_csv(f))
+
+
+def _raw_names(record: dict) -> Iterator[str]:
+    for field in NAME_FIELDS:
+        value = record.get(field)
+        if not value:
+            continue
+        # crt.sh の name_value は改行区切り、他の出力はカンマや空白区切りのことがある
+        if isinstance(value, str):
+            yield from (_SPLIT.split(value) if "," in value or ";" in value else value.split())
+        else:
+            yield from (v for v in value if isinstance(v, str))
+
+
+def record_names(record: dict) -> Iterator[str]:
+    """レコードの SAN・CN の名前（正規化済み、重複あり）"""
+    for v in _raw_names(record):
+        h = normalize(v)
+        if h:
+            yield h
+
+
+# --- 対象ドメインへの振り分け ---
+
+def scan(paths: Iterable[Path], domains: Iterable[str]) -> Dict[str, NameTrie]:
+    """
+    エクスポートを順に読み、対象ドメイン → 配下の名前 を返す
+
+    入れ子の対象ドメイン（example.com と dev.example.com）は上位のドメインで振り分け、
+    下位のドメインには最後にその配下の分を写す。
+    """
+    index = NameTrie(h for h in (normalize(d) for d in domains) if h)
+    found = {d: NameTrie() for d in index}
+    # 同じ名前は CN と SAN、プレ証明書と証明書、更新のたびに繰り返し現れるので、
+    # 一度判定した生の表記は正規化・振り分けを省く
+    seen: Set[str] = set()
+    records = 0
+    for path in paths:
+        for record in iter_records(Path(path)):
+            records += 1
+            for raw in _raw_names(record):
+                if raw in seen:
+                    continue
+                if len(seen) >= SEEN_LIMIT:
+                    seen.clear()
+                seen.add(raw)
+                name = normalize(raw)
+                root = index.covering(name) if name else None
+                if root is not None:
+                    found[root].add(name)
+    for d in found:
+        top = index.covering(d)
+        if top != d:
+            found[d] = NameTrie(found[top].under(d, include_self=True))
+    log.info(
+        f"CT: {records} records, {sum(len(t) for t in found.values())} names in scope "
+        f"({len(found)} domains)"
+    )
+    return found
+
+
+def _read_domains(args) -> List[str]:
+    domains = [d.strip() for d in (args.domains or "").split(",") if d.strip()]
+    if args.domains_file:
+        with open(args.domains_file, encoding="utf-8") as f:
+            domains += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return domains
+
+
+def main() -> None:
+    from persistent_cache import DEFAULT_PATH, PersistentCache
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    p = argparse.ArgumentParser(description="CTログのエクスポートから候補ホスト名を取り出す")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    for name, desc in (("scan", "対象ドメイン配下の名前を表示する"),
+                       ("import", "対象ドメイン毎の候補として永続キャッシュに保存する")):
+        c = sub.add_parser(name, help=desc)
+        c.add_argument("files", nargs="+", help="crt.sh の JSON / JSON Lines / CSV（.gz 可）")
+        c.add_argument("--domains", help="対象ドメイン（カンマ区切り）")
+        c.add_argument("--domains-file", help="対象ドメインの一覧（1行1件）")
+    sub.choices["import"].add_argument(
+        "--cache", default=str(DEFAULT_PATH), help=f"保存先の永続キャッシュ（既定: {DEFAULT_PATH}）",
+    )
+    args = p.parse_args()
+
+    domains = _read_domains(args)
+    if not domains:
+        p.error("--domains か --domains-file で対象ドメインを指定してください")
+    found = scan([Path(f) for f in args.files], domains)
+
+    if args.cmd == "scan":
+        # 入れ子の対象ドメインの名前は上位のドメインで出力済み
+        printed = NameTrie()
+        for names in found.values():
+            for name in names:
+                if name not in printed:
+                    printed.add(name)
+                    print(name)
+        return
+    store = PersistentCache(Path(args.cache))
+    try:
+        for domain, names in found.items():
+            store.put_candidates("ct", domain, names)
+    finally:
+        store.close()
+    log.info(f"saved: {len(found)} domains -> {args.cache}")
+
+
+if __name__ == "__main__":
+    main()
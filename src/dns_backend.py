@@ -0,0 +1,725 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+リゾルバのバックエンド（キャッシュミス時に実際に問い合わせを送る部分）
+
+バックエンドは次のメソッドを持つオブジェクトで、CachingResolver(backend=...) に渡すと
+upstream / aupstream がこれを使う。
+
+    query(name, rdtype)    同期で問い合わせ、dns.resolver.Answer 互換の応答を返す
+    aquery(name, rdtype)   非同期版
+    close()                ソケット等を閉じる
+
+応答は rrset（NODATA なら None）・response・expiration を持ち、反復でレコードを返す。
+NXDOMAIN は dns.resolver.NXDOMAIN、全サーバの SERVFAIL/REFUSED は dns.resolver.NoNameservers、
+タイムアウトは dns.exception.Timeout を送出する（CachingResolver.resolve の query と同じ約束）。
+
+    dnspython  既定。CachingResolver 内蔵の dns.resolver / ResolverPool で1件ずつ問い合わせる
+    udp        UdpBackend。問い合わせを自前でワイヤ形式に組み、少数のノンブロッキング UDP ソケットから
+               まとめて送る。応答はソケットとクエリIDで突き合わせ、タイムアウトしたものは次のサーバへ
+               再送し、TC 付きの応答は TCP で問い直す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import dns.exception
+import dns.name
+import dns.rdatatype
+import dns.resolver
+
+log = logging.getLogger(__name__)
+
+BACKENDS = ("dnspython", "udp")
+
+# 問い合わせに付ける EDNS0 の UDP ペイロード長（超える応答は TC 付きで返り、TCP で問い直す）
+EDNS_PAYLOAD = 1232
+# 応答中の CNAME を辿る上限
+MAX_CNAME = 16
+# 再送の判定をまとめて行う間隔（秒）。期限ごとにタイマーを起こさない
+TIMER_SLACK = 0.01
+
+_HEADER = struct.Struct("!HHHHHH")
+_RR = struct.Struct("!HHIH")
+_OPT = b"\x00" + struct.pack("!HHIH", 41, EDNS_PAYLOAD, 0, 0)
+
+# 自前で文字列にするレコード種別（それ以外は dnspython で解釈する）
+_A, _NS, _CNAME, _SOA, _PTR, _MX, _AAAA = 1, 2, 5, 6, 12, 15, 28
+_FAST_TYPES = {_A, _NS, _CNAME, _PTR, _MX, _AAAA}
+# エスケープ無しで表示できるラベルの文字（それ以外を含む名前は dnspython に任せる）
+_PLAIN = b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_*"
+
+
+class _Unparsed(Exception):
+    """自前の解釈の対象外（dnspython で解釈し直す）"""
+
+
+def _norm(name: str) -> str:
+    return str(name).strip().rstrip(".").lower()
+
+
+_RDTYPE_CODES: Dict[str, int] = {}
+
+
+def _rdtype_code(rdtype: str) -> int:
+    code = _RDTYPE_CODES.get(rdtype)
+    if code is None:
+        code = _RDTYPE_CODES[rdtype] = dns.rdatatype.from_text(rdtype)
+    return code
+
+
+# --- ワイヤ形式 ---
+
+def encode_name(name: str) -> bytes:
+    name = name.rstrip(".")
+    out = bytearray()
+    if name:
+        for label in (name.encode("ascii") if name.isascii() else name.encode("idna")).split(b"."):
+            if not 0 < len(label) < 64:
+                raise ValueError(f"invalid label in {name!r}")
+            out.append(len(label))
+            out += label
+    out.append(0)
+    return bytes(out)
+
+
+def build_query(qid: int, name: str, rdtype: int, rd: bool = True) -> bytes:
+    """EDNS0 付きの問い合わせを組み立てる（rd=False で権威サーバ向け）"""
+    head = _HEADER.pack(qid, 0x0100 if rd else 0, 1, 0, 0, 1)
+    return head + encode_name(name) + struct.pack("!HH", rdtype, 1) + _OPT
+
+
+def _skip_name(wire: bytes, off: int) -> int:
+    while True:
+        n = wire[off]
+        if n == 0:
+            return off + 1
+        if n >= 0xC0:
+            return off + 2
+        off += 1 + n
+
+
+def _read_name(wire: bytes, off: int) -> Tuple[str, int]:
+    """off から（圧縮を展開しつつ）名前を読み、(末尾のドット無しの名前, 名前の直後) を返す"""
+    labels: List[bytes] = []
+    end = -1
+    hops = 0
+    while True:
+        n = wire[off]
+        if n == 0:
+            off += 1
+            break
+        if n >= 0xC0:
+            if end < 0:
+                end = off + 2
+            hops += 1
+            if hops > 64:
+                raise _Unparsed
+            off = (n & 0x3F) << 8 | wire[off + 1]
+            continue
+        if n > 63:
+            raise _Unparsed
+        label = wire[off + 1:off + 1 + n]
+        if len(label) != n or label.translate(None, _PLAIN):
+            raise _Unparsed
+        labels.append(label)
+        off += 1 + n
+    return b".".join(labels).decode("ascii"), end if end >= 0 else off
+
+
+def _rdata_text(wire: bytes, off: int, rdlen: int, rdtype: int) -> str:
+    """dnspython の str(rdata) と同じ表記にする"""
+    if rdtype == _A:
+        if rdlen != 4:
+            raise _Unparsed
+        return "%d.%d.%d.%d" % (wire[off], wire[off + 1], wire[off + 2], wire[off + 3])
+    if rdtype == _AAAA:
+        if rdlen != 16:
+            raise _Unparsed
+        return socket.inet_ntop(socket.AF_INET6, wire[off:off + 16])
+    if rdtype == _MX:
+        return f"{wire[off] << 8 | wire[off + 1]} {_read_name(wire, off + 2)[0]}."
+    return _read_name(wire, off)[0] + "."
+
+
+class RawResponse:
+    """否定応答のキャッシュ期間だけを持つ応答（dns_cache.negative_ttl が参照する）"""
+
+    __slots__ = ("soa_ttl",)
+    authority = ()
+
+    def __init__(self, soa_ttl: Optional[int]) -> None:
+        self.soa_ttl = soa_ttl
+
+
+class RawAnswer:
+    """dns.resolver.Answer の代わりに返す軽量な応答。レコードは文字列で持つ"""
+
+    __slots__ = ("rrset", "response", "expiration")
+
+    def __init__(self, records: Optional[List[str]], ttl: int, soa_ttl: Optional[int] = None) -> None:
+        self.rrset = records
+        self.response = RawResponse(soa_ttl)
+        self.expiration = time.time() + ttl
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.rrset or ())
+
+    def __len__(self) -> int:
+        return len(self.rrset or ())
+
+
+def parse_response(wire: bytes, name: str, rdtype: int):
+    """
+    応答を解釈して RawAnswer（自前で扱えない種別・名前は dns.resolver.Answer）を返す
+
+    NXDOMAIN・SERVFAIL 等は dnspython と同じ例外を送出する。
+    """
+    try:
+        return _parse_fast(wire, name, rdtype)
+    except (_Unparsed, IndexError, struct.error, UnicodeDecodeError):
+        return _parse_dnspython(wire, name, rdtype)
+
+
+def _parse_fast(wire: bytes, name: str, rdtype: int) -> RawAnswer:
+    if rdtype not in _FAST_TYPES:
+        raise _Unparsed
+    rcode = wire[3] & 0x0F
+    qdcount, ancount, nscount = struct.unpack_from("!HHH", wire, 4)
+    off = 12
+    for _ in range(qdcount):
+        off = _skip_name(wire, off) + 4
+    # 所有者名 → [レコード, 最小TTL]
+    found: Dict[str, list] = {}
+    cnames: Dict[str, Tuple[str, int]] = {}
+    for _ in range(ancount):
+        # 多くの応答は所有者名を問い合わせ名（オフセット12）への圧縮ポインタで書く
+        if wire[off] == 0xC0 and wire[off + 1] == 12:
+            owner, off = name, off + 2
+        else:
+            owner, off = _read_name(wire, off)
+        typ, _, ttl, rdlen = _RR.unpack_from(wire, off)
+        off += 10
+        if typ == rdtype:
+            ent = found.setdefault(owner.lower(), [[], ttl])
+            ent[0].append(_rdata_text(wire, off, rdlen, typ))
+            ent[1] = min(ent[1], ttl)
+        elif typ == _CNAME:
+            cnames[owner.lower()] = (_read_name(wire, off)[0].lower(), ttl)
+        off += rdlen
+    soa_ttl = None
+    for _ in range(nscount):
+        off = _skip_name(wire, off)
+        typ, _, ttl, rdlen = _RR.unpack_from(wire, off)
+        off += 10
+        if typ == _SOA and soa_ttl is None:
+            soa_ttl = min(ttl, struct.unpack_from("!I", wire, off + rdlen - 4)[0])
+        off += rdlen
+
+    if rcode == 3:
+        qname = dns.name.Name([label.encode() for label in name.split(".") if label] + [b""])
+        raise dns.resolver.NXDOMAIN(qnames=[qname], responses={qname: RawResponse(soa_ttl)})
+    if rcode != 0:
+        raise dns.resolver.NoNameservers(f"{name}: rcode {rcode}")
+    # CNAME を辿り、最後の名前のレコードを返す
+    cur = name.lower()
+    ttl = None
+    for _ in range(MAX_CNAME):
+        ent = found.get(cur)
+        if ent is not None:
+            return RawAnswer(ent[0], ent[1] if ttl is None else min(ttl, ent[1]))
+        nxt = cnames.get(cur)
+        if nxt is None:
+            break
+        cur = nxt[0]
+        ttl = nxt[1] if ttl is None else min(ttl, nxt[1])
+    return RawAnswer(None, 0, soa_ttl)
+
+
+def _parse_dnspython(wire: bytes, name: str, rdtype: int):
+    import dns.message
+    import dns.rcode
+    import dns.rdataclass
+
+    msg = dns.message.from_wire(wire)
+    qname = dns.name.from_text(name)
+    rcode = msg.rcode()
+    if rcode == dns.rcode.NXDOMAIN:
+        raise dns.resolver.NXDOMAIN(qnames=[qname], responses={qname: msg})
+    if rcode != dns.rcode.NOERROR:
+        raise dns.resolver.NoNameservers(f"{name}: {dns.rcode.to_text(rcode)}")
+    return dns.resolver.Answer(qname, rdtype, dns.rdataclass.IN, msg)
+
+
+# --- 送信中の問い合わせ ---
+
+class _Query:
+    __slots__ = ("name", "rdtype", "code", "wire", "qend", "key", "server", "tries", "result", "fut")
+
+    def __init__(self, name: str, rdtype: str, code: int) -> None:
+        self.name = name
+        self.rdtype = rdtype
+        self.code = code
+        self.wire = b""
+        self.qend = 0
+        self.key = -1
+        self.server = 0
+        self.tries = 0
+        # 応答のワイヤ形式、または例外
+        self.result: object = None
+        self.fut: Optional[asyncio.Future] = None
+
+
+# 呼び出し側が待つのをやめた問い合わせ
+_ABANDONED = object()
+
+
+class _Flight:
+    """
+    ソケット群と応答待ちの問い合わせ（同期用・非同期用で別々に持つ）
+
+    応答はソケット番号とクエリIDを合わせたキーで引く。再送期限は送信順に deque へ積む
+    （期限は単調に増えるので先頭だけ見ればよい）。
+
+    同時に応答を待つ数（window）は応答1件ごとに1増やし、タイムアウトが出たら半分にする
+    （1回の待ち時間の間に何度も出ても半分にするのは1回）。サーバが捌ききれない時に
+    再送がさらに詰まらせるのを避ける。
+    """
+
+    MIN_WINDOW = 10
+
+    def __init__(
+        self,
+        servers: List[Tuple[str, int]],
+        sockets: int,
+        timeout: float,
+        retries: int,
+        rd: bool = True,
+        max_window: int = 1000,
+    ) -> None:
+        self.servers = servers
+        self.rd = rd
+        self.max_window = max(self.MIN_WINDOW, max_window)
+        self.window = min(self.max_window, 100)
+        self._shrunk = float("-inf")
+        self.addresses = {s[0] for s in servers}
+        self.timeout = timeout
+        self.retries = retries
+        self.socks: List[socket.socket] = []
+        self._family_socks: Dict[int, List[int]] = {}
+        for family in sorted({_family(host) for host, _ in servers}):
+            for _ in range(sockets):
+                s = socket.socket(family, socket.SOCK_DGRAM)
+                s.setblocking(False)
+                try:
+                    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                except OSError:
+                    pass
+                self._family_socks.setdefault(family, []).append(len(self.socks))
+                self.socks.append(s)
+        self.pending: Dict[int, _Query] = {}
+        self.deadlines: Deque[Tuple[float, int, _Query]] = deque()
+        self._next = 0
+        self.sent = 0
+        self.retransmits = 0
+        self.timeouts = 0
+
+    def _assign(self, q: _Query) -> None:
+        """q.server に合うソケットと未使用のクエリIDを選ぶ"""
+        socks = self._family_socks[_family(self.servers[q.server][0])]
+        idx = socks[self._next % len(socks)]
+        while True:
+            key = idx << 16 | secrets.randbits(16)
+            if key not in self.pending:
+                break
+        if q.key >= 0:
+            self.pending.pop(q.key, None)
+        q.key = key
+        q.wire = struct.pack("!H", key & 0xFFFF) + q.wire[2:]
+        self.pending[key] = q
+
+    def start(self, name: str, rdtype: str, now: float) -> _Query:
+        q = _Query(name, rdtype, _rdtype_code(rdtype))
+        q.wire = build_query(0, name, q.code, self.rd)
+        q.qend = len(q.wire) - len(_OPT)
+        q.server = self._next % len(self.servers)
+        self._next += 1
+        self._assign(q)
+        self._send(q, now)
+        return q
+
+    def _send(self, q: _Query, now: float) -> None:
+        q.tries += 1
+        self.sent += 1
+        try:
+            self.socks[q.key >> 16].sendto(q.wire, self.servers[q.server])
+        except OSError as e:
+            # 送信バッファが一杯・経路が無い等は再送に任せる
+            log.debug(f"{q.name} {q.rdtype}: send failed: {e!r}")
+        self.deadlines.append((now + self.timeout, q.tries, q))
+
+    def _resend(self, q: _Query, now: float) -> None:
+        """次のサーバへ送り直す（アドレスファミリが変わる時はソケットとIDも取り直す）"""
+        prev = self.servers[q.server][0]
+        q.server = (q.server + 1) % len(self.servers)
+        if _family(prev) != _family(self.servers[q.server][0]):
+            self._assign(q)
+        self._send(q, now)
+
+    def _matches(self, q: _Query, wire: bytes, addr) -> bool:
+        if addr[0] not in self.addresses or wire[4:6] != b"\x00\x01":
+            return False
+        question = wire[12:q.qend]
+        return question == q.wire[12:q.qend] or question.lower() == q.wire[12:q.qend].lower()
+
+    def receive(self, idx: int, now: float) -> List[_Query]:
+        """ソケット idx に届いた応答をすべて読み、完了した問い合わせを返す"""
+        sock = self.socks[idx]
+        done: List[_Query] = []
+        while True:
+            try:
+                wire, addr = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return done
+            except OSError:
+                return done
+            if len(wire) < 12:
+                continue
+            q = self.pending.get(idx << 16 | wire[0] << 8 | wire[1])
+            if q is None or not self._matches(q, wire, addr):
+                continue
+            # SERVFAIL/REFUSED は未使用のサーバがあればすぐそちらへ送り直す
+            if wire[3] & 0x0F in (2, 5) and q.tries < len(self.servers):
+                self._resend(q, now)
+                continue
+            del self.pending[q.key]
+            q.result = wire
+            done.append(q)
+            if self.window < self.max_window:
+                self.window += 1
+
+    def expire(self, now: float) -> List[_Query]:
+        """期限切れの問い合わせを再送し、再送し尽くしたものを Timeout で完了させて返す"""
+        done: List[_Query] = []
+        deadlines = self.deadlines
+        while deadlines and deadlines[0][0] <= now:
+            _, tries, q = deadlines.popleft()
+            # 応答済み・既に再送済み
+            if q.result is not None or q.tries != tries:
+                continue
+            if now - self._shrunk >= self.timeout:
+                self._shrunk = now
+                self.window = max(self.MIN_WINDOW, self.window // 2)
+            if q.tries > self.retries:
+                self.pending.pop(q.key, None)
+                self.timeouts += 1
+                q.result = dns.exception.Timeout(timeout=self.timeout * q.tries)
+                done.append(q)
+            else:
+                self.retransmits += 1
+                self._resend(q, now)
+        return done
+
+    @property
+    def room(self) -> int:
+        """今送り始めてよい問い合わせの数"""
+        return self.window - len(self.pending)
+
+    def abandon(self, q: _Query) -> None:
+        if q.result is None:
+            q.result = _ABANDONED
+            self.pending.pop(q.key, None)
+
+    def next_deadline(self) -> Optional[float]:
+        return self.deadlines[0][0] + TIMER_SLACK if self.deadlines else None
+
+    def close(self) -> None:
+        for s in self.socks:
+            s.close()
+        self.pending.clear()
+        self.deadlines.clear()
+
+
+def _family(host: str) -> int:
+    return socket.AF_INET6 if ":" in host else socket.AF_INET
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return buf
+
+
+class UdpBackend:
+    """
+    ワイヤ形式の問い合わせを少数の UDP ソケットからまとめて送るバックエンド
+
+    Args:
+        nameservers: 問い合わせ先（省略時はシステム設定）。問い合わせ毎に順番に割り振る
+        port: 問い合わせ先のポート
+        timeout: 1回の送信あたりの待ち時間（秒）
+        retries: タイムアウト時の再送回数（再送毎に次のサーバへ送る）
+        sockets: アドレスファミリ毎のソケット数
+        max_inflight: 同時に応答を待つ問い合わせ数の上限（実際の数はタイムアウトの割合で増減する）
+        rd: False なら再帰要求なしで送る（権威サーバ向け）
+    """
+
+    def __init__(
+        self,
+        nameservers: Optional[List[str]] = None,
+        port: int = 53,
+        timeout: float = 1.0,
+        retries: int = 2,
+        sockets: int = 4,
+        max_inflight: int = 1000,
+        rd: bool = True,
+    ) -> None:
+        if not nameservers:
+            from dns_cache import system_nameservers
+            nameservers = system_nameservers()
+        self.servers = [(ns, port) for ns in nameservers]
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.sockets = sockets
+        self.max_inflight = max_inflight
+        self.rd = rd
+        self.truncated = 0
+        self._lock = threading.Lock()
+        self._sync: Optional[_Flight] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        # 非同期側はイベントループ毎に読み取りを登録し直す
+        self._async: Optional[_Flight] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # window の空きを待っている aquery
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._readers = False
+        self._threaded = False
+
+    def _flight(self) -> _Flight:
+        return _Flight(self.servers, self.sockets, self.timeout, self.retries, self.rd, self.max_inflight)
+
+    # --- 応答の仕上げ ---
+
+    def _tcp(self, q: _Query) -> bytes:
+        try:
+            with socket.create_connection(self.servers[q.server], timeout=self.timeout) as s:
+                s.sendall(struct.pack("!H", len(q.wire)) + q.wire)
+                n = struct.unpack("!H", _recv_exact(s, 2))[0]
+                return _recv_exact(s, n)
+        except socket.timeout:
+            raise dns.exception.Timeout(timeout=self.timeout)
+
+    async def _atcp(self, q: _Query) -> bytes:
+        async def exchange() -> bytes:
+            reader, writer = await asyncio.open_connection(*self.servers[q.server])
+            try:
+                writer.write(struct.pack("!H", len(q.wire)) + q.wire)
+                n = struct.unpack("!H", await reader.readexactly(2))[0]
+                return await reader.readexactly(n)
+            finally:
+                writer.close()
+
+        try:
+            return await asyncio.wait_for(exchange(), self.timeout)
+        except asyncio.TimeoutError:
+            raise dns.exception.Timeout(timeout=self.timeout)
+
+    def _truncated(self, q: _Query) -> bool:
+        if q.result[2] & 0x02:
+            self.truncated += 1
+            return True
+        return False
+
+    # --- 同期 ---
+
+    def resolve_many(self, questions: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str, object]]:
+        """
+        (名前, 種別) の列をまとめて送り、完了した順に (名前, 種別, 応答または例外) を返す
+
+        同時に応答を待つのは window 件までで、空きができ次第次の問い合わせを送る。
+        """
+        with self._lock:
+            if self._sync is None:
+                self._sync = self._flight()
+                self._selector = selectors.DefaultSelector()
+                for i, s in enumerate(self._sync.socks):
+                    self._selector.register(s, selectors.EVENT_READ, i)
+            flight, sel = self._sync, self._selector
+            todo = iter(questions)
+            more = True
+            try:
+                while True:
+                    now = time.monotonic()
+                    while more and flight.room > 0:
+                        item = next(todo, None)
+                        if item is None:
+                            more = False
+                            break
+                        name, rdtype = _norm(item[0]), item[1].upper()
+                        try:
+                            flight.start(name, rdtype, now)
+                        except Exception as e:
+                            yield name, rdtype, e
+                    if not flight.pending:
+                        return
+                    deadline = flight.next_deadline()
+                    done: List[_Query] = []
+                    for key, _ in sel.select(max(0.0, deadline - now) if deadline else self.timeout):
+                        done += flight.receive(key.data, now)
+                    done += flight.expire(time.monotonic())
+                    for q in done:
+                        yield q.name, q.rdtype, self._finish(q)
+            finally:
+                # 途中で止めた場合に残りの待ちを捨てる
+                flight.pending.clear()
+                flight.deadlines.clear()
+
+    def _finish(self, q: _Query) -> object:
+        if isinstance(q.result, BaseException):
+            return q.result
+        try:
+            wire = self._tcp(q) if self._truncated(q) else q.result
+            return parse_response(wire, q.name, q.code)
+        except Exception as e:
+            return e
+
+    def query(self, name: str, rdtype: str):
+        for _, _, res in self.resolve_many([(name, rdtype)]):
+            if isinstance(res, BaseException):
+                raise res
+            return res
+        raise dns.exception.Timeout(timeout=self.timeout)
+
+    # --- 非同期 ---
+
+    def _attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """loop にソケットの読み取りを登録する（前のループの登録は外す）"""
+        if self._async is not None:
+            self._detach()
+        self._async = self._flight()
+        self._loop = loop
+        self._waiters = deque()
+        for i, s in enumerate(self._async.socks):
+            loop.add_reader(s.fileno(), self._on_readable, i)
+        self._readers = True
+
+    def _detach(self) -> None:
+        if self._readers and self._loop is not None and not self._loop.is_closed():
+            for s in self._async.socks:
+                self._loop.remove_reader(s.fileno())
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._readers = False
+        self._async.close()
+        self._async = None
+
+    def _on_readable(self, idx: int) -> None:
+        self._wake(self._async.receive(idx, self._loop.time()))
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._wake(self._async.expire(self._loop.time()))
+
+    def _wake(self, done: List[_Query]) -> None:
+        """完了した問い合わせの待ちを解き、空いた window の分だけ順番待ちを通す"""
+        for q in done:
+            if q.fut is not None and not q.fut.done():
+                q.fut.set_result(None)
+        room = self._async.room
+        while room > 0 and self._waiters:
+            w = self._waiters.popleft()
+            if not w.done():
+                w.set_result(None)
+                room -= 1
+        if self._timer is None:
+            deadline = self._async.next_deadline()
+            if deadline is not None:
+                self._timer = self._loop.call_at(deadline, self._on_timer)
+
+    async def aquery(self, name: str, rdtype: str):
+        loop = asyncio.get_running_loop()
+        if self._threaded:
+            return await asyncio.to_thread(self.query, name, rdtype)
+        if loop is not self._loop or self._async is None:
+            try:
+                self._attach(loop)
+            except NotImplementedError:
+                # add_reader の無いイベントループ（Windows の Proactor）では同期版をスレッドで使う
+                self._detach()
+                self._threaded = True
+                return await asyncio.to_thread(self.query, name, rdtype)
+        name, rdtype = _norm(name), rdtype.upper()
+        flight = self._async
+        if flight.room <= 0 or self._waiters:
+            w = loop.create_future()
+            self._waiters.append(w)
+            await w
+        q = flight.start(name, rdtype, loop.time())
+        q.fut = loop.create_future()
+        try:
+            self._wake([])
+            await q.fut
+        finally:
+            if q.result is None:
+                flight.abandon(q)
+                self._wake([])
+        if isinstance(q.result, BaseException):
+            raise q.result
+        wire = await self._atcp(q) if self._truncated(q) else q.result
+        return parse_response(wire, name, q.code)
+
+    # --- 集計・終了 ---
+
+    def stats(self) -> Dict[str, int]:
+        flights = [f for f in (self._sync, self._async) if f is not None]
+        return {
+            "sent": sum(f.sent for f in flights),
+            "retransmits": sum(f.retransmits for f in flights),
+            "timeouts": sum(f.timeouts for f in flights),
+            "truncated": self.truncated,
+        }
+
+    def close(self) -> None:
+        if self._async is not None:
+            self._detach()
+        if self._sync is not None:
+            self._selector.close()
+            self._sync.close()
+            self._sync = None
+
+
+def make_backend(
+    kind: Optional[str],
+    nameservers: Optional[List[str]] = None,
+    port: int = 53,
+    timeout: float = 2,
+    lifetime: float = 5,
+    max_inflight: int = 1000,
+):
+    """--backend の値からバックエンドを作る（"dnspython" は None = CachingResolver 内蔵の問い合わせ）"""
+    if kind in (None, "dnspython"):
+        return None
+    if kind == "udp":
+        # dnspython の lifetime と同じく、全体の待ち時間に収まる回数だけ再送する
+        retries = max(0, int(lifetime // timeout) - 1)
+        return UdpBackend(
+            nameservers, port=port, timeout=timeout, retries=retries, max_inflight=max_inflight,
+        )
+    raise ValueError(f"unknown backend: {kind}")
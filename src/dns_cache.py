@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+実行中に共有するDNS応答キャッシュ
+
+(name, rdtype) をキーに、レコードのTTLに従って応答を保持する。
+NXDOMAIN/NODATA は SOA の minimum を上限とした TTL でネガティブキャッシュする。
+store に PersistentCache を渡すとメモリのミス時に参照し、書込みも反映する。
+CachingResolver の問い合わせは metrics.METRICS に応答種別と遅延を記録する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.rdatatype
+import dns.resolver
+
+from metrics import METRICS, dns_outcome
+
+log = logging.getLogger(__name__)
+
+DEFAULT_NAMESERVERS = ["1.1.1.1"]
+
+Key = Tuple[str, str]
+
+
+def _norm(name: str) -> str:
+    return str(name).strip().rstrip(".").lower()
+
+
+def negative_ttl(response, default: float) -> float:
+    """権威セクションのSOAから RFC 2308 のネガティブTTLを求める"""
+    if response is None:
+        return default
+    # dns_backend の軽量な応答は SOA から求めた値だけを持つ
+    soa_ttl = getattr(response, "soa_ttl", None)
+    if soa_ttl is not None:
+        return float(soa_ttl)
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA:
+            return float(min(rrset.ttl, rrset[0].minimum))
+    return default
+
+
+class DNSCache:
+    """TTLとLRU上限つきのDNS応答キャッシュ"""
+
+    def __init__(
+        self,
+        maxsize: int = 100_000,
+        negative_ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+        store=None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.store = store
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._data: "OrderedDict[Key, Tuple[float, List[str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # 同じ問い合わせの完了待ちに合流した数（CachingResolver.aresolve が数える）
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, name: str, rdtype: str) -> Optional[List[str]]:
+        """キャッシュ済みならレコード（否定応答は空リスト）、未取得なら None"""
+        key = (_norm(name), rdtype.upper())
+        ent = self._data.get(key)
+        if ent is not None:
+            expires, records = ent
+            if expires > self.clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return list(records)
+            del self._data[key]
+        if self.store is not None:
+            found = self.store.get_dns(*key)
+            if found is not None:
+                records, remaining = found
+                self._remember(key, records, remaining)
+                self.hits += 1
+                return list(records)
+        self.misses += 1
+        return None
+
+    def put(self, name: str, rdtype: str, records: List[str], ttl: float) -> None:
+        if ttl <= 0:
+            return
+        key = (_norm(name), rdtype.upper())
+        self._remember(key, records, ttl)
+        if self.store is not None:
+            self.store.put_dns(key[0], key[1], list(records), ttl)
+
+    def _remember(self, key: Key, records: List[str], ttl: float) -> None:
+        self._data[key] = (self.clock() + ttl, list(records))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        # 合流した分も問い合わせを省いたのでヒット率に含める（metrics の cache_hit_rate と同じ）
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+            "size": len(self._data),
+            "evictions": self.evictions,
+        }
+
+
+# 同一プロセス内の domain2fqdns / fqdn2ips で共有する
+SHARED_CACHE = DNSCache()
+
+
+def system_nameservers() -> List[str]:
+    try:
+        return list(dns.resolver.Resolver().nameservers)
+    except Exception:
+        return list(DEFAULT_NAMESERVERS)
+
+
+class RateLimiter:
+    """トークンバケットによる秒間クエリ数の制限"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, int(rate)))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ResolverPool:
+    """
+    ネームサーバ毎の非同期リゾルバを順番に使う問い合わせプール
+
+    同時実行数は全体で concurrency、各サーバは rate_per_ns（0で無制限）に制限する。
+    タイムアウトしたサーバは飛ばして次のサーバで再試行する。
+    CachingResolver.aresolve の query 引数に query を渡して使う。
+    """
+
+    def __init__(
+        self,
+        nameservers: Optional[List[str]] = None,
+        port: int = 53,
+        timeout: float = 3,
+        lifetime: float = 6,
+        concurrency: int = 100,
+        rate_per_ns: float = 0,
+    ) -> None:
+        self.nameservers = list(nameservers) if nameservers else system_nameservers()
+        self.port = port
+        self.timeout = timeout
+        self.lifetime = lifetime
+        self.concurrency = concurrency
+        self.rate_per_ns = rate_per_ns
+        self._members: List[Tuple[dns.asyncresolver.Resolver, RateLimiter]] = []
+        self._next = 0
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def _build(self) -> None:
+        for ns in self.nameservers:
+            r = dns.asyncresolver.Resolver(configure=False)
+            r.nameservers = [ns]
+            r.port = self.port
+            r.timeout = self.timeout
+            r.lifetime = self.lifetime
+            self._members.append((r, RateLimiter(self.rate_per_ns)))
+        self._sem = asyncio.Semaphore(self.concurrency)
+
+    async def query(self, name: str, rdtype: str):
+        if not self._members:
+            self._build()
+        async with self._sem:
+            for attempt in range(len(self._members)):
+                resolver, limiter = self._members[self._next % len(self._members)]
+                self._next += 1
+                await limiter.acquire()
+                try:
+                    return await resolver.resolve(name, rdtype, raise_on_no_answer=False)
+                except (dns.exception.Timeout, dns.resolver.NoNameservers):
+                    if attempt == len(self._members) - 1:
+                        raise
+
+
+class BudgetExhausted(Exception):
+    """問い合わせ予算を使い切った"""
+
+
+class QueryBudget:
+    """
+    問い合わせ数の上限つきで query を呼ぶ
+
+    上限に達した後の問い合わせは BudgetExhausted になり、CachingResolver は
+    キャッシュせず空の応答として扱う。query を通さずに送る問い合わせ（ゾーン走査の
+    AXFR/NSEC 等）は送る前に charge() で数える。
+    """
+
+    def __init__(self, query: Callable[[str, str], Awaitable], limit: Optional[int] = None) -> None:
+        self._query = query
+        self.limit = limit
+        self.used = 0
+        # ゾーン走査はスレッドで動くので charge() は排他する
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self) -> bool:
+        return self.limit is not None and self.used >= self.limit
+
+    def charge(self, what: str = "") -> None:
+        """問い合わせ1件分を使う。予算切れなら BudgetExhausted"""
+        with self._lock:
+            if self.exhausted:
+                raise BudgetExhausted(what)
+            self.used += 1
+
+    async def query(self, name: str, rdtype: str):
+        self.charge(f"{name} {rdtype}")
+        return await self._query(name, rdtype)
+
+
+class CachingResolver:
+    """
+    DNSCache を通して名前解決するリゾルバ（同期・非同期兼用）
+
+    backend（dns_backend.py）を渡すとキャッシュミス時の問い合わせをそれで送る。
+    省略時は dnspython の Resolver で問い合わせる。
+    """
+
+    def __init__(
+        self,
+        nameservers: Optional[List[str]] = None,
+        cache: Optional[DNSCache] = None,
+        port: int = 53,
+        timeout: float = 3,
+        lifetime: float = 6,
+        backend=None,
+    ) -> None:
+        self.cache = cache if cache is not None else SHARED_CACHE
+        self.backend = backend
+        self.nameservers = list(nameservers) if nameservers else None
+        self.port = port
+        self.timeout = timeout
+        self.lifetime = lifetime
+        self._sync: Optional[dns.resolver.Resolver] = None
+        self._async: Optional[dns.asyncresolver.Resolver] = None
+        self._inflight: Dict[Key, "asyncio.Future[List[str]]"] = {}
+
+    def _configure(self, r: dns.resolver.Resolver) -> dns.resolver.Resolver:
+        if self.nameservers or not r.nameservers:
+            r.nameservers = self.nameservers or list(DEFAULT_NAMESERVERS)
+        r.port = self.port
+        r.timeout = self.timeout
+        r.lifetime = self.lifetime
+        return r
+
+    def _make(self, cls):
+        try:
+            r = cls(configure=not self.nameservers)
+        except dns.resolver.NoResolverConfiguration:
+            r = cls(configure=False)
+        return self._configure(r)
+
+    # --- 応答の変換 ---
+
+    @staticmethod
+    def _outcome(ans) -> str:
+        return "ok" if ans.rrset is not None else "nodata"
+
+    def _store(self, name: str, rdtype: str, ans) -> List[str]:
+        if ans.rrset is None:
+            ttl = negative_ttl(ans.response, self.cache.negative_ttl)
+            self.cache.put(name, rdtype, [], ttl)
+            return []
+        records = [str(r).strip() for r in ans]
+        self.cache.put(name, rdtype, records, ans.expiration - time.time())
+        return records
+
+    def _store_nxdomain(self, name: str, rdtype: str, e: dns.resolver.NXDOMAIN) -> None:
+        response = next(iter(e.responses().values()), None)
+        self.cache.put(name, rdtype, [], negative_ttl(response, self.cache.negative_ttl))
+
+    # --- 同期 ---
+
+    def resolve(
+        self, name: str, rdtype: str, query: Optional[Callable[[str, str], object]] = None
+    ) -> List[str]:
+        """query で実際の問い合わせ方法（権威サーバへの直接問い合わせ等）を差し替えられる"""
+        name, rdtype = _norm(name), rdtype.upper()
+        if not name:
+            return []
+        cached = self.cache.get(name, rdtype)
+        METRICS.observe_cache(cached is not None)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        try:
+            ans = (query or self.upstream)(name, rdtype)
+        except dns.resolver.NXDOMAIN as e:
+            METRICS.observe_dns(rdtype, "nxdomain", time.perf_counter() - start)
+            self._store_nxdomain(name, rdtype, e)
+            return []
+        except Exception as e:
+            # タイムアウト/SERVFAILはキャッシュしない
+            METRICS.observe_dns(rdtype, dns_outcome(e), time.perf_counter() - start)
+            log.debug(f"{name} {rdtype}: {e!r}")
+            return []
+        METRICS.observe_dns(rdtype, self._outcome(ans), time.perf_counter() - start)
+        return self._store(name, rdtype, ans)
+
+    # --- 非同期 ---
+
+    async def aresolve(
+        self,
+        name: str,
+        rdtype: str,
+        query: Optional[Callable[[str, str], Awaitable]] = None,
+    ) -> List[str]:
+        """非同期版。query で実際の問い合わせ方法（プールやレート制限）を差し替えられる"""
+        name, rdtype = _norm(name), rdtype.upper()
+        if not name:
+            return []
+        key = (name, rdtype)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # 同じ問い合わせの完了待ちはキャッシュを引かず、両方の集計で合流として数える
+            self.cache.coalesced += 1
+            METRICS.observe_cache(False, coalesced=True)
+            return list(await asyncio.shield(pending))
+        cached = self.cache.get(name, rdtype)
+        METRICS.observe_cache(cached is not None)
+        if cached is not None:
+            return cached
+
+        fut: "asyncio.Future[List[str]]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            records = await self._aquery(name, rdtype, query)
+            fut.set_result(records)
+            return records
+        finally:
+            if not fut.done():
+                fut.set_result([])
+            del self._inflight[key]
+
+    async def _aquery(self, name: str, rdtype: str, query) -> List[str]:
+        if query is None:
+            query = self.aupstream
+        start = time.perf_counter()
+        try:
+            ans = await query(name, rdtype)
+        except dns.resolver.NXDOMAIN as e:
+            METRICS.observe_dns(rdtype, "nxdomain", time.perf_counter() - start)
+            self._store_nxdomain(name, rdtype, e)
+            return []
+        except Exception as e:
+            METRICS.observe_dns(rdtype, dns_outcome(e), time.perf_counter() - start)
+            log.debug(f"{name} {rdtype}: {e!r}")
+            return []
+        METRICS.observe_dns(rdtype, self._outcome(ans), time.perf_counter() - start)
+        return self._store(name, rdtype, ans)
+
+    # --- キャッシュを通さない問い合わせ ---
+
+    def upstream(self, name: str, rdtype: str):
+        """設定されたネームサーバ（再帰リゾルバ）へ問い合わせ、Answer を返す"""
+        if self.backend is not None:
+            return self.backend.query(name, rdtype)
+        if self._sync is None:
+            self._sync = self._make(dns.resolver.Resolver)
+        return self._sync.resolve(name, rdtype, raise_on_no_answer=False)
+
+    async def aupstream(self, name: str, rdtype: str):
+        if self.backend is not None:
+            return await self.backend.aquery(name, rdtype)
+        if self._async is None:
+            self._async = self._make(dns.asyncresolver.Resolver)
+        return await self._async.resolve(name, rdtype, raise_on_no_answer=False)
+
+    def stats(self) -> Dict[str, float]:
+        return self.cache.stats()
@@ -4,28 +4,36 @@
 from __future__ import annotations
 
 import os
-import socket
-import time
+import secrets
 import logging
-from typing import Set, List, Dict, Optional
-from urllib.parse import quote
+from typing import TYPE_CHECKING, Set, List, Dict, Iterable, Optional
 from pathlib import Path
 
-import dns.resolver
-import requests
+from metrics import METRICS, add_metrics_arguments, start_from_args
+from name_store import NameBloom, NameTrie
+from persistent_cache import add_cache_arguments, open_from_args
 
-# .env をリポジトリ直下から読込
-try:
-    from dotenv import load_dotenv
-    ROOT = Path(__file__).resolve().parents[1]
-    load_dotenv(ROOT / ".env")
-except Exception:
-    pass
+# dnspython・asyncio・dotenv は使う段になってから読み込む（--help/--demo を速くする）
+if TYPE_CHECKING:
+    from authoritative import AuthoritativeResolver
+    from dns_cache import CachingResolver
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 log = logging.getLogger(__name__)
 
-SHODAN_API_KEY = os.getenv("SHODAN_API_KEY") or None
+_env_loaded = False
+
+
+def shodan_api_key() -> Optional[str]:
+    """リポジトリ直下の .env を（初回だけ）読み、SHODAN_API_KEY を返す"""
+    global _env_loaded
+    if not _env_loaded:
+        _env_loaded = True
+        try:
+            from dotenv import load_dotenv
+            load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+        except Exception:
+            pass
+    return os.getenv("SHODAN_API_KEY") or None
 
 
 class DomainEnumerator:
@@ -39,13 +47,61 @@ class DomainEnumerator:
     ]
     #各ゾーン直下でよく見られるホスト名
     HOST_LABELS = ["www", "mail", "mx", "smtp", "imap", "pop3", "ns1", "ns2"]
-
-    def __init__(self, domain: str, shodan_api_key: Optional[str] = None) -> None:
+    #ワイルドカード判定に使うランダムラベルの数
+    WILDCARD_PROBES = 2
+    #候補の一括検証で同時に送る問い合わせ数
+    VALIDATE_CONCURRENCY = 100
+    #候補の一括検証で一度に用意する名前の数（CTログ等の大量の候補でタスクを作りすぎない）
+    VALIDATE_BATCH = 2000
+    #変形候補（permutations.py）をまとめて解決する数
+    PERMUTATION_BATCH = 100
+
+    def __init__(
+        self,
+        domain: str,
+        shodan_api_key: Optional[str] = None,
+        resolver: Optional[CachingResolver] = None,
+        wordlist: Optional[Path] = None,
+        zone_walk: bool = True,
+        direct: bool = False,
+        backend=None,
+        ct_files: Iterable[Path] = (),
+        permute_budget: int = 0,
+    ) -> None:
         self.root = self._norm(domain)
         self.api_key = shodan_api_key
-        self.subdomains: Set[str] = set()
-        self.fqdns: Set[str] = set()
-        self.visited: Set[str] = set()
+        self._shodan = None
+        if resolver is None:
+            from dns_cache import CachingResolver
+            resolver = CachingResolver()
+        self.resolver = resolver
+        # 指定時はキャッシュミス時の問い合わせをこのバックエンド（dns_backend.py）で送る
+        self.backend = backend
+        if backend is not None:
+            resolver.backend = backend
+        # 指定時は各ゾーンでワードリスト総当たりを追加で行う
+        self.wordlist = Path(wordlist) if wordlist else None
+        # CTログのエクスポート（ct_logs.py）。指定が無くても永続キャッシュに取込み済みの候補は使う
+        self.ct_files = [Path(f) for f in ct_files]
+        # 発見済みの名前の変形を試す時のゾーンあたりの問い合わせ数の上限（0 なら試さない）
+        self.permute_budget = permute_budget
+        self._dot_root = f".{self.root}"
+        # 大量の名前を保持するので逆順ラベルのトライに入れる（走査は正規順）
+        self.subdomains = NameTrie()
+        self.fqdns = NameTrie()
+        self.visited = NameTrie()
+        # ゾーン → ランダムラベルへの応答（rtype毎）。空ならワイルドカード無し
+        self.wildcards: Dict[str, Dict[str, Set[str]]] = {}
+        # AXFR/NSEC/NSEC3 による高速経路を試すか。権威サーバのポートはテスト用に変更できる
+        self.zone_walk = zone_walk
+        self.authoritative_port = 53
+        # 再帰リゾルバを通さず権威サーバへ直接問い合わせるか（run() の開始時に用意する）
+        self.direct = direct
+        self.authoritative: Optional[AuthoritativeResolver] = None
+        # 高速経路で全名前を得たゾーン（総当たりを省く）
+        self.complete_zones: Set[str] = set()
+        # 変形候補として生成済みの名前（run() の開始時に用意する）
+        self.tried: Optional[NameBloom] = None
 
     @staticmethod
     def _norm(name: str) -> str:
@@ -54,25 +110,19 @@ class DomainEnumerator:
     # --- DNS解決 ---
 
     def _resolve(self, host: str, rtype: str) -> List[str]:
-        """DNS解決。A/AAAAはsocket、その他はdnspythonを利用"""
-        host = self._norm(host)
-        if not host:
-            return []
-        if rtype in ("A", "AAAA"):
-            try:
-                fam = socket.AF_INET if rtype == "A" else socket.AF_INET6
-                res = socket.getaddrinfo(host, None, fam, socket.SOCK_STREAM)
-                return sorted({x[4][0] for x in res})
-            except Exception:
-                pass
-        try:
-            resolver = dns.resolver.Resolver()
-            resolver.timeout = 3
-            resolver.lifetime = 6
-            ans = resolver.resolve(host, rtype, raise_on_no_answer=False)
-            return [str(r).strip() for r in ans] if ans.rrset else []
-        except Exception:
-            return []
+        """DNS解決。共有キャッシュを通し、ミス時はバックエンド（既定はdnspython）で問い合わせる"""
+        if self.authoritative is not None:
+            return self.resolver.resolve(host, rtype, query=self.authoritative.resolve)
+        return self.resolver.resolve(host, rtype)
+
+    def _aquery(self):
+        """非同期の段（候補の検証・総当たり・変形）の問い合わせ先。--direct 時は権威サーバへ直接送る"""
+        if self.authoritative is not None:
+            return self.authoritative.aquery
+        return self.backend.aquery if self.backend is not None else None
+
+    async def _aresolve(self, host: str, rtype: str) -> List[str]:
+        return await self.resolver.aresolve(host, rtype, query=self._aquery())
 
     def _exists(self, host: str) -> bool:
         return bool(self._resolve(host, "A") or self._resolve(host, "AAAA"))
@@ -80,11 +130,59 @@ class DomainEnumerator:
     def _is_delegated(self, zone: str) -> bool:
         return bool(self._resolve(zone, "NS"))
 
+    # --- ワイルドカード判定 ---
+
+    def _wildcard_probe_names(self, zone: str) -> List[str]:
+        return [f"{secrets.token_hex(8)}.{zone}" for _ in range(self.WILDCARD_PROBES)]
+
+    def _wildcard_fingerprint(self, zone: str) -> Dict[str, Set[str]]:
+        """ランダムラベルを一度だけ解決し、ゾーンのワイルドカード応答を記録する"""
+        z = self._norm(zone)
+        if z in self.wildcards:
+            return self.wildcards[z]
+        probes = self._wildcard_probe_names(z)
+        fp: Dict[str, Set[str]] = {"A": set(), "AAAA": set(), "NS": set()}
+        for name in probes:
+            for rtype in ("A", "AAAA"):
+                fp[rtype].update(self._resolve(name, rtype))
+        # A/AAAAのワイルドカードがある場合のみNSも確認する
+        if fp["A"] or fp["AAAA"]:
+            log.info(f"wildcard: *.{z}")
+            for name in probes:
+                fp["NS"].update(self._resolve(name, "NS"))
+        self.wildcards[z] = fp
+        return fp
+
+    def _matches_wildcard(self, zone: str, answers: Dict[str, List[str]]) -> bool:
+        """
+        応答がゾーンのワイルドカード応答に含まれるなら True
+        （ワイルドカードと同じIPを持つ実ホストも除外される）
+        """
+        fp = self.wildcards.get(self._norm(zone))
+        if not fp or not (fp["A"] or fp["AAAA"]):
+            return False
+        found = False
+        for rtype, values in answers.items():
+            if values:
+                if not set(values) <= fp[rtype]:
+                    return False
+                found = True
+        return found
+
+    def _is_wildcard_host(self, host: str, zone: str) -> bool:
+        # _exists直後に呼ぶのでキャッシュから応答が得られ、追加の問い合わせは発生しない
+        return self._matches_wildcard(
+            zone, {"A": self._resolve(host, "A"), "AAAA": self._resolve(host, "AAAA")}
+        )
+
+    def _is_wildcard_ns(self, sub: str, zone: str) -> bool:
+        return self._matches_wildcard(zone, {"NS": self._resolve(sub, "NS")})
+
     # --- 分類 ---
 
     def _add(self, host: str) -> None:
         h = self._norm(host)
-        if not (h.endswith(f".{self.root}") or h == self.root):
+        if not self._in_scope(h):
             return
 
         # apexはFQDNとして扱う
@@ -97,6 +195,46 @@ class DomainEnumerator:
         else:
             self.fqdns.add(h)
 
+    def _in_scope(self, host: str) -> bool:
+        return host == self.root or host.endswith(self._dot_root)
+
+    async def avalidate_candidates(self, cands: Iterable[str]) -> Dict[str, bool]:
+        """
+        候補をまとめて検証し、存在するもの → 委任されているか を返す
+
+        範囲外・発見済みの名前は問い合わせ前に除き、残りの A/AAAA/NS を一度に並行解決する。
+        """
+        hosts = sorted({
+            h for h in (self._norm(c) for c in cands)
+            if h and self._in_scope(h) and not self._known(h)
+        })
+        if not hosts:
+            return {}
+        import asyncio
+
+        sem = asyncio.Semaphore(self.VALIDATE_CONCURRENCY)
+
+        async def look(host: str, rtype: str) -> List[str]:
+            async with sem:
+                return await self._aresolve(host, rtype)
+
+        rtypes = ("A", "AAAA", "NS")
+        hits: Dict[str, bool] = {}
+        for start in range(0, len(hosts), self.VALIDATE_BATCH):
+            batch = hosts[start:start + self.VALIDATE_BATCH]
+            answers = await asyncio.gather(*(look(h, rt) for h in batch for rt in rtypes))
+            for i, h in enumerate(batch):
+                a, aaaa, ns = answers[i * 3:i * 3 + 3]
+                if a or aaaa:
+                    # apexはFQDNとして扱う
+                    hits[h] = bool(ns) and h != self.root
+        return hits
+
+    def validate_candidates(self, cands: Iterable[str]) -> Dict[str, bool]:
+        import asyncio
+
+        return asyncio.run(self.avalidate_candidates(cands))
+
     def _mx_hosts(self, mx_records: List[str]) -> Set[str]:
         out = set()
         for mx in mx_records:
@@ -113,79 +251,190 @@ class DomainEnumerator:
         """SHODAN APIを利用して候補を収集"""
         if not self.api_key:
             return
-        d = self._norm(zone)
-        cands: Set[str] = set()
+        self._merge_hits(self.validate_candidates(self._shodan_candidates(zone)))
 
-        # /dns/domain
-        try:
-            url = f"https://api.shodan.io/dns/domain/{quote(d)}"
-            r = requests.get(url, params={"key": self.api_key}, timeout=10)
-            if r.status_code == 200:
-                for sub in (r.json().get("subdomains") or []):
-                    sub = str(sub).strip()
-                    if sub:
-                        cands.add(f"{sub}.{d}")
-        except Exception as e:
-            log.warning(f"SHODAN dns/domain: {e}")
+    def _shodan_client(self):
+        if self._shodan is None:
+            from shodan_client import ShodanClient
+            self._shodan = ShodanClient(self.api_key)
+        return self._shodan
 
-        # /shodan/host/search
+    def _shodan_candidates(self, zone: str) -> Set[str]:
+        """SHODAN APIから候補ホスト名を取得（存在確認は行わない）"""
+        d = self._norm(zone)
+        store = self.resolver.cache.store
+        if store is not None:
+            cached = store.get_candidates("shodan", d)
+            if cached is not None:
+                return cached
         try:
-            for q in (f"domain:{d}", f'hostname:"*.{d}"'):
-                r = requests.get(
-                    "https://api.shodan.io/shodan/host/search",
-                    params={"key": self.api_key, "query": q, "page": 1},
-                    timeout=10,
-                )
-                if r.status_code == 200:
-                    data = r.json()
-                    for m in data.get("matches", []):
-                        for hn in m.get("hostnames", []) or []:
-                            cands.add(self._norm(hn))
-                        cn = (
-                            m.get("ssl", {})
-                             .get("cert", {})
-                             .get("subject", {})
-                             .get("CN")
-                        )
-                        if cn:
-                            cands.add(self._norm(str(cn)))
-                time.sleep(1)
+            cands = self._shodan_client().hostnames(d)
         except Exception as e:
-            log.warning(f"SHODAN host/search: {e}")
+            log.warning(f"SHODAN: {e}")
+            return set()
 
-        for h in sorted(cands):
-            if (h.endswith(f".{self.root}") or h == self.root) and self._exists(h):
-                self._add(h)
+        if store is not None:
+            store.put_candidates("shodan", d, cands)
+        return cands
+
+    def ct_search(self, zone: str) -> None:
+        """CTログ（SAN・CN）の名前を候補として収集"""
+        self._merge_hits(self.validate_candidates(self._ct_candidates(zone)))
+
+    def _ct_candidates(self, zone: str) -> Set[str]:
+        """
+        CTログの候補ホスト名（存在確認は行わない）
+
+        ct_files があれば読んで永続キャッシュにも保存し、無ければ取込み済みの候補（ct_logs.py import）を使う。
+        """
+        d = self._norm(zone)
+        store = self.resolver.cache.store
+        if not self.ct_files:
+            cached = store.get_candidates("ct", d) if store is not None else None
+            return cached or set()
+        from ct_logs import scan
+
+        try:
+            cands = set(scan(self.ct_files, [d]).get(d, ()))
+        except (OSError, ValueError) as e:
+            log.warning(f"CT: {e}")
+            return set()
+        if store is not None:
+            store.put_candidates("ct", d, cands)
+        return cands
 
     def gather_dns(self, zone: str) -> None:
         """NS/MXレコードから派生ホストを収集"""
         z = self._norm(zone)
-        for ns in self._resolve(z, "NS"):
-            n = self._norm(ns)
-            if n.endswith(f".{self.root}") or n == self.root:
-                if self._exists(n):
-                    self._add(n)
-        for mxh in self._mx_hosts(self._resolve(z, "MX")):
-            if mxh.endswith(f".{self.root}") or mxh == self.root:
-                if self._exists(mxh):
-                    self._add(mxh)
+        hosts = {self._norm(ns) for ns in self._resolve(z, "NS")}
+        hosts |= self._mx_hosts(self._resolve(z, "MX"))
+        self._merge_hits(self.validate_candidates(hosts))
 
     def probe_delegations(self, zone: str) -> None:
         """典型的な委任サブドメインを確認"""
         z = self._norm(zone)
+        self._wildcard_fingerprint(z)
         for label in self.DELEGATION_LABELS:
             sub = f"{label}.{z}"
-            if self._is_delegated(sub):
+            if self._is_delegated(sub) and not self._is_wildcard_ns(sub, z):
                 self._add(sub)
 
     def bruteforce_hosts(self, zone: str) -> None:
         """典型的なホスト名を確認"""
         z = self._norm(zone)
+        self._wildcard_fingerprint(z)
         for label in self.HOST_LABELS:
             fqdn = f"{label}.{z}"
-            if self._exists(fqdn):
+            if self._exists(fqdn) and not self._is_wildcard_host(fqdn, z):
                 self._add(fqdn)
 
+    def _bruteforce_stage(self):
+        from bruteforce import BruteforceStage
+        # 同期版でもリゾルバと同じネームサーバへ問い合わせる
+        return BruteforceStage(
+            self.wordlist, self.resolver,
+            nameservers=self.resolver.nameservers, port=self.resolver.port,
+        )
+
+    def _known(self, host: str) -> bool:
+        return host in self.fqdns or host in self.subdomains or host in self.visited
+
+    def _merge_hits(self, hits: Dict[str, bool]) -> None:
+        for h, delegated in hits.items():
+            (self.subdomains if delegated else self.fqdns).add(h)
+
+    def wordlist_bruteforce(self, zone: str) -> None:
+        """ワードリストによる大規模総当たり（--wordlist指定時のみ）"""
+        import asyncio
+
+        z = self._norm(zone)
+        self._wildcard_fingerprint(z)
+        hits = asyncio.run(self._bruteforce_stage().run(
+            z, known=self._known,
+            is_wildcard=lambda ans: self._matches_wildcard(z, ans),
+            query=self._aquery(),
+        ))
+        self._merge_hits(hits)
+
+    def _zone_names(self, zone: str) -> List[str]:
+        """zone に属する（より下の委任ゾーンに入らない）発見済みの名前"""
+        out = []
+        for trie in (self.subdomains, self.fqdns):
+            for name in trie.under(zone):
+                parent = name.partition(".")[2]
+                while parent != zone and parent not in self.subdomains:
+                    parent = parent.partition(".")[2]
+                if parent == zone:
+                    out.append(name)
+        return out
+
+    def _permutation_model(self):
+        """これまでに見つけた全ての名前から語と付け方を学ぶ"""
+        from permutations import TokenModel
+
+        model = TokenModel()
+        model.update(self.subdomains, self.root)
+        model.update(self.fqdns, self.root)
+        return model
+
+    def _permutation_stage(self):
+        from permutations import PermutationStage
+
+        return PermutationStage(
+            self.resolver, budget=self.permute_budget, batch=self.PERMUTATION_BATCH, tried=self.tried,
+        )
+
+    def permute(self, zone: str) -> None:
+        """発見済みの名前の変形（dev2, api-staging, stage.api 等）を予算内で確認（permute_budget 指定時のみ）"""
+        import asyncio
+
+        z = self._norm(zone)
+        hits = asyncio.run(self._permutation_stage().run(
+            z, self._zone_names(z), self._permutation_model(), known=self._known,
+            is_wildcard=lambda ans: self._matches_wildcard(z, ans),
+            query=self._aquery(),
+        ))
+        self._merge_hits(hits)
+
+    # --- 高速経路（AXFR/NSEC/NSEC3） ---
+
+    def _authoritative_addresses(self, zone: str) -> List[str]:
+        """ゾーンのNSホストのアドレス（_resolve の結果をそのまま使う）"""
+        addrs: List[str] = []
+        for ns in sorted(self._norm(n) for n in self._resolve(zone, "NS")):
+            for rtype in ("A", "AAAA"):
+                addrs.extend(a for a in self._resolve(ns, rtype) if a not in addrs)
+        return addrs
+
+    def _crack_words(self) -> Iterable[str]:
+        """NSEC3 ハッシュの照合に使うラベル"""
+        yield from self.HOST_LABELS
+        yield from self.DELEGATION_LABELS
+        if self.wordlist:
+            from bruteforce import iter_wordlist
+            yield from iter_wordlist(self.wordlist)
+
+    def _listing_hits(self, listing) -> Dict[str, bool]:
+        return {h: d for h, d in listing.hits().items() if self._in_scope(h)}
+
+    def zone_transfer(self, zone: str) -> bool:
+        """AXFR → NSEC → NSEC3 を試し、ゾーンの全名前を得られたら True"""
+        if not self.zone_walk:
+            return False
+        from zone_walk import enumerate_zone
+
+        z = self._norm(zone)
+        listing = enumerate_zone(
+            z, self._authoritative_addresses(z), self.authoritative_port,
+            words=self._crack_words(),
+        )
+        if listing is None:
+            return False
+        self._merge_hits(self._listing_hits(listing))
+        if listing.complete:
+            self.complete_zones.add(z)
+        return listing.complete
+
     # --- 再帰 ---
 
     def walk(self, zone: str, depth: int = 0) -> None:
@@ -194,49 +443,135 @@ class DomainEnumerator:
             return
         self.visited.add(z)
 
-        if depth == 0 and self.api_key:
-            self.shodan_search(z)
-
-        self.gather_dns(z)
-        self.probe_delegations(z)
-        self.bruteforce_hosts(z)
-
-        if depth == 0 and self._exists(z):
-            self._add(z)
-
-        for sub in sorted(self.subdomains):
-            if sub not in self.visited and sub.endswith(f".{self.root}"):
-                self.walk(sub, depth + 1)
+        if depth == 0:
+            if self.api_key:
+                with METRICS.stage("shodan"):
+                    self.shodan_search(z)
+            with METRICS.stage("ct"):
+                self.ct_search(z)
+
+        with METRICS.stage("zone_walk"):
+            complete = self.zone_transfer(z)
+        with METRICS.stage("gather_dns"):
+            self.gather_dns(z)
+        # 全名前が得られたゾーンは総当たりしない
+        if not complete:
+            with METRICS.stage("wildcard"):
+                self._wildcard_fingerprint(z)
+            with METRICS.stage("probe_delegations"):
+                self.probe_delegations(z)
+            with METRICS.stage("bruteforce_hosts"):
+                self.bruteforce_hosts(z)
+            if self.wordlist:
+                with METRICS.stage("wordlist"):
+                    self.wordlist_bruteforce(z)
+            # 他の手法で見つけた名前を元にするので最後に行う
+            if self.permute_budget:
+                with METRICS.stage("permute"):
+                    self.permute(z)
+
+        if depth == 0:
+            with METRICS.stage("apex"):
+                if self._exists(z):
+                    self._add(z)
+
+        # 再帰中に subdomains が増えるので、未訪問のものを先に取り出しておく
+        for sub in [s for s in self.subdomains.under(self.root) if s not in self.visited]:
+            self.walk(sub, depth + 1)
 
     # --- 公開API ---
 
-    def run(self) -> Dict[str, List[str]]:
+    def _reset(self, known: Optional[Dict[str, Iterable[str]]] = None) -> None:
+        """
+        前回までの結果を消す。known（{"subdomains": [...], "fqdns": [...]}）を渡すと
+        それらを発見済みとして始め、総当たり等で問い合わせ直さない（差分スキャン用）
+        """
         self.subdomains.clear()
         self.fqdns.clear()
         self.visited.clear()
+        self.wildcards.clear()
+        self.complete_zones.clear()
+        self.tried = NameBloom() if self.permute_budget else None
+        if self.direct and self.authoritative is None:
+            from authoritative import AuthoritativeResolver
+            self.authoritative = AuthoritativeResolver(self.resolver, port=self.authoritative_port)
+        if known:
+            self.subdomains.update(self._norm(h) for h in known.get("subdomains", ()))
+            self.fqdns.update(self._norm(h) for h in known.get("fqdns", ()))
+
+    def run(self, known: Optional[Dict[str, Iterable[str]]] = None) -> Dict[str, List[str]]:
+        self._reset(known)
         self.walk(self.root, 0)
+        if self.authoritative is not None:
+            self.authoritative.log_summary()
         return {
             "subdomains": sorted(self.subdomains),
             "fqdns": sorted(self.fqdns),
         }
 
 
-def domain2fqdns(domain: str) -> List[str]:
+def domain2fqdns(
+    domain: str,
+    use_async: bool = False,
+    concurrency: int = 100,
+    rate_per_ns: float = 50.0,
+    wordlist: Optional[Path] = None,
+    zone_walk: bool = True,
+    direct: bool = False,
+    backend: str = "dnspython",
+    ct_files: Iterable[Path] = (),
+    permute_budget: int = 0,
+) -> List[str]:
+    from dns_backend import make_backend
+
+    engine = make_backend(backend, max_inflight=concurrency)
     try:
-        en = DomainEnumerator(domain, SHODAN_API_KEY)
+        if use_async:
+            from async_enum import AsyncDomainEnumerator
+            en = AsyncDomainEnumerator(
+                domain, shodan_api_key(),
+                concurrency=concurrency, rate_per_ns=rate_per_ns, wordlist=wordlist,
+                zone_walk=zone_walk, direct=direct, backend=engine, ct_files=ct_files,
+                permute_budget=permute_budget,
+            )
+        else:
+            en = DomainEnumerator(
+                domain, shodan_api_key(), wordlist=wordlist, zone_walk=zone_walk, direct=direct,
+                backend=engine, ct_files=ct_files, permute_budget=permute_budget,
+            )
         res = en.run()
         return res.get("fqdns", [])
     except Exception as e:
         log.error(f"error: {e}")
         return []
+    finally:
+        if engine is not None:
+            engine.close()
 
 
 def main() -> None:
     import argparse
 
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
     p = argparse.ArgumentParser(description="FQDN列挙ツール")
     p.add_argument("--domain", help="対象ドメイン")
     p.add_argument("--demo", action="store_true", help="外部問い合わせを行わない簡易出力")
+    p.add_argument("--async", dest="use_async", action="store_true", help="asyncioで並行列挙する")
+    p.add_argument("--concurrency", type=int, default=100, help="--async時の同時クエリ数上限")
+    p.add_argument("--rate", type=float, default=50.0, help="--async時のネームサーバ毎の秒間クエリ数上限")
+    p.add_argument("--wordlist", help="追加で総当たりするラベルのワードリスト（1行1ラベル）")
+    p.add_argument("--no-zone-walk", dest="zone_walk", action="store_false",
+                   help="AXFR/NSEC/NSEC3 によるゾーン取得を試さない")
+    p.add_argument("--direct", action="store_true",
+                   help="再帰リゾルバを通さず各ゾーンの権威サーバへ直接問い合わせる（応答の速いサーバを優先）")
+    p.add_argument("--backend", choices=["dnspython", "udp"], default="dnspython",
+                   help="問い合わせの送り方（udp: 自前のワイヤ形式で少数のUDPソケットからまとめて送る）")
+    p.add_argument("--ct-file", dest="ct_files", action="append", default=[],
+                   help="CTログのエクスポート（crt.sh の JSON/CSV、.gz 可）。複数指定可")
+    p.add_argument("--permute", dest="permute_budget", type=int, nargs="?", const=1000, default=0,
+                   help="発見済みの名前の変形（dev2, api-staging, stage.api 等）も試す。値はゾーンあたりの問い合わせ数の上限（既定: 1000）")
+    add_cache_arguments(p)
+    add_metrics_arguments(p)
     args = p.parse_args()
 
     domain = (args.domain or input("対象ドメインを入力してください: ")).strip().lower().rstrip(".")
@@ -246,9 +581,30 @@ def main() -> None:
             print(f"{i:2d}. {h}")
         return
 
+    from dns_cache import SHARED_CACHE
+
+    store = open_from_args(args)
+    SHARED_CACHE.store = store
+    session = start_from_args(args)
+
     print(f"target: {domain}")
     print("-" * 40)
-    out = domain2fqdns(domain)
+    try:
+        out = domain2fqdns(
+            domain, use_async=args.use_async,
+            concurrency=args.concurrency, rate_per_ns=args.rate,
+            wordlist=args.wordlist, zone_walk=args.zone_walk, direct=args.direct,
+            backend=args.backend, ct_files=args.ct_files, permute_budget=args.permute_budget,
+        )
+    finally:
+        if store is not None:
+            store.close()
+        session.close()
+    st = SHARED_CACHE.stats()
+    log.info(
+        f"DNS cache: hits={st['hits']} misses={st['misses']} coalesced={st['coalesced']} "
+        f"hit_rate={st['hit_rate']}"
+    )
     for i, fqdn in enumerate(sorted(out), 1):
         print(f"{i:2d}. {fqdn}")
 
@@ -3,30 +3,75 @@
 
 from __future__ import annotations
 import sys
-from typing import List
-from dns.resolver import Resolver
-from dns.exception import DNSException
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, List, Optional, Set, TextIO, Tuple
 import argparse
 import logging
 
-logging.basicConfig(level=logging.INFO, format="%(message)s")
+from metrics import METRICS, add_metrics_arguments, start_from_args
+from persistent_cache import add_cache_arguments, open_from_args
+
+# dnspython・asyncio・ASN 索引は使う段になってから読み込む（--help を速くする）
+if TYPE_CHECKING:
+    from asn_db import AsnDatabase, AsnGrouper, AsnInfo
+    from authoritative import AuthoritativeResolver
+    from dns_cache import CachingResolver
+
 log = logging.getLogger(__name__)
 
+DEFAULT_NAMESERVERS = ["1.1.1.1"]
+
+_resolver: Optional[CachingResolver] = None
+# use_direct() で有効にした権威サーバへの直接問い合わせ
+_authoritative: Optional[AuthoritativeResolver] = None
+# use_asn_db() で開いた ASN 索引と、ASN・プレフィックス別の集計
+_asn_db: Optional[AsnDatabase] = None
+_grouper: Optional[AsnGrouper] = None
+
+
+def _get_resolver() -> CachingResolver:
+    """プロセス内で1つのリゾルバを再利用する（キャッシュは domain2fqdns と共有）"""
+    global _resolver
+    if _resolver is None:
+        from dns_cache import CachingResolver
+        _resolver = CachingResolver(nameservers=DEFAULT_NAMESERVERS)
+    return _resolver
+
+
+def use_direct(enabled: bool = True) -> None:
+    """resolve_fqdn_to_ip を各ゾーンの権威サーバへの直接問い合わせに切り替える"""
+    global _authoritative
+    from authoritative import AuthoritativeResolver
+    _authoritative = AuthoritativeResolver(_get_resolver()) if enabled else None
+
+
+def use_backend(kind: str) -> None:
+    """resolve_fqdn_to_ip の問い合わせの送り方を切り替える（dns_backend.BACKENDS のいずれか）"""
+    from dns_backend import make_backend
+
+    resolver = _get_resolver()
+    if resolver.backend is not None:
+        resolver.backend.close()
+    resolver.backend = make_backend(kind, resolver.nameservers)
+
+
+def use_asn_db(path: Path, group: bool = False) -> AsnDatabase:
+    """出力の各 IP に ASN/ISP を付ける（path は iptoasn TSV・mmdb・作成済みの索引）"""
+    global _asn_db, _grouper
+    from asn_db import AsnDatabase, AsnGrouper
+    _asn_db = AsnDatabase.open(Path(path))
+    _grouper = AsnGrouper() if group else None
+    return _asn_db
+
 
 def resolve_fqdn_to_ip(fqdn: str) -> List[str]:
-    resolver = Resolver()
-    resolver.nameservers = ["1.1.1.1"]
+    resolver = _get_resolver()
+    query = _authoritative.resolve if _authoritative is not None else None
     ips: List[str] = []
-    try:
+    with METRICS.stage("resolve"):
         for rtype in ("A", "AAAA"):
-            try:
-                answers = resolver.resolve(fqdn, rtype)
-                for rr in answers:
-                    ips.append(rr.to_text())
-            except DNSException:
-                pass
-    except DNSException as e:
-        log.warning(f"DNS解決エラー: {e}")
+            ips.extend(resolver.resolve(fqdn, rtype, query=query))
     return ips
 
 
@@ -34,19 +79,295 @@ def fqdn2ips(fqdn: str) -> List[str]:
     return resolve_fqdn_to_ip(fqdn)
 
 
+# --- バッチ解決 ---
+
+class Checkpoint:
+    """答えの確定したFQDNを追記していき、中断後の再実行ではそれらを飛ばす"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.done: Set[str] = set()
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self._fh = self.path.open("a", encoding="utf-8")
+
+    def __contains__(self, fqdn: str) -> bool:
+        return fqdn in self.done
+
+    def mark(self, fqdn: str) -> None:
+        self.done.add(fqdn)
+        self._fh.write(fqdn + "\n")
+
+    def flush(self) -> None:
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class BatchResolver:
+    """
+    1つのリゾルバとネームサーバプールで多数のFQDNを並行解決し、
+    完了した順に (fqdn, ips) を返す
+    """
+
+    def __init__(
+        self,
+        nameservers: Optional[List[str]] = None,
+        concurrency: int = 1000,
+        port: int = 53,
+        timeout: float = 2,
+        lifetime: float = 5,
+        resolver: Optional[CachingResolver] = None,
+        direct: bool = False,
+        backend: str = "dnspython",
+    ) -> None:
+        from dns_backend import make_backend
+        from dns_cache import ResolverPool
+
+        self.pool = ResolverPool(
+            nameservers or DEFAULT_NAMESERVERS, port=port,
+            timeout=timeout, lifetime=lifetime, concurrency=concurrency,
+        )
+        self.resolver = resolver or _get_resolver()
+        # backend="udp" なら dnspython のプールの代わりに自前の UDP エンジンで送る
+        self.backend = make_backend(
+            backend, nameservers or DEFAULT_NAMESERVERS, port=port,
+            timeout=timeout, lifetime=lifetime, max_inflight=concurrency,
+        )
+        self.query = self.backend.aquery if self.backend is not None else self.pool.query
+        # direct=True なら権威サーバへ直接問い合わせ、ゾーンが分からない名前だけプールへ回す
+        self.authoritative: Optional[AuthoritativeResolver] = None
+        if direct:
+            from authoritative import AuthoritativeResolver
+            self.authoritative = AuthoritativeResolver(
+                self.resolver, timeout=timeout, afallback=self.query,
+            )
+            self.query = self.authoritative.aquery
+        # タイムアウト・SERVFAIL 等で答えが確定しなかった名前（NXDOMAIN/NODATA は含めない）
+        self.failed: Set[str] = set()
+        self.query = self._track(self.query)
+        # 1件あたり A/AAAA の2問い合わせ
+        self.workers = max(1, concurrency // 2)
+
+    def _track(self, query):
+        import dns.resolver
+
+        async def tracked(name: str, rdtype: str):
+            try:
+                return await query(name, rdtype)
+            except dns.resolver.NXDOMAIN:
+                raise
+            except Exception:
+                self.failed.add(name)
+                raise
+
+        return tracked
+
+    def settled(self, fqdn: str, ips: List[str]) -> bool:
+        """IP が得られたか、存在しない（NXDOMAIN/NODATA）と確定した名前なら True"""
+        return bool(ips) or fqdn.strip().rstrip(".").lower() not in self.failed
+
+    async def resolve(self, fqdn: str) -> List[str]:
+        import asyncio
+
+        with METRICS.stage("resolve"):
+            a, aaaa = await asyncio.gather(
+                self.resolver.aresolve(fqdn, "A", query=self.query),
+                self.resolver.aresolve(fqdn, "AAAA", query=self.query),
+            )
+        return a + aaaa
+
+    async def stream(self, fqdns: Iterable[str]) -> AsyncIterator[Tuple[str, List[str]]]:
+        import asyncio
+
+        inq: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        outq: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def produce() -> None:
+            if isinstance(fqdns, (list, tuple, set, frozenset)):
+                for f in fqdns:
+                    await inq.put(f)
+            else:
+                # stdin 等はブロックするのでスレッドで読む
+                it = iter(fqdns)
+                while (f := await asyncio.to_thread(next, it, None)) is not None:
+                    await inq.put(f)
+            for _ in range(self.workers):
+                await inq.put(None)
+
+        async def work() -> None:
+            while (f := await inq.get()) is not None:
+                await outq.put((f, await self.resolve(f)))
+            await outq.put(None)
+
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(work()) for _ in range(self.workers)]
+        try:
+            finished = 0
+            while finished < self.workers:
+                item = await outq.get()
+                if item is None:
+                    finished += 1
+                else:
+                    yield item
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    def close(self) -> None:
+        if self.backend is not None:
+            self.backend.close()
+
+
+def format_result(
+    fqdn: str, ips: List[str], fmt: str = "tsv", infos: Optional[List[Optional[AsnInfo]]] = None
+) -> str:
+    """infos（ips と同じ順の ASN 情報）を渡すと各 IP に ASN・プレフィックス・AS名・国を付ける"""
+    if fmt == "jsonl":
+        row = {"fqdn": fqdn, "ips": ips}
+        if infos is not None:
+            row["networks"] = [
+                dict(info.as_dict() if info else {"asn": None}, ip=ip) for ip, info in zip(ips, infos)
+            ]
+        return json.dumps(row, ensure_ascii=False)
+    if not ips:
+        return f"{fqdn}\t解決できませんでした"
+    if infos is None:
+        return "\n".join(f"{fqdn}\t{ip}" for ip in ips)
+    return "\n".join(
+        f"{fqdn}\t{ip}\t" + (f"AS{i.asn}\t{i.prefix}\t{i.as_name}\t{i.country}" if i else "-")
+        for ip, i in zip(ips, infos)
+    )
+
+
+async def run_batch(
+    fqdns: Iterable[str],
+    out: TextIO,
+    fmt: str = "tsv",
+    checkpoint: Optional[Checkpoint] = None,
+    flush_every: int = 100,
+    asn_db: Optional[AsnDatabase] = None,
+    grouper: Optional[AsnGrouper] = None,
+    **opts,
+) -> int:
+    """
+    FQDN列をバッチ解決して out へ逐次書き出し、処理件数を返す。
+    asn_db を渡すと各 IP に ASN 情報を付け、grouper があれば ASN・プレフィックス別に集める
+    """
+    engine = BatchResolver(**opts)
+    todo = (
+        f for f in (line.strip() for line in fqdns)
+        if f and (checkpoint is None or f not in checkpoint)
+    )
+    n = 0
+    try:
+        async for fqdn, ips in engine.stream(todo):
+            infos = asn_db.lookup_many(ips) if asn_db is not None else None
+            if grouper is not None and infos is not None:
+                grouper.add(fqdn, ips, infos)
+            out.write(format_result(fqdn, ips, fmt, infos) + "\n")
+            # 答えが確定しなかった名前は再開時にもう一度問い合わせる
+            if checkpoint is not None and engine.settled(fqdn, ips):
+                checkpoint.mark(fqdn)
+            n += 1
+            if n % flush_every == 0:
+                out.flush()
+                if checkpoint is not None:
+                    checkpoint.flush()
+    finally:
+        engine.close()
+        # 出力を先に書き出してからチェックポイントを確定する
+        out.flush()
+        if checkpoint is not None:
+            checkpoint.flush()
+    return n
+
+
 def _print_result(fqdn: str, ips: List[str]) -> None:
-    if ips:
-        for ip in ips:
-            print(f"{fqdn}\t{ip}")
-    else:
-        print(f"{fqdn}\t解決できませんでした")
+    infos = _asn_db.lookup_many(ips) if _asn_db is not None else None
+    if _grouper is not None and infos is not None:
+        _grouper.add(fqdn, ips, infos)
+    print(format_result(fqdn, ips, "tsv", infos))
 
 
 def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     p = argparse.ArgumentParser(description="FQDN を IP に解決")
     p.add_argument("--fqdn", help="単一の FQDN を指定")
+    p.add_argument("--batch", action="store_true", help="標準入力/--input を並行バッチ解決する")
+    p.add_argument("--input", help="--batch: FQDN一覧ファイル（省略時は標準入力）")
+    p.add_argument("--output", help="--batch: 出力先（追記。省略時は標準出力）")
+    p.add_argument("--format", choices=["tsv", "jsonl"], default="tsv", help="--batch: 出力形式")
+    p.add_argument("--nameservers", default=",".join(DEFAULT_NAMESERVERS),
+                   help="--batch: カンマ区切りのネームサーバ")
+    p.add_argument("--concurrency", type=int, default=1000, help="--batch: 同時クエリ数")
+    p.add_argument("--checkpoint", help="--batch: 再開用チェックポイントファイル")
+    p.add_argument("--direct", action="store_true",
+                   help="再帰リゾルバを通さず各ゾーンの権威サーバへ直接問い合わせる（応答の速いサーバを優先）")
+    p.add_argument("--backend", choices=["dnspython", "udp"], default="dnspython",
+                   help="問い合わせの送り方（udp: 自前のワイヤ形式で少数のUDPソケットからまとめて送る）")
+    p.add_argument("--asn-db", help="IP→ASN/ISP のオフラインデータ（iptoasn TSV・mmdb・asn_db.py の索引）")
+    p.add_argument("--group-output", help="--asn-db: ASN・プレフィックス別の FQDN 一覧を書き出す JSON")
+    add_cache_arguments(p)
+    add_metrics_arguments(p)
     args = p.parse_args()
+    if args.group_output and not args.asn_db:
+        p.error("--group-output には --asn-db が必要です")
+
+    from dns_cache import SHARED_CACHE
+
+    store = open_from_args(args)
+    SHARED_CACHE.store = store
+    session = start_from_args(args)
+    if args.asn_db:
+        use_asn_db(Path(args.asn_db), group=bool(args.group_output))
+    try:
+        _run(args)
+    finally:
+        if store is not None:
+            store.close()
+        session.close()
+        if _grouper is not None:
+            _grouper.write(Path(args.group_output))
+            log.info(f"ASN groups -> {args.group_output}")
+        if _asn_db is not None:
+            _asn_db.close()
 
+
+def _run_batch(args: argparse.Namespace) -> None:
+    import asyncio
+
+    src = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    ckpt = Checkpoint(Path(args.checkpoint)) if args.checkpoint else None
+    nameservers = [x.strip() for x in args.nameservers.split(",") if x.strip()]
+    try:
+        n = asyncio.run(run_batch(
+            src, out, args.format, ckpt, asn_db=_asn_db, grouper=_grouper,
+            nameservers=nameservers, concurrency=args.concurrency, direct=args.direct,
+            backend=args.backend,
+        ))
+        log.info(f"resolved: {n}")
+    except KeyboardInterrupt:
+        log.warning("中断しました。--checkpoint を指定して再実行すると続きから処理します")
+    finally:
+        if ckpt is not None:
+            ckpt.close()
+        if args.input:
+            src.close()
+        if args.output:
+            out.close()
+
+
+def _run(args: argparse.Namespace) -> None:
+    if args.batch:
+        _run_batch(args)
+        return
+    use_backend(args.backend)
+    if args.direct:
+        use_direct()
     if args.fqdn:
         _print_result(args.fqdn.strip(), fqdn2ips(args.fqdn.strip()))
         return
@@ -56,6 +377,8 @@ def main() -> None:
             fqdn = line.strip()
             if fqdn:
                 _print_result(fqdn, fqdn2ips(fqdn))
+        st = _get_resolver().cache.stats()
+        log.info(f"DNS cache: hits={st['hits']} misses={st['misses']} hit_rate={st['hit_rate']}")
         return
 
     #1件ごとに即解決
@@ -1,21 +1,132 @@
+import asyncio
 import random
-import time
-from typing import List, Dict
-from playwright.sync_api import sync_playwright
+import re
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import json
+import time
 from pathlib import Path
 
+from metrics import METRICS
+
+
+def _load_playwright():
+    """playwright は実際にブラウザを起動する時だけ読み込む（起動時間の短縮）"""
+    from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+    return async_playwright, PlaywrightTimeoutError
+
+
+# サブドメイン一覧の「もっと見る」ボタン
+VT_BUTTON_SELECTOR = 'div > vt-ui-expandable.mb-3.subdomains > span > div > vt-ui-button'
+
+# サブドメイン候補を含む要素
+SUBDOMAIN_SELECTORS = [
+    'a[href*="/domain/"]',
+    'table tbody tr td:first-child a',
+    '[class*="subdomain"] a',
+    'div[data-section="subdomains"] a',
+]
+
+# VirusTotalはShadow DOMを多用するので、shadowRootも辿って要素を集める
+_DEEP_ALL_JS = """
+const deepAll = (sel, root = document) => {
+    const out = [...root.querySelectorAll(sel)];
+    for (const el of root.querySelectorAll('*')) {
+        if (el.shadowRoot) out.push(...deepAll(sel, el.shadowRoot));
+    }
+    return out;
+};
+"""
+_COUNT_JS = f"() => {{ {_DEEP_ALL_JS} return deepAll('a[href*=\"/domain/\"]').length; }}"
+_GROWN_JS = f"(n) => {{ {_DEEP_ALL_JS} return deepAll('a[href*=\"/domain/\"]').length > n; }}"
+# テキストとhrefを1回の呼び出しでまとめて取得する
+_COLLECT_JS = f"""(selectors) => {{
+    {_DEEP_ALL_JS}
+    const out = [];
+    for (const sel of selectors) {{
+        for (const el of deepAll(sel)) out.push([el.innerText || '', el.getAttribute('href') || '']);
+    }}
+    return out;
+}}"""
+
+# インターセプトモードで読み込まないリソース
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'stylesheet', 'media'}
+
+LAUNCH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-features=site-per-process',
+]
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+STEALTH_JS = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    });
+"""
+
+
+def extract_domains(pairs: Iterable[Tuple[str, str]], domain: str) -> Set[str]:
+    """(テキスト, href) の組から対象ドメイン配下の名前を取り出す"""
+    found = set()
+    for text, href in pairs:
+        # テキストから取得
+        text = (text or '').strip()
+        if text and '.' in text and domain in text and not text.startswith('http'):
+            found.add(text)
+
+        # hrefから取得
+        if href and '/domain/' in href:
+            domain_part = href.split('/domain/')[-1].split('/')[0]
+            if domain in domain_part and '.' in domain_part:
+                found.add(domain_part)
+    return found
+
+
+def subdomain_response_pattern(domain: str) -> "re.Pattern[str]":
+    """サブドメイン一覧を返す VirusTotal の JSON API の URL"""
+    return re.compile(
+        rf"/ui/domains/{re.escape(domain)}/(?:relationships/)?subdomains(?:\?|$)"
+    )
+
+
+def parse_relationship_payload(payload: dict, domain: str) -> Set[str]:
+    """relationships API の JSON 応答から対象ドメイン配下の名前を取り出す"""
+    found = set()
+    domain = domain.strip().lower().rstrip('.')
+    for item in (payload or {}).get('data') or []:
+        if not isinstance(item, dict) or item.get('type', 'domain') != 'domain':
+            continue
+        name = str(item.get('id') or '').strip().lower().rstrip('.')
+        # 文字列として含むだけの名前（example.com.evil.net 等）は範囲外
+        if name.endswith('.' + domain):
+            found.add(name)
+    return found
+
+
 class VirusTotalScraper:
     """VirusTotalからサブドメイン情報を取得するスクレイパー"""
     
-    def __init__(self, headless: bool = False):
+    def __init__(
+        self,
+        headless: bool = False,
+        store=None,
+        wait_timeout: float = 15.0,
+        intercept: bool = False,
+    ):
         """
         初期化
         Args:
             headless: ヘッドレスモードで実行するか
+            store: 取得結果を再利用する PersistentCache（任意）
+            wait_timeout: 一覧の読込・増加を待つ最大秒数
+            intercept: DOMではなくページが受け取るJSON応答からサブドメインを取得する。
+                画像・フォント・CSSの読込も止める
         """
         self.headless = headless
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self.intercept = intercept
         self.subdomains = []
+        # playwright の TimeoutError（読込み前は何も捕まえない）
+        self._timeout_error = ()
     
     def scrape_subdomains(self, domain: str) -> List[Dict[str, str]]:
         """
@@ -27,138 +138,208 @@ class VirusTotalScraper:
         Returns:
             サブドメイン情報のリスト
         """
-        url = f"https://www.virustotal.com/gui/domain/{domain}/relations"
-        
-        with sync_playwright() as p:
-            # ブラウザ起動
-            browser = p.chromium.launch(
-                headless=self.headless,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-features=site-per-process',
-                ]
-            )
-            
-            # コンテキスト作成
-            context = browser.new_context(
+        for _, subdomains in self.scrape_many([domain], pages=1):
+            self.subdomains = subdomains
+        return self.subdomains
+
+    def scrape_many(
+        self, domains: Iterable[str], pages: int = 3
+    ) -> Iterator[Tuple[str, List[Dict[str, str]]]]:
+        """
+        1つのブラウザを使い回して複数ドメインを取得し、完了した順に返す
+
+        Args:
+            domains: 取得対象のドメイン名の列
+            pages: 並行して使うページ数
+
+        Yields:
+            (ドメイン名, サブドメイン情報のリスト)
+        """
+        loop = asyncio.new_event_loop()
+        agen = self.ascrape_many(domains, pages)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(agen.aclose())
+            loop.close()
+
+    async def ascrape_many(
+        self, domains: Iterable[str], pages: int = 3
+    ) -> AsyncIterator[Tuple[str, List[Dict[str, str]]]]:
+        """scrape_many の非同期版"""
+        queue: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+        for domain in domains:
+            domain = domain.strip()
+            cached = self.store.get_candidates("virustotal", domain) if self.store else None
+            if cached is not None:
+                yield domain, [{'subdomain': s} for s in sorted(cached)]
+            elif domain:
+                queue.put_nowait(domain)
+        if queue.empty():
+            return
+
+        async_playwright, self._timeout_error = _load_playwright()
+        async with async_playwright() as p:
+            # ブラウザとコンテキストは全ドメインで共有する
+            browser = await p.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+            context = await browser.new_context(
                 viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                user_agent=USER_AGENT,
                 locale='ja-JP',
             )
-            
             # WebDriver検出を回避
-            context.add_init_script("""
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                });
-            """)
-            
-            page = context.new_page()
-            
+            await context.add_init_script(STEALTH_JS)
+            if self.intercept:
+                await context.route('**/*', self._block_heavy_resources)
+
+            async def worker() -> None:
+                page = await context.new_page()
+                try:
+                    while True:
+                        try:
+                            domain = queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            return
+                        scrape = self._intercept_page if self.intercept else self._scrape_page
+                        with METRICS.stage("virustotal"):
+                            found = await scrape(page, domain)
+                        await results.put((domain, found))
+                finally:
+                    await page.close()
+
+            n = min(pages, queue.qsize())
+            tasks = [asyncio.create_task(worker()) for _ in range(n)]
             try:
-                # ページアクセス
-                time.sleep(random.uniform(1, 3))
-                page.goto(url, wait_until='networkidle')
-                time.sleep(random.uniform(5, 7))
-                
-                # ページネーション処理
-                pagination_count = 0
-                previous_count = 0
-                no_change_count = 0
-                vt_button_selector = 'div > vt-ui-expandable.mb-3.subdomains > span > div > vt-ui-button'
-                
-                while True:
-                    # 現在のサブドメイン数を確認
-                    current_elements = page.query_selector_all('a[href*="/domain/"]')
-                    current_count = len(current_elements)
-                    
-                    # 変化がない場合は終了
-                    if current_count == previous_count:
-                        no_change_count += 1
-                        if no_change_count >= 2:
-                            break
-                    else:
-                        no_change_count = 0
-                        previous_count = current_count
-                    
-                    time.sleep(3)
-                    
-                    # ボタンクリック処理
-                    button_clicked = page.evaluate(f"""
-                        () => {{
-                            const button = document.querySelector('{vt_button_selector}');
-                            if (button && button.offsetParent !== null) {{
-                                button.scrollIntoView({{ behavior: 'smooth', block: 'center' }});
-                                setTimeout(() => {{ button.click(); }}, 500);
-                                return true;
-                            }}
-                            return false;
-                        }}
-                    """)
-                    
-                    if button_clicked:
-                        pagination_count += 1
-                        time.sleep(5)
+                while not all(t.done() for t in tasks) or not results.empty():
+                    getter = asyncio.ensure_future(results.get())
+                    await asyncio.wait([getter, *tasks], return_when=asyncio.FIRST_COMPLETED)
+                    if getter.done():
+                        yield getter.result()
                     else:
-                        # Playwrightで再試行
-                        button = page.query_selector(vt_button_selector)
-                        if button:
-                            page.evaluate("""
-                                (element) => {
-                                    element.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                                    setTimeout(() => { element.click(); }, 500);
-                                }
-                            """, button)
-                            pagination_count += 1
-                            time.sleep(5)
-                        else:
-                            no_change_count += 1
-                            if no_change_count >= 2:
-                                break
-                
-                # 最終スクロール
-                page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                time.sleep(2)
-                
-                # サブドメイン収集
-                all_found_domains = set()
-                selectors = [
-                    'a[href*="/domain/"]',
-                    'table tbody tr td:first-child a',
-                    '[class*="subdomain"] a',
-                    'div[data-section="subdomains"] a'
-                ]
-                
-                for selector in selectors:
-                    elements = page.query_selector_all(selector)
-                    for element in elements:
-                        try:
-                            # テキストから取得
-                            text = element.inner_text().strip()
-                            if (text and '.' in text and domain in text and 
-                                not text.startswith('http')):
-                                all_found_domains.add(text)
-                            
-                            # hrefから取得
-                            href = element.get_attribute('href')
-                            if href and '/domain/' in href:
-                                domain_part = href.split('/domain/')[-1].split('/')[0]
-                                if domain in domain_part and '.' in domain_part:
-                                    all_found_domains.add(domain_part)
-                        except:
-                            pass
-                
-                # 結果を辞書形式に変換
-                self.subdomains = [{'subdomain': subdomain} for subdomain in sorted(all_found_domains)]
-                
-            except Exception as e:
-                print(f"エラーが発生しました: {e}")
-                
+                        getter.cancel()
+                for t in tasks:
+                    t.result()
             finally:
-                time.sleep(random.uniform(1, 2))
-                browser.close()
-        
-        return self.subdomains
+                for t in tasks:
+                    t.cancel()
+                await browser.close()
+
+    async def _scrape_page(self, page, domain: str) -> List[Dict[str, str]]:
+        """1ドメイン分を取得する。固定待機ではなく一覧の件数変化を待つ"""
+        url = f"https://www.virustotal.com/gui/domain/{domain}/relations"
+        timeout_ms = self.wait_timeout * 1000
+        found: Set[str] = set()
+        try:
+            # ページアクセス（連続アクセスを避けるため軽い揺らぎだけ入れる）
+            await asyncio.sleep(random.uniform(0.5, 1.5))
+            await self._goto(page, url)
+            try:
+                await page.wait_for_function(_GROWN_JS, arg=0, timeout=timeout_ms)
+            except self._timeout_error:
+                pass
+
+            # ページネーション処理: クリック後に件数が増えるまで待ち、増えなければ終了
+            count = await page.evaluate(_COUNT_JS)
+            button = page.locator(VT_BUTTON_SELECTOR).first
+            while await button.count() and await button.is_visible():
+                await button.scroll_into_view_if_needed()
+                await button.click()
+                try:
+                    await page.wait_for_function(_GROWN_JS, arg=count, timeout=timeout_ms)
+                except self._timeout_error:
+                    break
+                count = await page.evaluate(_COUNT_JS)
+
+            # サブドメイン収集
+            found = extract_domains(await page.evaluate(_COLLECT_JS, SUBDOMAIN_SELECTORS), domain)
+        except Exception as e:
+            print(f"エラーが発生しました ({domain}): {e}")
+
+        return self._finish(domain, found)
+
+    @staticmethod
+    async def _goto(page, url: str):
+        """ページを開き、ステータスと所要時間を記録する"""
+        start = time.perf_counter()
+        try:
+            response = await page.goto(url, wait_until='domcontentloaded')
+        except Exception:
+            METRICS.observe_http("virustotal", "error", time.perf_counter() - start)
+            raise
+        status = response.status if response is not None else "none"
+        METRICS.observe_http("virustotal", status, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _observe_api_response(response) -> None:
+        timing = response.request.timing or {}
+        elapsed = max(0.0, timing.get('responseEnd', 0) or 0) / 1000
+        METRICS.observe_http("virustotal_api", response.status, elapsed)
+
+    @staticmethod
+    async def _block_heavy_resources(route) -> None:
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _intercept_page(self, page, domain: str) -> List[Dict[str, str]]:
+        """1ドメイン分を、ページが受け取るサブドメイン一覧のJSON応答から取得する"""
+        url = f"https://www.virustotal.com/gui/domain/{domain}/relations"
+        timeout_ms = self.wait_timeout * 1000
+        pattern = subdomain_response_pattern(domain)
+        found: Set[str] = set()
+        parsing: List[asyncio.Task] = []
+
+        async def parse(response) -> None:
+            try:
+                found.update(parse_relationship_payload(await response.json(), domain))
+            except Exception:
+                pass
+
+        def on_response(response) -> None:
+            if not pattern.search(response.url):
+                return
+            self._observe_api_response(response)
+            if response.ok:
+                parsing.append(asyncio.ensure_future(parse(response)))
+
+        is_subdomain_response = lambda r: bool(pattern.search(r.url))
+        page.on('response', on_response)
+        try:
+            await asyncio.sleep(random.uniform(0.5, 1.5))
+            try:
+                async with page.expect_response(is_subdomain_response, timeout=timeout_ms):
+                    await self._goto(page, url)
+            except self._timeout_error:
+                pass
+
+            # 「もっと見る」1回につき次ページのJSONが1つ届くので、それを待つ
+            button = page.locator(VT_BUTTON_SELECTOR).first
+            while await button.count() and await button.is_visible():
+                try:
+                    async with page.expect_response(is_subdomain_response, timeout=timeout_ms):
+                        await button.click()
+                except self._timeout_error:
+                    break
+            await asyncio.gather(*parsing)
+        except Exception as e:
+            print(f"エラーが発生しました ({domain}): {e}")
+        finally:
+            page.remove_listener('response', on_response)
+
+        return self._finish(domain, found)
+
+    def _finish(self, domain: str, found: Set[str]) -> List[Dict[str, str]]:
+        subdomains = [{'subdomain': subdomain} for subdomain in sorted(found)]
+        if self.store is not None and subdomains:
+            self.store.put_candidates("virustotal", domain, sorted(found))
+        return subdomains
     
     def get_subdomains_list(self) -> List[str]:
         """サブドメインのリストを取得"""
@@ -185,6 +366,7 @@ def main():
     # ヘッドレスモード選択
     headless_input = input("ヘッドレスモードで実行しますか? (y/n): ").strip().lower()
     headless = headless_input == 'y'
+    intercept = input("JSON応答から取得する高速モードを使いますか? (y/n): ").strip().lower() == 'y'
     
     print(f"\nTarget Domain: {domain}")
     print(f"Mode: {'Headless' if headless else 'Browser Visible'}")
@@ -193,7 +375,7 @@ def main():
     print("\nスクレイピング実行中...")
     
     # スクレイパー実行
-    scraper = VirusTotalScraper(headless=headless)
+    scraper = VirusTotalScraper(headless=headless, intercept=intercept)
     subdomains = scraper.scrape_subdomains(domain)
     
     # 結果表示
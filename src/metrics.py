@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DNS/HTTP 問い合わせの計測
+
+段（gather_dns, bruteforce, resolve など）ごとに問い合わせ数・応答種別
+（ok/nodata/nxdomain/timeout/servfail/error）・遅延ヒストグラム・キャッシュヒット率を集計する。
+集計は Prometheus のテキスト形式（--metrics-port）か定期的な JSON スナップショット
+（--metrics-json）で公開し、--profile で実行終了時に段ごとの内訳を表示する。
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# dnspython と http.server は使う時に読み込む（どの CLI も起動時にこのモジュールを読むため）
+
+log = logging.getLogger(__name__)
+
+# 遅延ヒストグラムの上限（秒）
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX = "fqdn"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# 問い合わせを行っている段（asyncio のタスクやスレッドにも引き継がれる）
+_STAGE: ContextVar[str] = ContextVar("fqdn_stage", default="other")
+
+
+def current_stage() -> str:
+    return _STAGE.get()
+
+
+def dns_outcome(exc: Optional[BaseException]) -> str:
+    """dnspython の例外を応答種別に分類する"""
+    if exc is None:
+        return "ok"
+    import dns.exception
+    import dns.resolver
+
+    if isinstance(exc, dns.resolver.NXDOMAIN):
+        return "nxdomain"
+    if isinstance(exc, dns.resolver.NoAnswer):
+        return "nodata"
+    if isinstance(exc, dns.exception.Timeout):
+        return "timeout"
+    # 全サーバが SERVFAIL/REFUSED を返した場合
+    if isinstance(exc, dns.resolver.NoNameservers):
+        return "servfail"
+    return "error"
+
+
+class Histogram:
+    """固定バケットの累積ヒストグラム"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """q 分位が入るバケットの上限（最後のバケットは最大の境界を返す）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[min(i, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+
+class Metrics:
+    """プロセス内で共有するカウンタ・ヒストグラム・段ごとの所要時間"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        # 段 → [呼出し回数, 合計秒]
+        self.stages: Dict[str, List[float]] = {}
+        self.started = time.monotonic()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.stages.clear()
+            self.started = time.monotonic()
+
+    # --- 記録 ---
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def observe_dns(self, rdtype: str, outcome: str, seconds: float) -> None:
+        stage = current_stage()
+        self.inc("dns_queries_total", stage=stage, rdtype=rdtype, outcome=outcome)
+        self.observe("dns_query_seconds", seconds, stage=stage)
+
+    def observe_cache(self, hit: bool, coalesced: bool = False) -> None:
+        """coalesced は同じ問い合わせの完了待ちに合流した場合（キャッシュは引いていない）"""
+        result = "coalesced" if coalesced else "hit" if hit else "miss"
+        self.inc("dns_cache_total", stage=current_stage(), result=result)
+
+    def observe_http(self, service: str, status: object, seconds: float) -> None:
+        self.inc("http_requests_total", service=service, status=str(status))
+        self.observe("http_request_seconds", seconds, service=service)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """with 内の問い合わせに段名を付け、所要時間を積算する"""
+        token = _STAGE.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _STAGE.reset(token)
+            with self._lock:
+                ent = self.stages.setdefault(name, [0, 0.0])
+                ent[0] += 1
+                ent[1] += elapsed
+
+    # --- 出力 ---
+
+    def _sum(self, name: str, by: str, **match: str) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for (n, labels), v in list(self.counters.items()):
+            d = dict(labels)
+            if n == name and all(d.get(k) == val for k, val in match.items()):
+                out[d.get(by, "")] = out.get(d.get(by, ""), 0) + v
+        return out
+
+    def snapshot(self) -> Dict[str, object]:
+        """段ごとの集計を JSON 化しやすい形で返す"""
+        with self._lock:
+            stages = {name: list(v) for name, v in self.stages.items()}
+            names = set(stages)
+            names.update(dict(l).get("stage") for (n, l) in self.counters if n.startswith("dns_"))
+            out: Dict[str, object] = {
+                "uptime_s": round(time.monotonic() - self.started, 3),
+                "stages": {},
+                "http": {},
+            }
+            for stage in sorted(n for n in names if n):
+                outcomes = self._sum("dns_queries_total", "outcome", stage=stage)
+                cache = self._sum("dns_cache_total", "result", stage=stage)
+                saved = cache.get("hit", 0) + cache.get("coalesced", 0)
+                lookups = saved + cache.get("miss", 0)
+                hist = self.histograms.get(("dns_query_seconds", (("stage", stage),)))
+                calls, seconds = stages.get(stage, [0, 0.0])
+                out["stages"][stage] = {
+                    "calls": int(calls),
+                    "seconds": round(seconds, 3),
+                    "queries": int(sum(outcomes.values())),
+                    "outcomes": {k: int(v) for k, v in sorted(outcomes.items())},
+                    "cache_hit_rate": round(saved / lookups, 4) if lookups else 0.0,
+                    "p50_ms": round(hist.quantile(0.5) * 1000, 1) if hist else 0.0,
+                    "p99_ms": round(hist.quantile(0.99) * 1000, 1) if hist else 0.0,
+                }
+            for (n, labels), hist in self.histograms.items():
+                if n != "http_request_seconds":
+                    continue
+                service = dict(labels)["service"]
+                out["http"][service] = {
+                    "requests": hist.count,
+                    "status": {
+                        k: int(v)
+                        for k, v in sorted(self._sum("http_requests_total", "status", service=service).items())
+                    },
+                    "p50_ms": round(hist.quantile(0.5) * 1000, 1),
+                    "p99_ms": round(hist.quantile(0.99) * 1000, 1),
+                }
+        return out
+
+    def render_prometheus(self) -> str:
+        """Prometheus のテキスト形式"""
+
+        def fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            items = labels + extra
+            if not items:
+                return ""
+            body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in items)
+            return "{" + body + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            typed = set()
+            for (name, labels), v in sorted(self.counters.items()):
+                metric = f"{PREFIX}_{name}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{fmt(labels)} {v:g}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                metric = f"{PREFIX}_{name}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, c in zip(hist.buckets, hist.counts):
+                    cumulative += c
+                    lines.append(f"{metric}_bucket{fmt(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{metric}_bucket{fmt(labels, (('le', '+Inf'),))} {hist.count}")
+                lines.append(f"{metric}_sum{fmt(labels)} {hist.sum:.6f}")
+                lines.append(f"{metric}_count{fmt(labels)} {hist.count}")
+            if self.stages:
+                lines.append(f"# TYPE {PREFIX}_stage_seconds_total counter")
+                for stage, (_, seconds) in sorted(self.stages.items()):
+                    lines.append(f'{PREFIX}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def profile(self) -> str:
+        """段ごとの所要時間・問い合わせ数の表（--profile）"""
+        snap = self.snapshot()
+        rows = [
+            f"{'stage':<20} {'calls':>6} {'seconds':>9} {'queries':>8} {'hit%':>6} "
+            f"{'p50ms':>7} {'p99ms':>7}  outcomes"
+        ]
+        for stage, s in snap["stages"].items():
+            outcomes = " ".join(f"{k}={v}" for k, v in s["outcomes"].items())
+            rows.append(
+                f"{stage:<20} {s['calls']:>6} {s['seconds']:>9.3f} {s['queries']:>8} "
+                f"{s['cache_hit_rate'] * 100:>6.1f} {s['p50_ms']:>7} {s['p99_ms']:>7}  {outcomes}"
+            )
+        for service, h in snap["http"].items():
+            status = " ".join(f"{k}={v}" for k, v in h["status"].items())
+            rows.append(
+                f"{'http:' + service:<20} {h['requests']:>6} {'':>9} {'':>8} {'':>6} "
+                f"{h['p50_ms']:>7} {h['p99_ms']:>7}  {status}"
+            )
+        rows.append(f"total {snap['uptime_s']}s（並行実行した段は秒数が重なる）")
+        return "\n".join(rows)
+
+
+# 同一プロセス内の全リゾルバ・HTTPクライアントで共有する
+METRICS = Metrics()
+
+
+# --- 公開 ---
+
+class MetricsServer:
+    """/metrics（Prometheus）と /metrics.json を返す HTTP サーバ"""
+
+    def __init__(self, port: int, host: str = "127.0.0.1", metrics: Metrics = METRICS) -> None:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        outer = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.startswith("/metrics.json"):
+                    body = json.dumps(outer.snapshot(), ensure_ascii=False).encode()
+                    ctype = "application/json"
+                elif self.path.startswith("/metrics"):
+                    body = outer.render_prometheus().encode()
+                    ctype = "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        log.info(f"metrics: http://{host}:{self.port}/metrics")
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SnapshotWriter:
+    """interval 秒ごとに JSON スナップショットを書き出す（終了時にも1回書く）"""
+
+    def __init__(self, path: Path, interval: float = 10.0, metrics: Metrics = METRICS) -> None:
+        self.path = Path(path)
+        self.interval = interval
+        self.metrics = metrics
+        self._stop = threading.Event()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.metrics.snapshot(), ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+# --- CLI 共通 ---
+
+def add_metrics_arguments(p) -> None:
+    """argparse に計測の引数を追加する"""
+    p.add_argument("--profile", action="store_true", help="終了時に段ごとの所要時間と問い合わせ内訳を標準エラーに表示")
+    p.add_argument("--metrics-port", type=int, help="Prometheus 形式の /metrics を公開するポート")
+    p.add_argument("--metrics-json", help="JSON スナップショットの書き出し先")
+    p.add_argument("--metrics-interval", type=float, default=10.0, help="スナップショットの間隔（秒）")
+
+
+class MetricsSession:
+    """引数に応じて公開を開始し、close() で停止と --profile の表示を行う"""
+
+    def __init__(self, args, metrics: Metrics = METRICS) -> None:
+        self.metrics = metrics
+        self.profile = getattr(args, "profile", False)
+        port = getattr(args, "metrics_port", None)
+        path = getattr(args, "metrics_json", None)
+        self.server = MetricsServer(port, metrics=metrics) if port is not None else None
+        self.writer = (
+            SnapshotWriter(Path(path), args.metrics_interval, metrics) if path else None
+        )
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.profile:
+            # 標準出力は結果（TSV/JSONL）に使うことがあるので、表は標準エラーへ出す
+            print(self.metrics.profile(), file=sys.stderr)
+
+
+def start_from_args(args) -> MetricsSession:
+    return MetricsSession(args)
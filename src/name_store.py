@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大量のホスト名を保持する逆順ラベルのトライ
+
+"www.dev.example.com" を com → example → dev → www の順に辿るノードとして保持する。
+親ゾーンの部分は1回だけ格納し、子を持たない名前（大半のFQDN）は
+ゾーンのノードに最下位ラベルの bytes を置くだけでノードを作らない。
+
+ゾーン配下の列挙・所属判定はラベル数に比例する手間で済み、
+走査は DNS の正規順（親→子、同じ階層はラベル順）で1件ずつ返す。
+試しただけで保持する必要の無い名前には、固定サイズのブルームフィルタ（NameBloom）を使う。
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import heapq
+import math
+import sys
+from collections.abc import MutableSet
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class _Node:
+    """
+    ゾーン（子を持つ名前）1つ分
+
+    子を持たないラベルは bytes にして、ソート済みの list（packed）と
+    追加されたばかりの set（pending）に分けて持つ。pending が packed の
+    1/8 を超えたら packed へまとめて並べ直すので、名前あたりの領域は
+    set に全件を置くよりずっと小さい。
+    """
+
+    __slots__ = ("children", "packed", "pending", "terminal")
+
+    def __init__(self) -> None:
+        # 子を持つラベル → ノード
+        self.children: Dict[str, _Node] = {}
+        self.packed: List[bytes] = []
+        self.pending: Set[bytes] = set()
+        # このノード自体が登録された名前か
+        self.terminal = False
+
+    def __bool__(self) -> bool:
+        return self.terminal or bool(self.children) or self.has_leaves()
+
+    def has_leaves(self) -> bool:
+        return bool(self.packed) or bool(self.pending)
+
+    def has_leaf(self, key: bytes) -> bool:
+        if key in self.pending:
+            return True
+        i = bisect.bisect_left(self.packed, key)
+        return i < len(self.packed) and self.packed[i] == key
+
+    def add_leaf(self, key: bytes) -> None:
+        self.pending.add(key)
+        if len(self.pending) > 64 + len(self.packed) // 8:
+            # 2つの整列済みの並びの連結なので sort は実質マージで済む
+            self.packed += sorted(self.pending)
+            self.packed.sort()
+            self.pending = set()
+
+    def remove_leaf(self, key: bytes) -> bool:
+        if key in self.pending:
+            self.pending.discard(key)
+            return True
+        i = bisect.bisect_left(self.packed, key)
+        if i < len(self.packed) and self.packed[i] == key:
+            del self.packed[i]
+            return True
+        return False
+
+    def leaves(self) -> Iterator[bytes]:
+        """葉のラベルを昇順に返す"""
+        return heapq.merge(self.packed, sorted(self.pending))
+
+
+def _labels(name: str) -> List[str]:
+    return name.split(".")[::-1] if name else []
+
+
+def _key(label: str) -> bytes:
+    return label.encode("utf-8", "surrogateescape")
+
+
+class NameTrie(MutableSet):
+    """
+    set と同じように使える名前の集合
+
+    名前は呼び出し側で正規化（小文字・末尾の . なし）しておくこと。
+    走査中に追加・削除した場合の動作は dict と同じく保証しない。
+    """
+
+    __slots__ = ("_root", "_len", "_zones")
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self._root = _Node()
+        self._len = 0
+        # 親ゾーンの文字列 → ノード（同じゾーンへの追加・照会でトライを辿り直さない）
+        self._zones: Dict[str, _Node] = {}
+        self.update(names)
+
+    # --- 基本操作 ---
+
+    def _node(self, labels: List[str], create: bool = False) -> Optional[_Node]:
+        """labels を辿ったノード。create=True なら途中のノードを作る（葉はノードへ昇格）"""
+        node = self._root
+        for label in labels:
+            child = node.children.get(label)
+            if child is None:
+                if not create:
+                    return None
+                child = _Node()
+                if node.remove_leaf(_key(label)):
+                    child.terminal = True
+                node.children[sys.intern(label)] = child
+            node = child
+        return node
+
+    def _parent(self, name: str, create: bool = False) -> Tuple[Optional[_Node], str]:
+        """name の親ゾーンのノードと最下位ラベル"""
+        last, _, parent = name.partition(".")
+        node = self._zones.get(parent)
+        if node is None:
+            node = self._node(_labels(parent), create)
+            if node is not None:
+                self._zones[parent] = node
+        return node, last
+
+    def add(self, name: str) -> None:
+        if not name:
+            return
+        node, last = self._parent(name, create=True)
+        child = node.children.get(last)
+        if child is not None:
+            if child.terminal:
+                return
+            child.terminal = True
+        else:
+            key = _key(last)
+            if node.has_leaf(key):
+                return
+            node.add_leaf(key)
+        self._len += 1
+
+    def update(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.add(name)
+
+    def __contains__(self, name: object) -> bool:
+        if not isinstance(name, str) or not name:
+            return False
+        node, last = self._parent(name)
+        if node is None:
+            return False
+        child = node.children.get(last)
+        if child is not None:
+            return child.terminal
+        return node.has_leaf(_key(last))
+
+    def discard(self, name: str) -> None:
+        labels = _labels(name)
+        if not labels:
+            return
+        path = [self._root]
+        for label in labels[:-1]:
+            nxt = path[-1].children.get(label)
+            if nxt is None:
+                return
+            path.append(nxt)
+        parent, last = path[-1], labels[-1]
+        child = parent.children.get(last)
+        if child is not None and child.terminal:
+            child.terminal = False
+            if not child:
+                del parent.children[last]
+        elif child is not None or not parent.remove_leaf(_key(last)):
+            return
+        self._len -= 1
+        self._zones.clear()
+        # 空になった中間ノードを取り除き、子の無くなった登録名は葉に戻す
+        for i in range(len(labels) - 2, -1, -1):
+            node = path[i + 1]
+            if node.children or node.has_leaves():
+                break
+            del path[i].children[labels[i]]
+            if node.terminal:
+                path[i].add_leaf(_key(labels[i]))
+                break
+
+    def clear(self) -> None:
+        self._root = _Node()
+        self._len = 0
+        self._zones.clear()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[str]:
+        return self._walk(self._root, [])
+
+    def __repr__(self) -> str:
+        return f"NameTrie({self._len} names)"
+
+    # --- ゾーン単位の問い合わせ ---
+
+    @staticmethod
+    def _entries(node: _Node):
+        """node 直下の (ラベル, 子ノード or None) をラベル順に返す"""
+        # UTF-8 の bytes の順序は str の順序と一致する
+        subzones = sorted(((_key(label), child) for label, child in node.children.items()), key=lambda e: e[0])
+        leaves = ((key, None) for key in node.leaves())
+        for key, child in heapq.merge(subzones, leaves, key=lambda e: e[0]):
+            yield key.decode("utf-8", "surrogateescape"), child
+
+    def _walk(self, node: _Node, suffix: List[str]) -> Iterator[str]:
+        """node 配下を正規順に返す（suffix は node までの逆順ラベル）"""
+        tail = ".".join(reversed(suffix))
+        stack = [(self._entries(node), tail)]
+        while stack:
+            entries, tail = stack[-1]
+            for label, child in entries:
+                name = f"{label}.{tail}" if tail else label
+                if child is None:
+                    yield name
+                    continue
+                if child.terminal:
+                    yield name
+                stack.append((self._entries(child), name))
+                break
+            else:
+                stack.pop()
+
+    def under(self, zone: str, include_self: bool = False) -> Iterator[str]:
+        """zone 配下の名前を正規順に1件ずつ返す"""
+        labels = _labels(zone)
+        if not labels:
+            yield from self
+            return
+        node = self._node(labels)
+        if node is None:
+            if include_self and zone in self:
+                yield zone
+            return
+        if include_self and node.terminal:
+            yield zone
+        yield from self._walk(node, labels)
+
+    def children(self, zone: str) -> Iterator[str]:
+        """zone の1階層下に登録されている名前"""
+        labels = _labels(zone)
+        node = self._node(labels)
+        if node is None:
+            return
+        for label, child in self._entries(node):
+            if child is None or child.terminal:
+                yield f"{label}.{zone}" if zone else label
+
+    def covers(self, name: str) -> bool:
+        """name 自身かその親ゾーンのいずれかが登録されていれば True"""
+        return self.covering(name) is not None
+
+    def covering(self, name: str) -> Optional[str]:
+        """name 自身と親ゾーンのうち、登録されている最上位のもの（無ければ None）"""
+        node = self._root
+        labels = _labels(name)
+        for i, label in enumerate(labels):
+            child = node.children.get(label)
+            if child is None:
+                if not node.has_leaf(_key(label)):
+                    return None
+            elif not child.terminal:
+                node = child
+                continue
+            return ".".join(reversed(labels[:i + 1]))
+        return None
+
+
+class NameBloom:
+    """
+    試した名前を覚えるブルームフィルタ
+
+    偽陽性（試していない名前を試したとみなす）は error_rate 程度あるが、偽陰性は無い。
+    capacity 件を入れた時に error_rate になる大きさのビット列を1つ持つだけなので、
+    候補を大量に生成しても名前の文字列は保持しない。
+    """
+
+    __slots__ = ("_bits", "_size", "_hashes", "_len")
+
+    def __init__(self, capacity: int = 1 << 20, error_rate: float = 1e-3) -> None:
+        size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._bits = bytearray((size + 7) // 8)
+        self._size = size
+        self._hashes = max(1, round(size / capacity * math.log(2)))
+        self._len = 0
+
+    def _positions(self, name: str) -> Iterator[int]:
+        # 128ビットのハッシュを2つに分けたダブルハッシュ
+        digest = hashlib.blake2b(name.encode("utf-8", "surrogateescape"), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little")
+        b = int.from_bytes(digest[8:], "little") | 1
+        size = self._size
+        return ((a + i * b) % size for i in range(self._hashes))
+
+    def add(self, name: str) -> bool:
+        """name を加え、新しく加わった（それまで含まれていなかった）なら True"""
+        added = False
+        bits = self._bits
+        for pos in self._positions(name):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                added = True
+        self._len += added
+        return added
+
+    def __contains__(self, name: object) -> bool:
+        if not isinstance(name, str):
+            return False
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(name))
+
+    def __len__(self) -> int:
+        """加えた名前の数（偽陽性で加わらなかった分は数えない）"""
+        return self._len
+
+    def __repr__(self) -> str:
+        return f"NameBloom({self._len} names, {len(self._bits)} bytes)"
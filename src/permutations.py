@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+発見済みの名前を変形した候補（パーミュテーション）の生成と確認
+
+dev1.example.com や api-staging.example.com のような発見済みの名前から、ラベルに使われている語
+（dev, api, staging）と付け方（連番・ハイフン・下位ラベル）の多さを学び、dev2 / api-prod / stage.api
+のような関連しそうな名前を見込みの高いものから1件ずつ生成する。
+生成済みの名前は NameBloom で除いてからまとめて解決し、ゾーン毎の問い合わせ数に上限を設ける。
+見つかった名前はすぐに学び直し、その変形（dev2 → dev3 等）を残りの候補と順位で合流させる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import re
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dns_cache import CachingResolver, QueryBudget
+from name_store import NameBloom
+
+log = logging.getLogger(__name__)
+
+# 発見済みの名前に無くても組み合わせる語（環境・世代を表すもの）
+SEED_WORDS = (
+    "dev", "test", "stage", "staging", "prod", "qa", "uat", "beta", "demo", "old", "new", "internal",
+)
+# 規則 → 基本の重み。発見済みの名前でその付け方が多いほど引き上げる
+RULE_WEIGHTS = {"dash": 0.8, "sub": 0.7, "replace": 0.6, "concat": 0.3}
+# 組み合わせる語の数の上限
+MAX_WORDS = 64
+
+_TOKEN = re.compile(r"[a-z]+|[0-9]+")
+_NUMBERED = re.compile(r"(.*?)([0-9]+)")
+_LABEL = re.compile(r"[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?")
+
+
+class TokenModel:
+    """発見済みの名前のラベルから、語の出現数と付け方（連番・ハイフン・下位ラベル）の数を数える"""
+
+    def __init__(self, seeds: Iterable[str] = SEED_WORDS) -> None:
+        self.words: Counter = Counter()
+        self.patterns: Counter = Counter()
+        self.labels = 0
+        self.seeds = tuple(seeds)
+
+    def learn(self, name: str, root: str) -> None:
+        """root 配下の name の、root より左のラベルを数える"""
+        if not name.endswith(f".{root}"):
+            return
+        labels = name[:-len(root) - 1].split(".")
+        if len(labels) > 1:
+            self.patterns["sub"] += 1
+        for label in labels:
+            self.labels += 1
+            if "-" in label:
+                self.patterns["dash"] += 1
+            for token in _TOKEN.findall(label):
+                if token.isdigit():
+                    self.patterns["number"] += 1
+                else:
+                    self.words[token] += 1
+
+    def update(self, names: Iterable[str], root: str) -> None:
+        for name in names:
+            self.learn(name, root)
+
+    def ranked_words(self) -> List[Tuple[str, float]]:
+        """(語, 点数) を点数の高い順に MAX_WORDS 件。点数は出現数、種の語には 0.5 を足す"""
+        scores = {w: float(c) for w, c in self.words.items() if len(w) > 1}
+        for w in self.seeds:
+            scores[w] = scores.get(w, 0.0) + 0.5
+        return sorted(scores.items(), key=lambda e: (-e[1], e[0]))[:MAX_WORDS]
+
+    def rule_weight(self, rule: str) -> float:
+        share = self.patterns[rule] / self.labels if self.labels else 0.0
+        return RULE_WEIGHTS[rule] * (1 + share)
+
+
+# --- 変形の規則（最下位ラベル label と残り parent から名前を作る） ---
+
+def _numbered(label: str, parent: str) -> Iterator[str]:
+    """連番の前後（dev1 → dev2, dev0）。数字の無いラベルには番号を付ける"""
+    m = _NUMBERED.fullmatch(label)
+    if m is None:
+        for suffix in ("1", "2", "-1", "-2", "01", "02"):
+            yield f"{label}{suffix}.{parent}"
+        return
+    head, digits = m.groups()
+    n = int(digits)
+    for d in (1, -1, 2, -2):
+        if n + d >= 0:
+            yield f"{head}{n + d:0{len(digits)}d}.{parent}"
+
+
+def _dash(label: str, parent: str, word: str) -> Iterator[str]:
+    yield f"{label}-{word}.{parent}"
+    yield f"{word}-{label}.{parent}"
+
+
+def _sub(label: str, parent: str, word: str) -> Iterator[str]:
+    yield f"{word}.{label}.{parent}"
+
+
+def _replace(label: str, parent: str, word: str) -> Iterator[str]:
+    """ラベル中の語を1つずつ word に置き換える（dev.api → stage.api, api-staging → api-prod）"""
+    for m in _TOKEN.finditer(label):
+        if not m.group().isdigit():
+            yield f"{label[:m.start()]}{word}{label[m.end():]}.{parent}"
+
+
+def _concat(label: str, parent: str, word: str) -> Iterator[str]:
+    yield f"{label}{word}.{parent}"
+    yield f"{word}{label}.{parent}"
+
+
+_RULES = {"dash": _dash, "sub": _sub, "replace": _replace, "concat": _concat}
+
+
+def _ranked(bases: Iterable[str], model: TokenModel) -> Iterator[Tuple[Tuple[int, float], str]]:
+    """generate() の各名前に順位のキー（小さいほど先）を付けて返す"""
+    split = []
+    for base in bases:
+        label, _, parent = base.partition(".")
+        split.append((label, parent, set(_TOKEN.findall(label))))
+    for label, parent, _ in split:
+        for name in _numbered(label, parent):
+            yield (0, 0.0), name
+    pairs = sorted(
+        ((model.rule_weight(rule) * score, rule, word)
+         for word, score in model.ranked_words() for rule in RULE_WEIGHTS),
+        key=lambda e: -e[0],
+    )
+    for score, rule, word in pairs:
+        make = _RULES[rule]
+        for label, parent, tokens in split:
+            if word not in tokens:
+                for name in make(label, parent, word):
+                    yield (1, -score), name
+
+
+def generate(bases: Iterable[str], model: TokenModel) -> Iterator[str]:
+    """
+    bases の変形を見込みの高い順に1件ずつ返す（重複・既知の名前の除外は呼び出し側で行う）
+
+    連番の前後を最初に全件分返し、続いて（規則の重み × 語の点数）の高い組から順に各名前へ当てはめる。
+    組の数は規則 × MAX_WORDS で抑え、名前との組合せは取り出されるまで作らない。
+    """
+    return (name for _, name in _ranked(bases, model))
+
+
+class PermutationStage:
+    """
+    発見済みの名前の変形を、ゾーン毎の問い合わせ数の上限まで A/AAAA（存在すれば NS）で確認する
+
+    Args:
+        resolver: 共有キャッシュつきリゾルバ
+        budget: ゾーンあたりの問い合わせ数の上限（キャッシュに当たった分は数えない）
+        batch: まとめて解決する候補の数
+        tried: 生成済みの名前のブルームフィルタ（ゾーンをまたいで共有する。省略時は run 毎に作る）
+        seeds: 発見済みの名前に無くても組み合わせる語
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[CachingResolver] = None,
+        budget: int = 1000,
+        batch: int = 100,
+        tried: Optional[NameBloom] = None,
+        seeds: Iterable[str] = SEED_WORDS,
+    ) -> None:
+        self.resolver = resolver or CachingResolver()
+        self.budget = budget
+        self.batch = batch
+        self.tried = tried
+        self.seeds = tuple(seeds)
+        self.queries = 0
+        self.candidates = 0
+
+    async def run(
+        self,
+        zone: str,
+        bases: Iterable[str],
+        model: Optional[TokenModel] = None,
+        known: Callable[[str], bool] = lambda h: False,
+        is_wildcard: Callable[[Dict[str, List[str]]], bool] = lambda ans: False,
+        query: Optional[Callable[[str, str], Awaitable]] = None,
+    ) -> Dict[str, bool]:
+        """
+        zone の名前 bases を変形して確認し、見つかったホスト → 委任されているか を返す
+
+        Args:
+            bases: 変形の元にする zone の発見済みの名前
+            model: 語と付け方を学んだ TokenModel（省略時は bases から学ぶ）
+            known: 既に発見済みの名前なら True を返す関数（問い合わせを省く）
+            is_wildcard: A/AAAA応答がゾーンのワイルドカード応答なら True を返す関数
+            query: 実際の問い合わせ関数（省略時はリゾルバの既定の問い合わせ先）
+        """
+        bases = list(bases)
+        if model is None:
+            model = TokenModel(self.seeds)
+            model.update(bases, zone)
+        tried = self.tried if self.tried is not None else NameBloom()
+        budget = QueryBudget(query or self.resolver.aupstream, self.budget)
+        dot_zone = f".{zone}"
+        hits: Dict[str, bool] = {}
+        self.candidates = 0
+
+        ranked = _ranked(bases, model)
+
+        def take(n: int) -> List[str]:
+            """順位の高い方から、形式が正しく未生成・未発見の候補を n 件"""
+            batch: List[str] = []
+            for _, fqdn in ranked:
+                if len(fqdn) > 253 or not fqdn.endswith(dot_zone):
+                    continue
+                if not all(_LABEL.fullmatch(label) for label in fqdn[:-len(dot_zone)].split(".")):
+                    continue
+                # 生成済みの名前（偽陽性で稀に未生成の名前も）と発見済みの名前は問い合わせない
+                if not tried.add(fqdn) or known(fqdn):
+                    continue
+                batch.append(fqdn)
+                if len(batch) >= n:
+                    break
+            return batch
+
+        async def check(fqdn: str) -> None:
+            a, aaaa = await asyncio.gather(
+                self.resolver.aresolve(fqdn, "A", query=budget.query),
+                self.resolver.aresolve(fqdn, "AAAA", query=budget.query),
+            )
+            if (a or aaaa) and not is_wildcard({"A": a, "AAAA": aaaa}):
+                ns = await self.resolver.aresolve(fqdn, "NS", query=budget.query)
+                hits[fqdn] = bool(ns)
+
+        while True:
+            # 1件あたり最大3問い合わせ。上限を越えそうなバッチは送らない
+            n = self.batch
+            if budget.limit is not None:
+                n = min(n, (budget.limit - budget.used) // 3)
+            batch = take(n) if n > 0 else []
+            if not batch:
+                break
+            self.candidates += len(batch)
+            found = len(hits)
+            await asyncio.gather(*(check(fqdn) for fqdn in batch))
+            new = list(hits)[found:]
+            if new:
+                # 見つかった名前から学び直し、その変形を残りの候補と順位で合流させる
+                model.update(new, zone)
+                ranked = heapq.merge(ranked, _ranked(new, model), key=lambda e: e[0])
+
+        self.queries = budget.used
+        log.info(
+            f"permute {zone}: {len(hits)} hits, {self.candidates} candidates, {self.queries} queries"
+        )
+        return hits
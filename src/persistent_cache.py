@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日次スキャン向けの永続キャッシュ（SQLite）
+
+DNS応答と Shodan/VirusTotal/CTログの候補リストを取得時刻つきで artifacts/ 配下に保存し、
+再スキャン時は期限切れのものだけを問い合わせ直す。
+
+    python src/persistent_cache.py stats
+    python src/persistent_cache.py purge --max-age 604800
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATH = Path("artifacts") / "resolve_cache.sqlite3"
+# 候補リストの既定の有効期間（秒）
+CANDIDATE_MAX_AGE = 86400
+# まとめてコミットする書込み件数
+COMMIT_EVERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dns (
+    name    TEXT NOT NULL,
+    rdtype  TEXT NOT NULL,
+    records TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (name, rdtype)
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    source  TEXT NOT NULL,
+    zone    TEXT NOT NULL,
+    names   TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    PRIMARY KEY (source, zone)
+);
+"""
+
+
+class PersistentCache:
+    """
+    DNS応答と候補リストの永続ストア
+
+    Args:
+        path: SQLiteファイルのパス
+        max_age: 指定時はTTLに関係なく、取得からこの秒数以内の応答を再利用する
+    """
+
+    def __init__(self, path: Path = DEFAULT_PATH, max_age: Optional[float] = None) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    # --- DNS応答 ---
+
+    def _fresh(self, fetched: float, expires: float, now: float) -> bool:
+        if self.max_age is not None:
+            return now - fetched <= self.max_age
+        return expires > now
+
+    def get_dns(self, name: str, rdtype: str) -> Optional[Tuple[List[str], float]]:
+        """(レコード, 残り有効秒数) を返す。無い/期限切れなら None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT records, fetched, expires FROM dns WHERE name=? AND rdtype=?",
+                (name, rdtype),
+            ).fetchone()
+        now = time.time()
+        if row is None or not self._fresh(row[1], row[2], now):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.max_age is not None:
+            remaining = row[1] + self.max_age - now
+        else:
+            remaining = row[2] - now
+        return json.loads(row[0]), remaining
+
+    def put_dns(self, name: str, rdtype: str, records: List[str], ttl: float) -> None:
+        now = time.time()
+        self._write(
+            "INSERT OR REPLACE INTO dns VALUES (?, ?, ?, ?, ?)",
+            (name, rdtype, json.dumps(records), now, now + ttl),
+        )
+
+    # --- 候補リスト ---
+
+    def get_candidates(self, source: str, zone: str) -> Optional[Set[str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT names, fetched FROM candidates WHERE source=? AND zone=?",
+                (source, zone),
+            ).fetchone()
+        max_age = self.max_age if self.max_age is not None else CANDIDATE_MAX_AGE
+        if row is None or time.time() - row[1] > max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return set(json.loads(row[0]))
+
+    def put_candidates(self, source: str, zone: str, names: Iterable[str]) -> None:
+        names = sorted(set(names))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT names FROM candidates WHERE source=? AND zone=?", (source, zone)
+            ).fetchone()
+        if row is not None:
+            old = set(json.loads(row[0]))
+            added, removed = set(names) - old, old - set(names)
+            if added or removed:
+                log.info(f"{source} {zone}: +{len(added)} -{len(removed)}")
+        self._write(
+            "INSERT OR REPLACE INTO candidates VALUES (?, ?, ?, ?)",
+            (source, zone, json.dumps(names), time.time()),
+        )
+
+    # --- 保守 ---
+
+    def _write(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def purge(self, older_than: float) -> int:
+        """取得から older_than 秒を過ぎたエントリを削除し、削除件数を返す"""
+        cutoff = time.time() - older_than
+        with self._lock:
+            n = self._conn.execute("DELETE FROM dns WHERE fetched < ?", (cutoff,)).rowcount
+            n += self._conn.execute("DELETE FROM candidates WHERE fetched < ?", (cutoff,)).rowcount
+            self._conn.commit()
+        return n
+
+    def stats(self) -> Dict[str, object]:
+        now = time.time()
+        with self._lock:
+            q = self._conn.execute
+            dns_total = q("SELECT COUNT(*) FROM dns").fetchone()[0]
+            dns_live = q("SELECT COUNT(*) FROM dns WHERE expires > ?", (now,)).fetchone()[0]
+            negative = q("SELECT COUNT(*) FROM dns WHERE records = '[]'").fetchone()[0]
+            oldest = q("SELECT MIN(fetched) FROM dns").fetchone()[0]
+            cands = q("SELECT source, COUNT(*) FROM candidates GROUP BY source").fetchall()
+        return {
+            "path": str(self.path),
+            "bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "dns_entries": dns_total,
+            "dns_unexpired": dns_live,
+            "dns_negative": negative,
+            "oldest_age_sec": round(now - oldest) if oldest else None,
+            "candidate_lists": dict(cands),
+            "session_hits": self.hits,
+            "session_misses": self.misses,
+        }
+
+
+def add_cache_arguments(p) -> None:
+    """各CLI共通の永続キャッシュ用オプション"""
+    p.add_argument("--cache", nargs="?", const=str(DEFAULT_PATH), default=None,
+                   help=f"永続キャッシュを使う（既定: {DEFAULT_PATH}）")
+    p.add_argument("--max-age", type=float, default=None,
+                   help="TTLに関係なく、取得からこの秒数以内の応答を再利用する")
+
+
+def open_from_args(args) -> Optional[PersistentCache]:
+    if not args.cache:
+        return None
+    return PersistentCache(Path(args.cache), max_age=args.max_age)
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser(description="永続解決キャッシュの管理")
+    p.add_argument("command", choices=["stats", "purge"])
+    p.add_argument("--path", default=str(DEFAULT_PATH), help="キャッシュファイル")
+    p.add_argument("--max-age", type=float, default=7 * 86400, help="purge: 削除する経過秒数")
+    args = p.parse_args()
+
+    if not Path(args.path).exists():
+        raise SystemExit(f"{args.path} がありません。")
+    store = PersistentCache(Path(args.path))
+    try:
+        if args.command == "stats":
+            for k, v in store.stats().items():
+                print(f"{k:16s} {v}")
+        else:
+            print(f"purged: {store.purge(args.max_age)}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
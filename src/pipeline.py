@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ドメイン → FQDN → IP を1つのストリーミング処理として実行する
+
+DomainEnumerator（DNS/総当たり/Shodan/CTログ/変形候補）と VirusTotal スクレイパーが見つけたFQDNを
+上限つきキューで IP 解決へ流し、列挙の途中から解決と出力を始める。
+
+    python src/pipeline.py --domain example.com --vt --output artifacts/example.jsonl
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TextIO
+
+from async_enum import AsyncDomainEnumerator
+from dns_cache import CachingResolver
+from fqdn2ips import DEFAULT_NAMESERVERS, BatchResolver
+from name_store import NameTrie
+
+log = logging.getLogger(__name__)
+
+_DONE = None
+
+
+class Pipeline:
+    """
+    列挙・補完・IP解決を上限つきキューでつないだパイプライン
+
+    Args:
+        domain: 対象ドメイン
+        out: レポートの出力先（1件ずつ書き出す）
+        fmt: "jsonl" または "tsv"
+        use_vt: VirusTotal スクレイパーを情報源に加える
+        queue_size: 段間キューの上限
+        resolve_workers: IP解決の並行数
+        ct_files: 列挙の情報源に加える CTログのエクスポート（ct_logs.py）
+        permute_budget: 発見済みの名前の変形を試す時のゾーンあたりの問い合わせ数の上限（0 なら試さない）
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        out: TextIO,
+        fmt: str = "jsonl",
+        shodan_api_key: Optional[str] = None,
+        use_vt: bool = False,
+        headless: bool = True,
+        wordlist: Optional[Path] = None,
+        nameservers: Optional[List[str]] = None,
+        resolve_nameservers: Optional[List[str]] = None,
+        port: int = 53,
+        concurrency: int = 100,
+        rate_per_ns: float = 50.0,
+        queue_size: int = 1000,
+        resolve_workers: int = 200,
+        resolver: Optional[CachingResolver] = None,
+        ct_files: Iterable[Path] = (),
+        permute_budget: int = 0,
+    ) -> None:
+        self.domain = domain.strip().rstrip(".").lower()
+        self._dot_domain = f".{self.domain}"
+        self.out = out
+        self.fmt = fmt
+        self.use_vt = use_vt
+        self.headless = headless
+        self.queue_size = queue_size
+        self.resolve_workers = resolve_workers
+        self.resolver = resolver or CachingResolver()
+        self.enumerator = AsyncDomainEnumerator(
+            self.domain, shodan_api_key,
+            concurrency=concurrency, rate_per_ns=rate_per_ns,
+            nameservers=nameservers, port=port, resolver=self.resolver, wordlist=wordlist,
+            ct_files=ct_files, permute_budget=permute_budget,
+        )
+        self.ip_resolver = BatchResolver(
+            nameservers=resolve_nameservers or nameservers or DEFAULT_NAMESERVERS,
+            concurrency=resolve_workers * 2, port=port, resolver=self.resolver,
+        )
+        self.seen = NameTrie()
+        self.stats: Dict[str, int] = {"found": 0, "duplicates": 0, "resolved": 0, "unresolved": 0}
+
+    # --- 情報源 ---
+
+    async def _enumerate(self, names: asyncio.Queue) -> None:
+        self.enumerator.found = names
+        try:
+            await self.enumerator.arun()
+        except Exception as e:
+            log.error(f"enumerator: {e}")
+
+    async def _virustotal(self, names: asyncio.Queue) -> None:
+        from html_fetcher import VirusTotalScraper
+
+        scraper = VirusTotalScraper(headless=self.headless, store=self.resolver.cache.store)
+        try:
+            async for _, subdomains in scraper.ascrape_many([self.domain], pages=1):
+                for item in subdomains:
+                    await names.put((item["subdomain"], "virustotal"))
+        except Exception as e:
+            log.error(f"virustotal: {e}")
+
+    # --- 重複排除 ---
+
+    def _in_scope(self, name: str) -> bool:
+        return name == self.domain or name.endswith(self._dot_domain)
+
+    async def _dedupe(self, names: asyncio.Queue, todo: asyncio.Queue, sources: int) -> None:
+        finished = 0
+        while finished < sources:
+            item = await names.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            name, source = item
+            name = name.strip().rstrip(".").lower()
+            if not self._in_scope(name):
+                continue
+            if name in self.seen:
+                self.stats["duplicates"] += 1
+                continue
+            self.seen.add(name)
+            self.stats["found"] += 1
+            await todo.put((name, source))
+        for _ in range(self.resolve_workers):
+            await todo.put(_DONE)
+
+    # --- IP解決と出力 ---
+
+    async def _resolve(self, todo: asyncio.Queue) -> None:
+        while (item := await todo.get()) is not _DONE:
+            name, source = item
+            ips = await self.ip_resolver.resolve(name)
+            self.stats["resolved" if ips else "unresolved"] += 1
+            self._emit(name, source, ips)
+
+    def _emit(self, name: str, source: str, ips: List[str]) -> None:
+        if self.fmt == "jsonl":
+            line = json.dumps({"fqdn": name, "source": source, "ips": ips}, ensure_ascii=False)
+        else:
+            line = "\n".join(f"{name}\t{ip}\t{source}" for ip in ips) if ips else f"{name}\t-\t{source}"
+        self.out.write(line + "\n")
+        self.out.flush()
+
+    # --- 実行 ---
+
+    async def run(self) -> Dict[str, int]:
+        names: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        todo: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        start = time.monotonic()
+
+        async def source(coro) -> None:
+            try:
+                await coro
+            finally:
+                await names.put(_DONE)
+
+        sources = [self._enumerate(names)]
+        if self.use_vt:
+            sources.append(self._virustotal(names))
+        try:
+            await asyncio.gather(
+                *(source(s) for s in sources),
+                self._dedupe(names, todo, len(sources)),
+                *(self._resolve(todo) for _ in range(self.resolve_workers)),
+            )
+        finally:
+            self.ip_resolver.close()
+        self.stats["elapsed_ms"] = int((time.monotonic() - start) * 1000)
+        return self.stats
+
+
+def main() -> None:
+    import argparse
+
+    from domain2fqdns import shodan_api_key
+    from dns_cache import SHARED_CACHE
+    from metrics import add_metrics_arguments, start_from_args
+    from persistent_cache import add_cache_arguments, open_from_args
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    p = argparse.ArgumentParser(description="ドメイン→FQDN→IP の一括ストリーミング実行")
+    p.add_argument("--domain", required=True, help="対象ドメイン")
+    p.add_argument("--vt", action="store_true", help="VirusTotal スクレイピングも情報源に加える")
+    p.add_argument("--debug", action="store_true", help="VirusTotal をブラウザ表示モードで実行")
+    p.add_argument("--wordlist", help="追加で総当たりするラベルのワードリスト")
+    p.add_argument("--ct-file", dest="ct_files", action="append", default=[],
+                   help="CTログのエクスポート（crt.sh の JSON/CSV、.gz 可）。複数指定可")
+    p.add_argument("--permute", dest="permute_budget", type=int, nargs="?", const=1000, default=0,
+                   help="発見済みの名前の変形も試す。値はゾーンあたりの問い合わせ数の上限（既定: 1000）")
+    p.add_argument("--format", choices=["jsonl", "tsv"], default="jsonl", help="出力形式")
+    p.add_argument("--output", help="出力先（省略時は標準出力）")
+    p.add_argument("--nameservers", help="列挙に使うネームサーバ（カンマ区切り）")
+    p.add_argument("--concurrency", type=int, default=100, help="列挙の同時クエリ数")
+    p.add_argument("--resolve-workers", type=int, default=200, help="IP解決の並行数")
+    add_cache_arguments(p)
+    add_metrics_arguments(p)
+    args = p.parse_args()
+
+    store = open_from_args(args)
+    SHARED_CACHE.store = store
+    session = start_from_args(args)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    nameservers = [x.strip() for x in args.nameservers.split(",")] if args.nameservers else None
+    try:
+        stats = asyncio.run(Pipeline(
+            args.domain, out, args.format, shodan_api_key(),
+            use_vt=args.vt, headless=not args.debug, wordlist=args.wordlist,
+            nameservers=nameservers, concurrency=args.concurrency,
+            resolve_workers=args.resolve_workers, ct_files=args.ct_files,
+            permute_budget=args.permute_budget,
+        ).run())
+        log.info(" ".join(f"{k}={v}" for k, v in stats.items()))
+    finally:
+        if args.output:
+            out.close()
+        if store is not None:
+            store.close()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
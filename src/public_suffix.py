@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Public Suffix List による登録可能ドメイン（組織の単位）の判定
+
+ns1.example.co.jp の登録可能ドメインは co.jp の1つ下の example.co.jp で、最後の2ラベル（co.jp）ではない。
+一覧は環境変数 PUBLIC_SUFFIX_LIST のファイル、無ければ OS 同梱の public_suffix_list.dat を読み、
+どちらも無い場合は主な ccTLD の2階層の接尾辞だけを持つ組込みの一覧を使う。
+組織の単位として使うので、一覧の ICANN の部分だけを読む（github.io 等の私的な接尾辞は含めない）。
+
+    python src/public_suffix.py ns1.example.co.jp www.example.com
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+log = logging.getLogger(__name__)
+
+SYSTEM_PATHS = (
+    Path("/usr/share/publicsuffix/public_suffix_list.dat"),
+    Path("/usr/local/share/publicsuffix/public_suffix_list.dat"),
+)
+_PRIVATE_BEGIN = "===BEGIN PRIVATE DOMAINS==="
+
+# 一覧が無いときの接尾辞（1ラベルの TLD はすべて接尾辞とみなすので、2階層以上のものだけ）
+FALLBACK_RULES = tuple(
+    f"{sld}.{tld}"
+    for tld, slds in (
+        ("jp", "ac ad co ed go gr lg ne or"),
+        ("uk", "ac co gov ltd me net nhs org plc police sch"),
+        ("au", "asn com edu gov id net org"),
+        ("nz", "ac co geek gen govt iwi maori net org school"),
+        ("kr", "ac co go ne or pe re"),
+        ("cn", "ac com edu gov net org"),
+        ("tw", "com edu gov idv net org"),
+        ("hk", "com edu gov idv net org"),
+        ("sg", "com edu gov net org per"),
+        ("th", "ac co go in mi net or"),
+        ("in", "ac co edu firm gen gov ind net org res"),
+        ("br", "com edu gov net org"),
+        ("za", "ac co edu gov net org"),
+        ("id", "ac co go net or web"),
+        ("my", "com edu gov net org"),
+        ("ph", "com edu gov net org"),
+        ("vn", "com edu gov net org"),
+        ("mx", "com edu gob net org"),
+        ("ar", "com edu gob net org"),
+        ("tr", "com edu gov net org"),
+        ("il", "ac co gov net org"),
+    )
+    for sld in slds.split()
+)
+
+
+class PublicSuffixList:
+    """
+    接尾辞の規則（通常・ワイルドカード "*.ck"・例外 "!www.ck"）を持ち、名前の登録可能ドメインを返す
+
+    Args:
+        rules: Public Suffix List の形式の規則
+    """
+
+    def __init__(self, rules: Iterable[str]) -> None:
+        self.rules: Set[str] = set()
+        self.wildcards: Set[str] = set()
+        self.exceptions: Set[str] = set()
+        for rule in rules:
+            rule = _to_ascii(rule.strip().lower())
+            if not rule:
+                continue
+            if rule.startswith("!"):
+                self.exceptions.add(rule[1:])
+            elif rule.startswith("*."):
+                self.wildcards.add(rule[2:])
+            else:
+                self.rules.add(rule)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "PublicSuffixList":
+        """public_suffix_list.dat の ICANN の部分を読む"""
+        rules = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if _PRIVATE_BEGIN in line:
+                    break
+                line = line.strip()
+                if line and not line.startswith("//"):
+                    rules.append(line.split()[0])
+        return cls(rules)
+
+    def suffix_length(self, labels: List[str]) -> int:
+        """labels（左から右の順）の末尾のうち接尾辞に当たるラベル数。一覧に無い TLD も1ラベルの接尾辞とする"""
+        n = 1
+        for i in range(len(labels) - 1, -1, -1):
+            name = ".".join(labels[i:])
+            if name in self.exceptions:
+                return len(labels) - i - 1
+            if name in self.rules:
+                n = len(labels) - i
+            if i > 0 and name in self.wildcards:
+                n = len(labels) - i + 1
+        return n
+
+    def registrable(self, name: str) -> Optional[str]:
+        """name の登録可能ドメイン（接尾辞 + 1ラベル）。name が接尾辞そのものなら None"""
+        labels = name.rstrip(".").lower().split(".")
+        if not all(labels):
+            return None
+        n = self.suffix_length(labels)
+        if len(labels) <= n:
+            return None
+        return ".".join(labels[-n - 1:])
+
+
+def _to_ascii(rule: str) -> str:
+    # 一覧の国際化ドメイン名は A ラベル（xn--）にして照合する
+    if rule.isascii():
+        return rule
+    try:
+        return ".".join(p if p.isascii() else p.encode("idna").decode("ascii") for p in rule.split("."))
+    except UnicodeError:
+        return ""
+
+
+def _find_list() -> Optional[Path]:
+    env = os.environ.get("PUBLIC_SUFFIX_LIST")
+    if env:
+        return Path(env)
+    return next((p for p in SYSTEM_PATHS if p.exists()), None)
+
+
+@lru_cache(maxsize=1)
+def default_list() -> PublicSuffixList:
+    """既定の一覧（初回の呼び出しで読む）"""
+    path = _find_list()
+    if path is not None:
+        try:
+            return PublicSuffixList.from_file(path)
+        except OSError as e:
+            log.warning(f"Public Suffix List を読めません（組込みの一覧を使います）: {path}: {e}")
+    return PublicSuffixList(FALLBACK_RULES)
+
+
+@lru_cache(maxsize=1 << 14)
+def registrable_domain(name: str) -> Optional[str]:
+    """既定の一覧による name の登録可能ドメイン（例: ns1.example.co.jp → example.co.jp）"""
+    return default_list().registrable(name)
+
+
+def main() -> None:
+    for name in sys.argv[1:]:
+        print(f"{name}\t{registrable_domain(name) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
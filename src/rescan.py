@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前回の結果との差分だけを出す再スキャン
+
+前回のスナップショット（サブドメイン・FQDN・IP）を読み、既知の名前をまず1回の並行問い合わせで
+再確認してから、残りの問い合わせ予算を新しい名前の発見に使う。出力は追加・削除・IP変化の
+JSONL で、スナップショットは今回の結果で上書きする。
+
+    python src/rescan.py --domain example.com --budget 20000 --output artifacts/example.diff.jsonl
+    python src/rescan.py --input apex.txt --parallel 10 --budget 5000
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, TextIO, Tuple
+
+import dns.resolver
+
+from async_enum import AsyncDomainEnumerator
+from dns_cache import CachingResolver, QueryBudget, ResolverPool
+
+log = logging.getLogger(__name__)
+
+DEFAULT_STATE_DIR = Path("artifacts") / "rescan"
+
+# 再確認の結果
+EXISTS, GONE, UNKNOWN = "exists", "gone", "unknown"
+
+
+# --- スナップショット ---
+
+def state_path(domain: str, state_dir: Path = DEFAULT_STATE_DIR) -> Path:
+    return Path(state_dir) / f"{domain}.json"
+
+
+def load_snapshot(path: Path) -> Optional[Dict]:
+    if not Path(path).exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_snapshot(path: Path, domain: str, subdomains: Set[str], fqdns: Dict[str, List[str]]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "domain": domain,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "subdomains": sorted(subdomains),
+            "fqdns": {h: sorted(fqdns[h]) for h in sorted(fqdns)},
+        }, f, ensure_ascii=False)
+    tmp.replace(path)
+
+
+def diff_snapshots(old: Dict[str, List[str]], new: Dict[str, List[str]]) -> List[Dict]:
+    """FQDN → IP の2つの対応から 追加/削除/IP変化 の一覧を作る"""
+    changes: List[Dict] = []
+    for h in sorted(new.keys() - old.keys()):
+        changes.append({"op": "added", "fqdn": h, "ips": sorted(new[h])})
+    for h in sorted(old.keys() - new.keys()):
+        changes.append({"op": "removed", "fqdn": h, "ips": sorted(old[h])})
+    for h in sorted(old.keys() & new.keys()):
+        if set(old[h]) != set(new[h]):
+            changes.append({"op": "changed", "fqdn": h, "ips": sorted(new[h]), "old_ips": sorted(old[h])})
+    return changes
+
+
+# --- 差分スキャン ---
+
+class IncrementalScan:
+    """
+    1ドメインの差分スキャン
+
+    Args:
+        domain: 対象ドメイン
+        state: スナップショットのパス（無ければ全件を「追加」として出す）
+        budget: 再確認と発見を合わせた問い合わせ数の上限（None で無制限）
+    """
+
+    # 一度に作るコルーチン数を抑えるため、再確認はこの件数ずつ行う
+    REVERIFY_BATCH = 2000
+
+    def __init__(
+        self,
+        domain: str,
+        state: Path,
+        budget: Optional[int] = None,
+        shodan_api_key: Optional[str] = None,
+        nameservers: Optional[List[str]] = None,
+        port: int = 53,
+        concurrency: int = 100,
+        rate_per_ns: float = 50.0,
+        wordlist: Optional[Path] = None,
+        resolver: Optional[CachingResolver] = None,
+        zone_walk: bool = True,
+    ) -> None:
+        self.domain = domain.strip().rstrip(".").lower()
+        self.state = Path(state)
+        self.resolver = resolver or CachingResolver()
+        self.pool = ResolverPool(
+            nameservers, port=port, concurrency=concurrency, rate_per_ns=rate_per_ns
+        )
+        self.budget = QueryBudget(self.pool.query, budget)
+        self.concurrency = concurrency
+        self.enumerator = AsyncDomainEnumerator(
+            self.domain, shodan_api_key, concurrency=concurrency, rate_per_ns=rate_per_ns,
+            nameservers=nameservers, port=port, resolver=self.resolver, wordlist=wordlist,
+            query=self.budget.query, charge=self.budget.charge, zone_walk=zone_walk,
+        )
+        self.stats: Dict[str, int] = {}
+
+    async def _lookup(self, name: str, rdtype: str) -> Tuple[str, List[str]]:
+        """キャッシュを通さずに問い合わせ、存在/非存在/不明 を区別する"""
+        try:
+            ans = await self.budget.query(name, rdtype)
+        except dns.resolver.NXDOMAIN:
+            return GONE, []
+        except Exception:
+            # タイムアウト・予算切れは判断しない
+            return UNKNOWN, []
+        if ans.rrset is None:
+            return GONE, []
+        return EXISTS, [str(r).strip() for r in ans]
+
+    async def reverify(self, prev: Dict) -> Tuple[Set[str], Dict[str, List[str]]]:
+        """
+        前回の名前をまとめて再確認する
+
+        FQDNは A/AAAA、サブドメインは NS を問い合わせ、確かに消えたものだけを除く。
+        応答が得られなかった名前は前回の状態のまま残し、片方の種別だけ得られなかった名前は
+        その種別の前回のアドレスを引き継ぐ。
+        """
+        old_fqdns: Dict[str, List[str]] = prev.get("fqdns", {})
+        old_subs: List[str] = prev.get("subdomains", [])
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def look(name: str, rdtype: str) -> Tuple[str, List[str]]:
+            async with sem:
+                return await self._lookup(name, rdtype)
+
+        hosts = sorted(old_fqdns)
+        fqdns: Dict[str, List[str]] = {}
+        for start in range(0, len(hosts), self.REVERIFY_BATCH):
+            batch = hosts[start:start + self.REVERIFY_BATCH]
+            answers = await asyncio.gather(*(look(h, rt) for h in batch for rt in ("A", "AAAA")))
+            for i, h in enumerate(batch):
+                (sa, a), (saaaa, aaaa) = answers[2 * i], answers[2 * i + 1]
+                # A だけ答えて AAAA がタイムアウトした等の場合に、IPv6 が消えたと扱わない
+                if sa == UNKNOWN:
+                    a = [ip for ip in old_fqdns[h] if ":" not in ip]
+                if saaaa == UNKNOWN:
+                    aaaa = [ip for ip in old_fqdns[h] if ":" in ip]
+                if a or aaaa:
+                    fqdns[h] = a + aaaa
+                elif UNKNOWN in (sa, saaaa):
+                    fqdns[h] = list(old_fqdns[h])
+        subs: Set[str] = set()
+        for start in range(0, len(old_subs), self.REVERIFY_BATCH):
+            batch = old_subs[start:start + self.REVERIFY_BATCH]
+            answers = await asyncio.gather(*(look(s, "NS") for s in batch))
+            subs.update(s for s, (status, ns) in zip(batch, answers) if ns or status == UNKNOWN)
+        return subs, fqdns
+
+    async def run(self) -> List[Dict]:
+        prev = load_snapshot(self.state) or {"subdomains": [], "fqdns": {}}
+        start = time.monotonic()
+        subs, verified = await self.reverify(prev)
+        used_verify = self.budget.used
+
+        # 再確認できた名前は発見済みとして、残りの予算で新しい名前だけを探す
+        res = await self.enumerator.arun(known={"subdomains": subs, "fqdns": verified})
+        current: Dict[str, List[str]] = {}
+        new_hosts = [h for h in res["fqdns"] if h not in verified]
+        ips = await asyncio.gather(*(self._ips(h) for h in new_hosts))
+        current.update(verified)
+        current.update(zip(new_hosts, ips))
+
+        changes = diff_snapshots(prev.get("fqdns", {}), current)
+        save_snapshot(self.state, self.domain, set(res["subdomains"]), current)
+        self.stats = {
+            "known": len(prev.get("fqdns", {})),
+            "verify_queries": used_verify,
+            "discovery_queries": self.budget.used - used_verify,
+            "budget_exhausted": int(self.budget.exhausted),
+            "elapsed_ms": int((time.monotonic() - start) * 1000),
+        }
+        for op in ("added", "removed", "changed"):
+            self.stats[op] = sum(1 for c in changes if c["op"] == op)
+        log.info(f"{self.domain}: " + " ".join(f"{k}={v}" for k, v in self.stats.items()))
+        return changes
+
+    async def _ips(self, host: str) -> List[str]:
+        # 発見時の A/AAAA はキャッシュ済みなので通常は問い合わせない
+        a, aaaa = await asyncio.gather(
+            self.resolver.aresolve(host, "A", query=self.budget.query),
+            self.resolver.aresolve(host, "AAAA", query=self.budget.query),
+        )
+        return a + aaaa
+
+
+def write_changes(out: TextIO, domain: str, changes: List[Dict]) -> None:
+    for c in changes:
+        out.write(json.dumps({"domain": domain, **c}, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+async def run_many(
+    domains: List[str], out: TextIO, parallel: int = 10, state_dir: Path = DEFAULT_STATE_DIR, **opts
+) -> Dict[str, int]:
+    """複数ドメインを parallel 件ずつ差分スキャンし、変化を out へ書き出す"""
+    sem = asyncio.Semaphore(parallel)
+    total: Dict[str, int] = {"added": 0, "removed": 0, "changed": 0}
+
+    async def one(domain: str) -> None:
+        async with sem:
+            scan = IncrementalScan(domain, state_path(domain, state_dir), **opts)
+            try:
+                changes = await scan.run()
+            except Exception as e:
+                log.error(f"{domain}: {e}")
+                return
+            write_changes(out, scan.domain, changes)
+            for op in total:
+                total[op] += scan.stats[op]
+
+    await asyncio.gather(*(one(d) for d in domains))
+    return total
+
+
+def main() -> None:
+    import argparse
+
+    from domain2fqdns import shodan_api_key
+    from dns_cache import SHARED_CACHE
+    from metrics import add_metrics_arguments, start_from_args
+    from persistent_cache import add_cache_arguments, open_from_args
+    from scheduler import read_domains
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    p = argparse.ArgumentParser(description="前回結果との差分スキャン")
+    p.add_argument("--domain", help="対象ドメイン")
+    p.add_argument("--input", help="apex ドメイン一覧（1行1件）")
+    p.add_argument("--output", help="差分の JSONL（省略時は標準出力）")
+    p.add_argument("--state-dir", default=str(DEFAULT_STATE_DIR), help="スナップショットの保存先")
+    p.add_argument("--budget", type=int, help="ドメインあたりの問い合わせ数の上限")
+    p.add_argument("--parallel", type=int, default=10, help="同時にスキャンするドメイン数")
+    p.add_argument("--nameservers", help="問い合わせ先（カンマ区切り）")
+    p.add_argument("--concurrency", type=int, default=100, help="ドメインあたりの同時クエリ数")
+    p.add_argument("--wordlist", help="追加で総当たりするラベルのワードリスト")
+    add_cache_arguments(p)
+    add_metrics_arguments(p)
+    args = p.parse_args()
+
+    if args.domain:
+        domains = [args.domain.strip().rstrip(".").lower()]
+    elif args.input:
+        domains = read_domains(Path(args.input))
+    else:
+        p.error("--domain か --input を指定してください")
+
+    store = open_from_args(args)
+    SHARED_CACHE.store = store
+    session = start_from_args(args)
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    nameservers = [x.strip() for x in args.nameservers.split(",")] if args.nameservers else None
+    try:
+        total = asyncio.run(run_many(
+            domains, out, args.parallel, Path(args.state_dir),
+            budget=args.budget, shodan_api_key=shodan_api_key(), nameservers=nameservers,
+            concurrency=args.concurrency, wordlist=args.wordlist,
+        ))
+        log.info(" ".join(f"{k}={v}" for k, v in total.items()))
+    finally:
+        if args.output:
+            out.close()
+        if store is not None:
+            store.close()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数百件の apex ドメインをまとめて列挙するスケジューラ
+
+1つのイベントループで複数の AsyncDomainEnumerator を並行実行する。
+問い合わせ数は全体と権威DNSの事業者ごとに上限を設け、特定事業者の
+レート制限に掛からないようにする。結果はドメインが終わるたびに JSONL へ追記する。
+
+    python src/scheduler.py --input apex.txt --output artifacts/scan.jsonl
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, TextIO
+
+from async_enum import AsyncDomainEnumerator
+from dns_cache import CachingResolver, ResolverPool
+from public_suffix import registrable_domain
+
+log = logging.getLogger(__name__)
+
+
+# ゾーン毎に異なる登録可能ドメインの NS を割り当てる事業者（→ 事業者名）
+PROVIDER_FAMILIES = (
+    # Route 53: ns-1.awsdns-01.org, ns-2.awsdns-33.co.uk, ...（番号はホストゾーン毎に変わる）
+    (re.compile(r"awsdns-\d+\.(?:com|net|org|co\.uk)"), "awsdns"),
+    # Azure DNS: ns1-01.azure-dns.com, ns2-01.azure-dns.net, ...
+    (re.compile(r"azure-dns\.(?:com|net|org|info)"), "azure-dns"),
+    # UltraDNS: pdns1.ultradns.net, pdns2.ultradns.org, ...
+    (re.compile(r"ultradns\.(?:com|net|org|biz|info|co\.uk)"), "ultradns"),
+)
+
+
+def _provider(host: str) -> str:
+    name = registrable_domain(host) or host.rstrip(".").lower()
+    for pattern, family in PROVIDER_FAMILIES:
+        if pattern.fullmatch(name):
+            return family
+    return name
+
+
+def provider_key(nameservers: Iterable[str]) -> str:
+    """
+    NSホスト名から事業者を表すキーを作る（例: ns1.example.co.jp → example.co.jp）
+
+    事業者は NS の登録可能ドメインとし、Route 53（awsdns-NN.com/.net/.org/.co.uk）等の
+    ゾーン毎に異なるドメインの NS を使う事業者は PROVIDER_FAMILIES で1つにまとめる。
+    複数の事業者にまたがる NS の組はそれらを並べたもの全体を1つのキーにする。
+    """
+    keys = sorted({_provider(n) for n in nameservers if n})
+    return ",".join(keys) if keys else "unknown"
+
+
+def read_domains(path: Path) -> List[str]:
+    out: List[str] = []
+    seen: Set[str] = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            d = line.split("#", 1)[0].strip().rstrip(".").lower()
+            if d and d not in seen:
+                seen.add(d)
+                out.append(d)
+    return out
+
+
+def completed_domains(path: Path) -> Set[str]:
+    """既存の出力から完了済みのドメインを読む（再実行時に飛ばす）"""
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("status") == "ok":
+                done.add(rec.get("domain"))
+    return done
+
+
+class Scheduler:
+    """
+    複数ドメインの列挙を1つのイベントループで並行実行する
+
+    Args:
+        out: 結果の書き出し先（JSONL）
+        parallel: 同時に列挙するドメイン数
+        concurrency: 全体の同時クエリ数
+        per_provider: 権威DNS事業者ごとの同時クエリ数
+    """
+
+    def __init__(
+        self,
+        out: TextIO,
+        shodan_api_key: Optional[str] = None,
+        parallel: int = 20,
+        concurrency: int = 500,
+        per_provider: int = 50,
+        nameservers: Optional[List[str]] = None,
+        port: int = 53,
+        wordlist: Optional[Path] = None,
+        resolver: Optional[CachingResolver] = None,
+    ) -> None:
+        self.out = out
+        self.api_key = shodan_api_key
+        self.parallel = parallel
+        self.per_provider = per_provider
+        self.wordlist = wordlist
+        self.resolver = resolver or CachingResolver()
+        self.pool = ResolverPool(nameservers, port=port, concurrency=concurrency)
+        self._provider_sems: Dict[str, asyncio.Semaphore] = {}
+        self.done = 0
+        self.total = 0
+
+    def _provider_query(self, provider: str):
+        sem = self._provider_sems.setdefault(provider, asyncio.Semaphore(self.per_provider))
+
+        async def query(name: str, rdtype: str):
+            async with sem:
+                return await self.pool.query(name, rdtype)
+
+        return query
+
+    async def _provider_of(self, domain: str) -> str:
+        return provider_key(await self.resolver.aresolve(domain, "NS", query=self.pool.query))
+
+    async def scan(self, domain: str) -> Dict[str, object]:
+        start = time.monotonic()
+        provider = await self._provider_of(domain)
+        en = AsyncDomainEnumerator(
+            domain, self.api_key, resolver=self.resolver, wordlist=self.wordlist,
+            query=self._provider_query(provider),
+        )
+        rec: Dict[str, object] = {"domain": domain, "provider": provider}
+        try:
+            rec.update(await en.arun())
+            rec["status"] = "ok"
+        except Exception as e:
+            rec["status"] = "error"
+            rec["error"] = str(e)
+        rec["elapsed_ms"] = int((time.monotonic() - start) * 1000)
+        return rec
+
+    def _write(self, rec: Dict[str, object]) -> None:
+        self.done += 1
+        rec["progress"] = f"{self.done}/{self.total}"
+        self.out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.out.flush()
+        log.info(
+            f"[{self.done}/{self.total}] {rec['domain']}: {rec['status']} "
+            f"{len(rec.get('fqdns', []))} fqdns ({rec['elapsed_ms']} ms, {rec['provider']})"
+        )
+
+    async def run(self, domains: List[str]) -> Dict[str, int]:
+        self.total = len(domains)
+        queue: asyncio.Queue = asyncio.Queue()
+        for d in domains:
+            queue.put_nowait(d)
+        status: Dict[str, int] = defaultdict(int)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    d = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                rec = await self.scan(d)
+                status[rec["status"]] += 1
+                self._write(rec)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.parallel, len(domains)) or 1)))
+        return dict(status)
+
+
+def main() -> None:
+    import argparse
+
+    from domain2fqdns import shodan_api_key
+    from dns_cache import SHARED_CACHE
+    from metrics import add_metrics_arguments, start_from_args
+    from persistent_cache import add_cache_arguments, open_from_args
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    p = argparse.ArgumentParser(description="複数 apex ドメインの一括列挙")
+    p.add_argument("--input", required=True, help="apex ドメイン一覧（1行1件）")
+    p.add_argument("--output", required=True, help="結果の JSONL（追記。完了済みは再実行時に飛ばす）")
+    p.add_argument("--parallel", type=int, default=20, help="同時に列挙するドメイン数")
+    p.add_argument("--concurrency", type=int, default=500, help="全体の同時クエリ数")
+    p.add_argument("--per-provider", type=int, default=50, help="権威DNS事業者ごとの同時クエリ数")
+    p.add_argument("--nameservers", help="問い合わせ先（カンマ区切り）")
+    p.add_argument("--wordlist", help="追加で総当たりするラベルのワードリスト")
+    add_cache_arguments(p)
+    add_metrics_arguments(p)
+    args = p.parse_args()
+
+    out_path = Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    skip = completed_domains(out_path)
+    domains = [d for d in read_domains(Path(args.input)) if d not in skip]
+    if skip:
+        log.info(f"skip {len(skip)} completed domains")
+
+    store = open_from_args(args)
+    SHARED_CACHE.store = store
+    session = start_from_args(args)
+    nameservers = [x.strip() for x in args.nameservers.split(",")] if args.nameservers else None
+    try:
+        with open(out_path, "a", encoding="utf-8") as out:
+            sched = Scheduler(
+                out, shodan_api_key(), parallel=args.parallel, concurrency=args.concurrency,
+                per_provider=args.per_provider, nameservers=nameservers, wordlist=args.wordlist,
+            )
+            log.info(f"done: {asyncio.run(sched.run(domains))}")
+    finally:
+        if store is not None:
+            store.close()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SHODAN API クライアント
+
+キープアライブのセッションを使い回し、トークンバケットで API のレート制限を守りながら
+検索結果の全ページを並行取得する。429/5xx はバックオフして再試行し、
+同じ問い合わせの応答はキャッシュする。
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+BASE_URL = "https://api.shodan.io"
+# /shodan/host/search の1ページあたりの件数
+PAGE_SIZE = 100
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """スレッド間で共有する秒間リクエスト数の制限"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ShodanClient:
+    """
+    SHODAN API クライアント
+
+    Args:
+        api_key: APIキー
+        base_url: APIのURL（テスト時はローカルのモックサーバを指定）
+        rate: 秒間リクエスト数の上限
+        max_workers: ページを並行取得するスレッド数
+        max_pages: 検索で取得する最大ページ数（None で全ページ）
+        max_retries: 429/5xx 時の再試行回数
+        backoff: 再試行の初回待機秒数（以降は倍々）
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = BASE_URL,
+        rate: float = 1.0,
+        max_workers: int = 4,
+        max_pages: Optional[int] = None,
+        max_retries: int = 4,
+        backoff: float = 1.0,
+        timeout: float = 10,
+    ) -> None:
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate)
+        self.max_workers = max_workers
+        self.max_pages = max_pages
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._cache: Dict[Tuple[str, Tuple], Optional[dict]] = {}
+        self._cache_lock = threading.Lock()
+        self.requests = 0
+
+    # --- HTTP ---
+
+    def get(self, path: str, **params) -> Optional[dict]:
+        """GETしてJSONを返す。失敗時は None。同じ (path, params) はキャッシュから返す"""
+        key = (path, tuple(sorted(params.items())))
+        with self._cache_lock:
+            if key in self._cache:
+                return self._cache[key]
+        data = self._fetch(path, params)
+        if data is not None:
+            with self._cache_lock:
+                self._cache[key] = data
+        return data
+
+    def _fetch(self, path: str, params: dict) -> Optional[dict]:
+        url = f"{self.base_url}{path}"
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.requests += 1
+            start = time.perf_counter()
+            try:
+                r = self.session.get(
+                    url, params={"key": self.api_key, **params}, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                log.warning(f"SHODAN {path}: {e}")
+                r = None
+            METRICS.observe_http(
+                "shodan", r.status_code if r is not None else "error", time.perf_counter() - start
+            )
+            if r is not None:
+                if r.status_code == 200:
+                    return r.json()
+                if r.status_code not in RETRY_STATUS:
+                    log.warning(f"SHODAN {path}: HTTP {r.status_code}")
+                    return None
+                retry_after = r.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            if attempt < self.max_retries:
+                time.sleep(delay)
+                delay *= 2
+        log.warning(f"SHODAN {path}: gave up after {self.max_retries + 1} attempts")
+        return None
+
+    # --- API ---
+
+    def dns_domain(self, domain: str) -> Set[str]:
+        """/dns/domain のサブドメイン一覧（全ページ）"""
+        out: Set[str] = set()
+        page = 1
+        while True:
+            data = self.get(f"/dns/domain/{quote(domain)}", page=page)
+            if not data:
+                break
+            for sub in data.get("subdomains") or []:
+                sub = str(sub).strip()
+                if sub:
+                    out.add(f"{sub}.{domain}")
+            if not data.get("more") or (self.max_pages and page >= self.max_pages):
+                break
+            page += 1
+        return out
+
+    def search(self, query: str) -> Iterator[dict]:
+        """/shodan/host/search の全ページの matches を返す。2ページ目以降は並行取得"""
+        first = self.get("/shodan/host/search", query=query, page=1)
+        if not first:
+            return
+        yield from first.get("matches", [])
+        pages = math.ceil(int(first.get("total") or 0) / PAGE_SIZE)
+        if self.max_pages:
+            pages = min(pages, self.max_pages)
+        if pages <= 1:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as ex:
+            futures = [
+                ex.submit(self.get, "/shodan/host/search", query=query, page=p)
+                for p in range(2, pages + 1)
+            ]
+            for f in futures:
+                data = f.result()
+                if data:
+                    yield from data.get("matches", [])
+
+    def hostnames(self, domain: str) -> Set[str]:
+        """ドメインに関係するホスト名候補（hostnames と SSL証明書の CN）を集める"""
+        cands = self.dns_domain(domain)
+        for q in (f"domain:{domain}", f'hostname:"*.{domain}"'):
+            for m in self.search(q):
+                for hn in m.get("hostnames", []) or []:
+                    cands.add(str(hn).strip().rstrip(".").lower())
+                cn = (
+                    m.get("ssl", {})
+                     .get("cert", {})
+                     .get("subject", {})
+                     .get("CN")
+                )
+                if cn:
+                    cands.add(str(cn).strip().rstrip(".").lower())
+        return cands
+
+    def close(self) -> None:
+        self.session.close()
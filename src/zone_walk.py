@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ゾーン全体を少ない問い合わせで取得する高速経路
+
+権威サーバに対して AXFR → NSEC チェーンの辿り → NSEC3 ハッシュ収集と
+オフライン辞書照合 の順に試す。AXFR と NSEC が最後まで辿れた場合は
+ゾーンを列挙し終えたものとして扱い、総当たりを省ける。
+charge（QueryBudget.charge 等）を渡すと各問い合わせを送る前に呼び、
+BudgetExhausted になったらそこまでの結果で打ち切る。
+"""
+
+from __future__ import annotations
+
+import base64
+import bisect
+import logging
+import secrets
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import dns.dnssec
+import dns.flags
+import dns.message
+import dns.name
+import dns.query
+import dns.rcode
+import dns.rdatatype
+import dns.zone
+
+from dns_cache import BudgetExhausted
+from metrics import METRICS, dns_outcome
+
+log = logging.getLogger(__name__)
+
+# A/AAAA/CNAME を持つ名前をホストとして扱う
+HOST_TYPES = {"A", "AAAA", "CNAME"}
+
+Charge = Optional[Callable[[str], None]]
+
+
+class ZoneListing:
+    """
+    高速経路で得たゾーンの名前一覧
+
+    Args:
+        zone: 対象ゾーン
+        method: "axfr" / "nsec" / "nsec3"
+        names: 名前 → その名前に存在するレコード種別
+        complete: ゾーンの全名前を得られたなら True
+    """
+
+    def __init__(
+        self, zone: str, method: str, names: Dict[str, Set[str]], complete: bool
+    ) -> None:
+        self.zone = zone
+        self.method = method
+        self.names = names
+        self.complete = complete
+
+    def hits(self) -> Dict[str, bool]:
+        """
+        ホストまたは委任として扱える名前 → 委任されているか（apex とワイルドカードは除く）
+
+        委任点より下の名前（AXFR に含まれるグルー等）は子ゾーンの名前なので除く。
+        """
+        cuts = {n for n, types in self.names.items() if "NS" in types and n != self.zone}
+        out: Dict[str, bool] = {}
+        for name, types in self.names.items():
+            if name == self.zone or name.startswith("*.") or self._below_cut(name, cuts):
+                continue
+            if "NS" in types:
+                out[name] = True
+            elif types & HOST_TYPES:
+                out[name] = False
+        return out
+
+    def _below_cut(self, name: str, cuts: Set[str]) -> bool:
+        parent = name.partition(".")[2]
+        while parent and parent != self.zone:
+            if parent in cuts:
+                return True
+            parent = parent.partition(".")[2]
+        return False
+
+
+def _norm(name) -> str:
+    return str(name).strip().rstrip(".").lower()
+
+
+def _ask(
+    zone: str, qname: str, rdtype: str, servers: List[str], port: int, timeout: float,
+    charge: Charge = None,
+):
+    """DO ビットつきで順に問い合わせ、最初に得られた応答を返す"""
+    q = dns.message.make_query(qname, rdtype, want_dnssec=True)
+    q.flags &= ~dns.flags.RD
+    for server in servers:
+        if charge is not None:
+            charge(f"{qname} {rdtype}")
+        start = time.perf_counter()
+        try:
+            resp, _ = dns.query.udp_with_fallback(q, server, timeout=timeout, port=port)
+        except Exception as e:
+            METRICS.observe_dns(rdtype, dns_outcome(e), time.perf_counter() - start)
+            log.debug(f"{zone}: {rdtype} {qname} @{server}: {e}")
+            continue
+        outcome = {dns.rcode.NOERROR: "ok", dns.rcode.NXDOMAIN: "nxdomain"}.get(resp.rcode())
+        METRICS.observe_dns(rdtype, outcome or "servfail", time.perf_counter() - start)
+        if outcome:
+            return resp
+    return None
+
+
+# --- AXFR ---
+
+def try_axfr(
+    zone: str, servers: List[str], port: int = 53, timeout: float = 5, charge: Charge = None
+) -> Optional[ZoneListing]:
+    """各権威サーバにゾーン転送を要求し、最初に成功したものを返す"""
+    for server in servers:
+        if charge is not None:
+            charge(f"{zone} AXFR")
+        start = time.perf_counter()
+        try:
+            z = dns.zone.from_xfr(
+                dns.query.xfr(server, zone, port=port, lifetime=timeout, relativize=False),
+                relativize=False,
+            )
+        except Exception as e:
+            # 拒否（REFUSED/NOTAUTH）は TransferError になる
+            METRICS.observe_dns("AXFR", dns_outcome(e), time.perf_counter() - start)
+            log.debug(f"{zone}: AXFR @{server}: {e}")
+            continue
+        METRICS.observe_dns("AXFR", "ok", time.perf_counter() - start)
+        names: Dict[str, Set[str]] = {}
+        for name, node in z.nodes.items():
+            types = {dns.rdatatype.to_text(rds.rdtype) for rds in node.rdatasets}
+            names.setdefault(_norm(name), set()).update(types)
+        log.info(f"{zone}: AXFR @{server}: {len(names)} names")
+        return ZoneListing(zone, "axfr", names, True)
+    return None
+
+
+# --- NSEC ---
+
+def nsec_walk(
+    zone: str,
+    servers: List[str],
+    port: int = 53,
+    timeout: float = 3,
+    max_queries: int = 10_000,
+    charge: Charge = None,
+) -> Optional[ZoneListing]:
+    """NSEC の next を apex に戻るまで辿る。NSEC で署名されていない（compact denial を含む）なら None"""
+    origin = dns.name.from_text(zone)
+    current = origin
+    names: Dict[str, Set[str]] = {}
+    for _ in range(max_queries):
+        try:
+            resp = _ask(zone, current.to_text(), "NSEC", servers, port, timeout, charge)
+        except BudgetExhausted:
+            break
+        if resp is None:
+            break
+        # 委任点では NSEC が権威セクションに入る
+        rd = None
+        for rrset in resp.answer + resp.authority:
+            if rrset.rdtype == dns.rdatatype.NSEC and rrset.name == current:
+                rd = rrset[0]
+                break
+        if rd is None:
+            break
+        types = set(rd.to_text().split()[1:]) - {"RRSIG", "NSEC"}
+        nxt = rd.next
+        # compact denial（Cloudflare 等）は問われた名前ごとに next が \000.<名前> の NSEC を作るので辿れない
+        if nxt.labels[0] == b"\x00" or (current != origin and not types):
+            log.info(f"{zone}: NSEC walk: compact denial, skipped")
+            break
+        names[_norm(current)] = types
+        if nxt == origin:
+            log.info(f"{zone}: NSEC walk: {len(names)} names")
+            return ZoneListing(zone, "nsec", names, True)
+        if _norm(nxt) in names or not nxt.is_subdomain(origin):
+            break
+        current = nxt
+    if not names:
+        return None
+    log.info(f"{zone}: NSEC walk incomplete: {len(names)} names")
+    return ZoneListing(zone, "nsec", names, False)
+
+
+# --- NSEC3 ---
+
+def _b32hex(raw: bytes) -> str:
+    return base64.b32hexencode(raw).decode().rstrip("=")
+
+
+class NSEC3Chain:
+    """収集した NSEC3 レコード（ハッシュ → 次のハッシュ、種別）とパラメータ"""
+
+    def __init__(self) -> None:
+        self.params: Optional[Tuple[int, bytes, int]] = None
+        self.records: Dict[str, Tuple[str, Set[str]]] = {}
+        self._owners: List[str] = []
+        # まだ NSEC3 を得ていない next のハッシュ（空ならチェーンは一周している）
+        self._dangling: Set[str] = set()
+
+    def add(self, owner_hash: str, nxt: str, types: Set[str]) -> None:
+        old = self.records.get(owner_hash)
+        if old is None:
+            bisect.insort(self._owners, owner_hash)
+            self._dangling.discard(owner_hash)
+        self.records[owner_hash] = (nxt, types)
+        if old is not None and old[0] != nxt:
+            # next が変わった（ゾーンが更新された）ときだけ数え直す
+            self._dangling = {n for n, _ in self.records.values() if n not in self.records}
+        elif nxt not in self.records:
+            self._dangling.add(nxt)
+
+    def covered(self, h: str) -> bool:
+        """h が既知の NSEC3 の区間に含まれるなら True（問い合わせ不要）"""
+        if not self._owners:
+            return False
+        owner = self._owners[bisect.bisect_right(self._owners, h) - 1]
+        nxt = self.records[owner][0]
+        if owner < nxt:
+            return owner <= h < nxt
+        # 末尾から先頭へ折り返す区間
+        return h >= owner or h < nxt
+
+    @property
+    def closed(self) -> bool:
+        """全ての next が既知のハッシュを指していればチェーンは一周している（add() で追跡するので O(1)）"""
+        return bool(self.records) and not self._dangling
+
+    def hash(self, name: str) -> str:
+        algorithm, salt, iterations = self.params
+        return dns.dnssec.nsec3_hash(name, salt, iterations, algorithm)
+
+
+def nsec3_collect(
+    zone: str,
+    servers: List[str],
+    port: int = 53,
+    timeout: float = 3,
+    max_queries: int = 2_000,
+    charge: Charge = None,
+) -> Optional[NSEC3Chain]:
+    """
+    存在しない名前の NXDOMAIN 応答から NSEC3 を集める
+
+    問い合わせ前に候補のハッシュを計算し、既知の区間に入るものは送らない。
+    NSEC3 で署名されていなければ None。
+    """
+    chain = NSEC3Chain()
+    sent = 0
+    tries = 0
+    while sent < max_queries and not chain.closed and tries < max_queries * 50:
+        tries += 1
+        qname = f"{secrets.token_hex(6)}.{zone}"
+        if chain.params is not None and chain.covered(chain.hash(qname)):
+            continue
+        sent += 1
+        try:
+            resp = _ask(zone, qname, "A", servers, port, timeout, charge)
+        except BudgetExhausted:
+            break
+        if resp is None:
+            break
+        found = False
+        for rrset in resp.authority:
+            if rrset.rdtype != dns.rdatatype.NSEC3:
+                continue
+            rd = rrset[0]
+            chain.params = (rd.algorithm, rd.salt, rd.iterations)
+            types = set(rd.to_text().split()[5:]) - {"RRSIG"}
+            chain.add(rrset.name.labels[0].decode().upper(), _b32hex(rd.next), types)
+            found = True
+        if not found:
+            break
+    if not chain.records:
+        return None
+    log.info(
+        f"{zone}: NSEC3: {len(chain.records)} hashes in {sent} queries"
+        f"{'' if chain.closed else ' (incomplete)'}"
+    )
+    return chain
+
+
+def nsec3_crack(zone: str, chain: NSEC3Chain, words: Iterable[str]) -> ZoneListing:
+    """辞書の各ラベルをハッシュ化して照合し、一致した名前を返す"""
+    names: Dict[str, Set[str]] = {}
+    apex = chain.hash(zone)
+    if apex in chain.records:
+        names[zone] = chain.records[apex][1]
+    for word in words:
+        name = f"{word}.{zone}"
+        h = chain.hash(name)
+        if h in chain.records:
+            names[name] = chain.records[h][1]
+    complete = chain.closed and len(names) == len(chain.records)
+    log.info(f"{zone}: NSEC3 cracked {len(names)}/{len(chain.records)} hashes")
+    return ZoneListing(zone, "nsec3", names, complete)
+
+
+# --- まとめ ---
+
+def enumerate_zone(
+    zone: str,
+    servers: List[str],
+    port: int = 53,
+    timeout: float = 3,
+    words: Iterable[str] = (),
+    charge: Charge = None,
+) -> Optional[ZoneListing]:
+    """AXFR → NSEC → NSEC3 の順に試し、最初に得られた一覧を返す"""
+    zone = _norm(zone)
+    if not servers:
+        return None
+    try:
+        listing = try_axfr(zone, servers, port, timeout, charge)
+    except BudgetExhausted:
+        return None
+    if listing is not None:
+        return listing
+    listing = nsec_walk(zone, servers, port, timeout, charge=charge)
+    if listing is not None:
+        return listing
+    chain = nsec3_collect(zone, servers, port, timeout, charge=charge)
+    if chain is not None:
+        return nsec3_crack(zone, chain, words)
+    return None
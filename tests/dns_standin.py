@@ -0,0 +1,361 @@
+"""
+テスト/ベンチマーク用のローカル DNS スタンドイン
+
+StandinZoneData にレコードを登録し、StandinServer で 127.0.0.1 の UDP/TCP に公開する。
+遅延・パケットロス・AXFR 許可・NSEC/NSEC3 署名ゾーン・委任（リファーラル）を模擬できる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import random
+import socket
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import dns.dnssec
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+
+class StandinZoneData:
+    """名前→レコード表。ワイルドカード・SOA・NSEC/NSEC3 を扱う最小実装"""
+
+    def __init__(self, ttl: int = 300) -> None:
+        self.ttl = ttl
+        self.records: Dict[Tuple[str, str], List[str]] = {}
+        self.zones: List[str] = []
+        # AXFR を許可するゾーン
+        self.axfr_allowed: Set[str] = set()
+        # ゾーン → "nsec"、"compact"（問われた名前の NSEC をその場で作る）、("nsec3", salt, iterations)
+        self.signed: Dict[str, object] = {}
+        self._names: Set[str] = set()
+        # 空でない中間ノード
+        self._ancestors: Set[str] = set()
+        self._chains: Dict[str, list] = {}
+
+    def add_zone(self, zone: str, soa_minimum: int = 60) -> None:
+        zone = zone.rstrip(".").lower()
+        self.zones.append(zone)
+        self.add(zone, "SOA", f"ns1.{zone}. hostmaster.{zone}. 1 3600 600 86400 {soa_minimum}")
+
+    def add(self, name: str, rdtype: str, value: str) -> None:
+        key = (name.rstrip(".").lower(), rdtype.upper())
+        self.records.setdefault(key, []).append(value)
+        self._names.add(key[0])
+        labels = key[0].split(".")
+        for i in range(1, len(labels)):
+            self._ancestors.add(".".join(labels[i:]))
+        self._chains.clear()
+
+    def remove(self, name: str, rdtype: Optional[str] = None) -> None:
+        """name のレコード（rdtype 指定時はその種別のみ）を消す"""
+        name = name.rstrip(".").lower()
+        for key in [k for k in self.records if k[0] == name and rdtype in (None, k[1])]:
+            del self.records[key]
+        if not any(n == name for n, _ in self.records):
+            self._names.discard(name)
+        self._chains.clear()
+
+    def sign(self, zone: str, mode: str = "nsec", salt: str = "aabbccdd", iterations: int = 1) -> None:
+        zone = zone.rstrip(".").lower()
+        self.signed[zone] = mode if mode in ("nsec", "compact") else ("nsec3", salt, iterations)
+        self._chains.clear()
+
+    def zone_of(self, name: str) -> Optional[str]:
+        best = None
+        for z in self.zones:
+            if name == z or name.endswith("." + z):
+                if best is None or len(z) > len(best):
+                    best = z
+        return best
+
+    def delegation(self, name: str) -> Optional[str]:
+        """name を含む、ゾーン頂点より下で NS を持つ最も上の名前（委任点）"""
+        zone = self.zone_of(name)
+        if zone is None:
+            return None
+        labels = name.split(".")
+        for i in range(len(labels) - len(zone.split(".")) - 1, -1, -1):
+            cut = ".".join(labels[i:])
+            if (cut, "NS") in self.records:
+                return cut
+        return None
+
+    def types_at(self, name: str) -> List[str]:
+        return sorted({t for (n, t) in self.records if n == name})
+
+    def lookup(self, name: str, rdtype: str) -> Tuple[int, List[str]]:
+        name = name.rstrip(".").lower()
+        if (name, rdtype) in self.records:
+            return dns.rcode.NOERROR, self.records[(name, rdtype)]
+        if name in self._names or name in self._ancestors:
+            return dns.rcode.NOERROR, []
+        labels = name.split(".")
+        for i in range(1, len(labels)):
+            wc = "*." + ".".join(labels[i:])
+            if wc in self._names:
+                return dns.rcode.NOERROR, self.records.get((wc, rdtype), [])
+            if ".".join(labels[i:]) in self._names:
+                break
+        return dns.rcode.NXDOMAIN, []
+
+    # --- 署名ゾーン ---
+
+    def _chain(self, zone: str) -> list:
+        """NSEC: 正規順の名前一覧 / NSEC3: ソート済みハッシュ → 名前"""
+        if zone in self._chains:
+            return self._chains[zone]
+        names = [n for n in self._names if self.zone_of(n) == zone]
+        mode = self.signed[zone]
+        if mode == "nsec":
+            chain = sorted(dns.name.from_text(n) for n in names)
+        else:
+            _, salt, iterations = mode
+            chain = sorted((dns.dnssec.nsec3_hash(n, salt, iterations, 1), n) for n in names)
+        self._chains[zone] = chain
+        return chain
+
+    def nsec_rrset(self, zone: str, name: str, covering: bool) -> Optional[dns.rrset.RRset]:
+        """name の NSEC（covering=True なら name を覆う直前の NSEC）"""
+        qname = dns.name.from_text(name)
+        if self.signed[zone] == "compact":
+            # Cloudflare 等の compact denial: next は常に \000.<name>、無い名前の種別は RRSIG NSEC のみ
+            types = " ".join(self.types_at(name) + ["RRSIG", "NSEC"])
+            return dns.rrset.from_text(qname, self.ttl, "IN", "NSEC", f"\\000.{qname} {types}")
+        chain = self._chain(zone)
+        i = bisect.bisect_right(chain, qname) - 1
+        if i < 0 or (not covering and chain[i] != qname):
+            return None
+        owner = chain[i]
+        nxt = chain[(i + 1) % len(chain)]
+        types = " ".join(self.types_at(owner.to_text().rstrip(".")) + ["RRSIG", "NSEC"])
+        return dns.rrset.from_text(owner, self.ttl, "IN", "NSEC", f"{nxt} {types}")
+
+    def nsec3_rrset(self, zone: str, name: str) -> dns.rrset.RRset:
+        """name のハッシュに一致する、または覆う NSEC3"""
+        _, salt, iterations = self.signed[zone]
+        chain = self._chain(zone)
+        h = dns.dnssec.nsec3_hash(name, salt, iterations, 1)
+        i = bisect.bisect_right(chain, (h, "\uffff")) - 1
+        owner_hash, owner = chain[i]
+        next_hash = chain[(i + 1) % len(chain)][0]
+        types = " ".join(self.types_at(owner) + ["RRSIG"])
+        return dns.rrset.from_text(
+            f"{owner_hash.lower()}.{zone}.", self.ttl, "IN", "NSEC3",
+            f"1 0 {iterations} {salt} {next_hash} {types}",
+        )
+
+
+class StandinServer:
+    """
+    UDP/TCP で応答するスタンドインサーバ
+
+    専用スレッドの asyncio ループで動き、遅延は call_later で与えるので
+    高い同時実行数でもスレッドを増やさない。
+    """
+
+    def __init__(
+        self,
+        data: StandinZoneData,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+        referrals: bool = False,
+    ) -> None:
+        self.data = data
+        # True なら RD なしの問い合わせには委任点で権威なしのリファーラルを返す
+        self.referrals = referrals
+        self.latency = latency
+        self.loss = loss
+        self.address = host
+        self.port = port
+        self.queries = 0
+        self._rng = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._transport = None
+        self._tcp_server = None
+
+    # --- 応答生成 ---
+
+    def _answer(self, wire: bytes, tcp: bool) -> Optional[bytes]:
+        self.queries += 1
+        if self.loss and self._rng.random() < self.loss:
+            return None
+        try:
+            q = dns.message.from_wire(wire)
+        except Exception:
+            return None
+        resp = dns.message.make_response(q)
+        resp.flags |= dns.flags.AA
+        if not q.question:
+            return resp.to_wire()
+        qname = q.question[0].name
+        rdtype = q.question[0].rdtype
+        name = qname.to_text().rstrip(".").lower()
+        zone = self.data.zone_of(name)
+        signed = self.data.signed.get(zone)
+        if rdtype == dns.rdatatype.AXFR:
+            return self._axfr(resp, name)
+        if self.referrals and not q.flags & dns.flags.RD:
+            cut = self.data.delegation(name)
+            if cut is not None:
+                return self._referral(resp, cut)
+        if rdtype == dns.rdatatype.NSEC and signed in ("nsec", "compact"):
+            nsec = self.data.nsec_rrset(zone, name, covering=False)
+            if nsec is not None:
+                resp.answer.append(nsec)
+                return resp.to_wire()
+        rcode, values = self.data.lookup(name, dns.rdatatype.to_text(rdtype))
+        resp.set_rcode(rcode)
+        if values:
+            resp.answer.append(
+                dns.rrset.from_text_list(qname, self.data.ttl, "IN", rdtype, values)
+            )
+        elif zone:
+            soa = self.data.records[(zone, "SOA")]
+            resp.authority.append(
+                dns.rrset.from_text_list(zone + ".", self.data.ttl, "IN", "SOA", soa)
+            )
+            if signed and rcode == dns.rcode.NXDOMAIN and q.ednsflags & dns.flags.DO:
+                if signed in ("nsec", "compact"):
+                    resp.authority.append(self.data.nsec_rrset(zone, name, covering=True))
+                else:
+                    resp.authority.append(self.data.nsec3_rrset(zone, zone))
+                    resp.authority.append(self.data.nsec3_rrset(zone, name))
+        out = resp.to_wire(max_size=65535)
+        # UDP は EDNS0 で広告されたペイロード長（無ければ 512）を超えたら TC で返す
+        if not tcp and len(out) > (max(512, q.payload) if q.edns >= 0 else 512):
+            resp.answer = []
+            resp.flags |= dns.flags.TC
+            out = resp.to_wire()
+        return out
+
+    def _referral(self, resp: dns.message.Message, cut: str) -> bytes:
+        resp.flags &= ~dns.flags.AA
+        hosts = self.data.records[(cut, "NS")]
+        resp.authority.append(
+            dns.rrset.from_text_list(cut + ".", self.data.ttl, "IN", "NS", hosts)
+        )
+        for host in hosts:
+            glue = self.data.records.get((host.rstrip(".").lower(), "A"))
+            if glue:
+                resp.additional.append(
+                    dns.rrset.from_text_list(host, self.data.ttl, "IN", "A", glue)
+                )
+        return resp.to_wire()
+
+    def _axfr(self, resp: dns.message.Message, zone: str) -> bytes:
+        if zone not in self.data.axfr_allowed or zone not in self.data.zones:
+            resp.set_rcode(dns.rcode.REFUSED)
+            return resp.to_wire()
+        soa = dns.rrset.from_text_list(
+            zone + ".", self.data.ttl, "IN", "SOA", self.data.records[(zone, "SOA")]
+        )
+        resp.answer.append(soa)
+        for (name, rdtype), values in sorted(self.data.records.items()):
+            if rdtype == "SOA":
+                continue
+            if name == zone or name.endswith("." + zone):
+                resp.answer.append(
+                    dns.rrset.from_text_list(name + ".", self.data.ttl, "IN", rdtype, values)
+                )
+        resp.answer.append(soa)
+        return resp.to_wire()
+
+    # --- 起動・停止 ---
+
+    async def _serve(self, ready: threading.Event) -> None:
+        loop = asyncio.get_running_loop()
+        outer = self
+
+        class UDP(asyncio.DatagramProtocol):
+            def connection_made(self, transport) -> None:
+                self.transport = transport
+
+            def datagram_received(self, wire: bytes, addr) -> None:
+                out = outer._answer(wire, tcp=False)
+                if out is None:
+                    return
+                if outer.latency:
+                    loop.call_later(outer.latency, self.transport.sendto, out, addr)
+                else:
+                    self.transport.sendto(out, addr)
+
+        self._transport, _ = await loop.create_datagram_endpoint(
+            UDP, local_addr=(self.address, self.port)
+        )
+        self.port = self._transport.get_extra_info("sockname")[1]
+        # まとめて送ってくるクライアントの問い合わせを取りこぼさない
+        try:
+            self._transport.get_extra_info("socket").setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20
+            )
+        except OSError:
+            pass
+
+        async def handle_tcp(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                while True:
+                    head = await reader.readexactly(2)
+                    wire = await reader.readexactly(int.from_bytes(head, "big"))
+                    out = self._answer(wire, tcp=True)
+                    if out is None:
+                        break
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    writer.write(len(out).to_bytes(2, "big") + out)
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+                pass
+            finally:
+                writer.close()
+
+        self._tcp_server = await asyncio.start_server(handle_tcp, self.address, self.port)
+        ready.set()
+
+    async def _shutdown(self) -> None:
+        self._transport.close()
+        self._tcp_server.close()
+        # 接続中の TCP ハンドラを止めてからループを閉じる
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def start(self) -> "StandinServer":
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            asyncio.set_event_loop(self._loop)
+            self._loop.create_task(self._serve(ready))
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait(5)
+        return self
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,81 @@
+import json
+
+from asn_db import AsnDatabase, AsnGrouper, is_index
+from fqdn2ips import format_result
+
+TSV = "\n".join([
+    "1.0.0.0\t1.0.0.255\t13335\tUS\tCLOUDFLARENET",
+    "1.0.1.0\t1.0.3.255\t0\tNone\tNot routed",
+    # CIDR 1つに収まらない区間
+    "192.0.2.0\t192.0.2.191\t64500\tJP\tEXAMPLE-NET",
+    "198.51.100.0\t198.51.100.255\t64501\tJP\tEXAMPLE-ISP",
+    "2001:db8::\t2001:db8:0:ffff:ffff:ffff:ffff:ffff\t64502\tDE\tV6-NET",
+    "2001:db8:1::\t2001:db8:1::ff\t64500\tJP\tEXAMPLE-NET",
+]) + "\n"
+
+
+def open_db(tmp_path) -> AsnDatabase:
+    src = tmp_path / "ip2asn-combined.tsv"
+    src.write_text(TSV, encoding="utf-8")
+    return AsnDatabase.open(src, index_dir=tmp_path / "idx")
+
+
+def test_lookup(tmp_path):
+    with open_db(tmp_path) as db:
+        assert len(db) == 5
+        info = db.lookup("1.0.0.1")
+        assert (info.asn, info.as_name, info.country, info.prefix) == (13335, "CLOUDFLARENET", "US", "1.0.0.0/24")
+        assert db.lookup("1.0.0.255").asn == 13335
+        # 未ルーティング区間・区間の間・範囲外・不正な値
+        for ip in ("1.0.2.1", "1.0.4.0", "0.0.0.1", "255.255.255.255", "bogus", "2001:db9::1"):
+            assert db.lookup(ip) is None
+        # 区間内で IP を含む最大の CIDR
+        assert db.lookup("192.0.2.5").prefix == "192.0.2.0/25"
+        assert db.lookup("192.0.2.130").prefix == "192.0.2.128/26"
+        assert db.lookup("2001:db8::1").prefix == "2001:db8::/48"
+        assert db.lookup("2001:db8:1::80").prefix == "2001:db8:1::/120"
+        assert db.lookup("2001:db8:1::100") is None
+        assert db.asn("198.51.100.7") == 64501 and db.asn("10.0.0.1") == 0
+    assert is_index(tmp_path / "idx" / "ip2asn-combined.tsv.idx")
+
+
+def test_open_reuses_index(tmp_path):
+    open_db(tmp_path).close()
+    idx = tmp_path / "idx" / "ip2asn-combined.tsv.idx"
+    mtime = idx.stat().st_mtime_ns
+    with AsnDatabase.open(tmp_path / "ip2asn-combined.tsv", index_dir=tmp_path / "idx") as db:
+        assert db.lookup("198.51.100.1").asn == 64501
+    # 索引を直接開いても同じ
+    with AsnDatabase.open(idx) as db:
+        assert db.lookup("198.51.100.1").asn == 64501
+    assert idx.stat().st_mtime_ns == mtime
+
+
+def test_grouping_and_output(tmp_path):
+    with open_db(tmp_path) as db:
+        g = AsnGrouper()
+        for fqdn, ips in [
+            ("a.example.com", ["192.0.2.1", "2001:db8:1::1"]),
+            ("b.example.com", ["192.0.2.2"]),
+            ("c.example.com", ["198.51.100.1", "10.0.0.1"]),
+        ]:
+            g.add(fqdn, ips, db.lookup_many(ips))
+        out = g.as_dict()
+        assert list(out) == ["AS64500", "AS64501", "unknown"]
+        assert out["AS64500"]["fqdn_count"] == 2
+        assert out["AS64500"]["prefixes"] == {
+            "192.0.2.0/25": ["a.example.com", "b.example.com"],
+            "2001:db8:1::/120": ["a.example.com"],
+        }
+        assert out["unknown"]["prefixes"] == {"10.0.0.1": ["c.example.com"]}
+
+        infos = db.lookup_many(["198.51.100.1", "10.0.0.1"])
+        assert format_result("c.example.com", ["198.51.100.1", "10.0.0.1"], "tsv", infos) == (
+            "c.example.com\t198.51.100.1\tAS64501\t198.51.100.0/24\tEXAMPLE-ISP\tJP\n"
+            "c.example.com\t10.0.0.1\t-"
+        )
+        row = json.loads(format_result("c.example.com", ["198.51.100.1"], "jsonl", infos[:1]))
+        assert row["networks"] == [{
+            "ip": "198.51.100.1", "asn": 64501, "as_name": "EXAMPLE-ISP",
+            "country": "JP", "prefix": "198.51.100.0/24",
+        }]
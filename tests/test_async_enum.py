@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from async_enum import AsyncDomainEnumerator
+from dns_cache import RateLimiter
+from domain2fqdns import DomainEnumerator
+
+# (名前, 型) → 応答。委任先のゾーンとその下の委任を含む
+ZONE = {
+    ("example.test", "A"): ["192.0.2.1"],
+    ("example.test", "NS"): ["ns1.example.test."],
+    ("example.test", "MX"): ["10 mail.example.test.", "20 mx.other.test."],
+    ("ns1.example.test", "A"): ["192.0.2.53"],
+    ("www.example.test", "A"): ["192.0.2.2"],
+    ("mail.example.test", "A"): ["192.0.2.3"],
+    ("dev.example.test", "NS"): ["ns1.example.test."],
+    ("www.dev.example.test", "A"): ["192.0.2.10"],
+    ("smtp.dev.example.test", "AAAA"): ["2001:db8::25"],
+    ("api.dev.example.test", "NS"): ["ns1.example.test."],
+    ("www.api.dev.example.test", "A"): ["192.0.2.11"],
+}
+
+
+def _lookup(host, rtype):
+    return list(ZONE.get((str(host).rstrip(".").lower(), rtype), []))
+
+
+def test_async_matches_sync(monkeypatch):
+    async def aresolve(self, host, rtype, *args, **kwargs):
+        return _lookup(host, rtype)
+
+    monkeypatch.setattr(DomainEnumerator, "_resolve", lambda self, host, rtype, *a, **kw: _lookup(host, rtype))
+    monkeypatch.setattr(AsyncDomainEnumerator, "_aresolve", aresolve)
+    sync = DomainEnumerator("example.test", zone_walk=False).run()
+    concurrent = AsyncDomainEnumerator("example.test", nameservers=["192.0.2.53"], zone_walk=False).run()
+    # 結果は辞書順
+    for res in (sync, concurrent):
+        assert res["subdomains"] == ["api.dev.example.test", "dev.example.test"]
+        assert res["fqdns"] == [
+            "example.test", "mail.example.test", "ns1.example.test", "smtp.dev.example.test",
+            "www.api.dev.example.test", "www.dev.example.test", "www.example.test",
+        ]
+
+
+def test_rate_limiter():
+    async def timed(limiter: RateLimiter, n: int) -> float:
+        start = time.monotonic()
+        for _ in range(n):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    # 最初はバースト分だけ待たずに通し、その後は秒間 rate 件に抑える
+    assert asyncio.run(timed(RateLimiter(50), 50)) < 0.1
+    elapsed = asyncio.run(timed(RateLimiter(100, burst=1), 21))
+    assert 0.18 <= elapsed < 0.5
+    assert asyncio.run(timed(RateLimiter(0), 1000)) < 0.1
@@ -0,0 +1,148 @@
+import dns.resolver
+import pytest
+
+from async_enum import AsyncDomainEnumerator
+from authoritative import AuthoritativeResolver, ServerStats
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+from domain2fqdns import DomainEnumerator
+
+
+def make_zone(second_ns: bool = True) -> StandinZoneData:
+    d = StandinZoneData()
+    d.add_zone("example.test")
+    d.add("example.test", "A", "192.0.2.1")
+    d.add("example.test", "NS", "ns1.example.test.")
+    d.add("ns1.example.test", "A", "127.0.0.1")
+    if second_ns:
+        d.add("example.test", "NS", "ns2.example.test.")
+        d.add("ns2.example.test", "A", "127.0.0.2")
+    d.add("www.example.test", "A", "192.0.2.2")
+    d.add("mail.example.test", "A", "192.0.2.3")
+    for i in range(20):
+        d.add(f"h{i}.example.test", "A", f"192.0.2.{10 + i}")
+    return d
+
+
+def direct(srv: StandinServer, timeout: float = 0.3) -> AuthoritativeResolver:
+    resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port, timeout=timeout, lifetime=1)
+    return AuthoritativeResolver(resolver, port=srv.port, timeout=timeout)
+
+
+def test_prefers_fastest_server():
+    d = make_zone()
+    with StandinServer(d) as fast, StandinServer(d, latency=0.05, host="127.0.0.2", port=fast.port) as slow:
+        auth = direct(fast)
+        for i in range(20):
+            ans = auth.resolve(f"h{i}.example.test", "A")
+            assert [str(r) for r in ans] == [f"192.0.2.{10 + i}"]
+        stats = auth.server_stats()
+        assert list(stats) == ["127.0.0.1", "127.0.0.2"]
+        # 遅いサーバは最初の計測と減衰後の再試行でしか使われない
+        assert stats["127.0.0.2"]["queries"] <= 3
+        assert slow.queries <= 3
+
+
+def test_failover_on_timeout():
+    d = make_zone()
+    with StandinServer(d) as ok, StandinServer(d, loss=1.0, host="127.0.0.2", port=ok.port):
+        auth = direct(ok, timeout=0.2)
+        # 応答しないサーバの方が速いと記録されている状態から始める
+        auth.servers["127.0.0.1"] = ServerStats()
+        auth.servers["127.0.0.1"].srtt = 0.01
+        auth.servers["127.0.0.2"] = ServerStats()
+        auth.servers["127.0.0.2"].srtt = 0.001
+        results = [auth.resolve(n, "A") for n in ("www.example.test", "mail.example.test")]
+        assert [str(r) for r in results[0]] == ["192.0.2.2"]
+        assert [str(r) for r in results[1]] == ["192.0.2.3"]
+        stats = auth.server_stats()
+        assert stats["127.0.0.2"]["timeouts"] == 1
+        assert stats["127.0.0.2"]["srtt_ms"] > stats["127.0.0.1"]["srtt_ms"]
+
+
+def test_referral_and_fallback():
+    parent = make_zone(second_ns=False)
+    parent.add("dev.example.test", "NS", "ns.dev.example.test.")
+    parent.add("ns.dev.example.test", "A", "127.0.0.2")
+    child = StandinZoneData()
+    child.add_zone("dev.example.test")
+    child.add("dev.example.test", "NS", "ns.dev.example.test.")
+    child.add("api.dev.example.test", "A", "192.0.2.50")
+    with StandinServer(parent, referrals=True) as p, StandinServer(child, host="127.0.0.2", port=p.port) as c:
+        auth = direct(p)
+        ans = auth.resolve("api.dev.example.test", "A")
+        assert [str(r) for r in ans] == ["192.0.2.50"]
+        assert auth.zones["dev.example.test"] == ["127.0.0.2"]
+        assert c.queries == 1
+        # ゾーンの分からない名前は再帰リゾルバで解決する
+        with pytest.raises(dns.resolver.NXDOMAIN):
+            auth.resolve("other.invalid", "A")
+        assert "other.invalid" not in auth.zones
+
+
+def test_starts_at_registrable_domain():
+    d = StandinZoneData()
+    for zone, ns in (("co.jp", "ns.registry.test."), ("example.co.jp", "ns1.example.co.jp.")):
+        d.add_zone(zone)
+        d.add(zone, "NS", ns)
+    d.add("ns.registry.test", "A", "127.0.0.1")
+    d.add("ns1.example.co.jp", "A", "127.0.0.1")
+    d.add("www.example.co.jp", "A", "192.0.2.80")
+    with StandinServer(d) as srv:
+        auth = direct(srv)
+        ans = auth.resolve("www.example.co.jp", "A")
+        assert [str(r) for r in ans] == ["192.0.2.80"]
+        # 公開接尾辞（co.jp）のレジストリには NS を問い合わせない
+        assert "co.jp" not in auth.zones and "co.jp" not in auth._not_zones
+        assert "example.co.jp" in auth.zones
+
+
+def test_enumerator_direct_matches_recursive():
+    d = make_zone(second_ns=False)
+    d.add("dev.example.test", "NS", "ns1.example.test.")
+    d.add("www.dev.example.test", "A", "192.0.2.60")
+    with StandinServer(d) as srv:
+        results = []
+        for cls, is_direct in ((DomainEnumerator, False), (DomainEnumerator, True), (AsyncDomainEnumerator, True)):
+            resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port)
+            if cls is AsyncDomainEnumerator:
+                en = cls("example.test", resolver=resolver, nameservers=["127.0.0.1"],
+                         port=srv.port, zone_walk=False, direct=is_direct)
+            else:
+                en = cls("example.test", resolver=resolver, zone_walk=False, direct=is_direct)
+            en.authoritative_port = srv.port
+            results.append(en.run())
+            if is_direct:
+                assert en.authoritative.server_stats()["127.0.0.1"]["queries"] > 0
+        assert results[0] == results[1] == results[2]
+        assert "www.dev.example.test" in results[0]["fqdns"]
+
+
+def test_sync_direct_stages_use_authoritative(tmp_path):
+    # 再帰側は委任しか知らず、名前は権威サーバ（127.0.0.2）にだけある
+    recursive = StandinZoneData()
+    recursive.add_zone("example.test")
+    recursive.add("example.test", "NS", "ns1.example.test.")
+    recursive.add("ns1.example.test", "A", "127.0.0.2")
+    auth = StandinZoneData()
+    auth.add_zone("example.test")
+    auth.add("example.test", "A", "192.0.2.1")
+    auth.add("example.test", "NS", "ns1.example.test.")
+    auth.add("ns1.example.test", "A", "127.0.0.2")
+    auth.add("old-portal.example.test", "A", "192.0.2.2")
+    auth.add("old-portal1.example.test", "A", "192.0.2.3")
+    auth.add("zeta-wl.example.test", "A", "192.0.2.4")
+    ct = tmp_path / "ct.json"
+    ct.write_text('[{"name_value": "old-portal.example.test"}]', encoding="utf-8")
+    wordlist = tmp_path / "words.txt"
+    wordlist.write_text("zeta-wl\n", encoding="utf-8")
+    with StandinServer(recursive) as r, StandinServer(auth, host="127.0.0.2", port=r.port):
+        resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=r.port)
+        en = DomainEnumerator(
+            "example.test", resolver=resolver, zone_walk=False, direct=True,
+            wordlist=wordlist, ct_files=[ct], permute_budget=30,
+        )
+        en.authoritative_port = r.port
+        fqdns = set(en.run()["fqdns"])
+    # CT 候補の検証・ワードリスト総当たり・変形の確認も権威サーバへ問い合わせる
+    assert {"old-portal.example.test", "zeta-wl.example.test", "old-portal1.example.test"} <= fqdns
@@ -0,0 +1,22 @@
+import importlib.util
+from pathlib import Path
+
+from dns_standin import StandinServer
+
+spec = importlib.util.spec_from_file_location(
+    "bench_dns", Path(__file__).resolve().parents[1] / "benchmarks" / "bench_dns.py"
+)
+bench_dns = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_dns)
+
+
+def test_synthetic_zone_and_resolve_scenario():
+    params = {"root": "bench.test", "hosts": 40, "depth": 2, "wildcard": True, "concurrency": 20}
+    data, labels, fqdns = bench_dns.synthetic_zone("bench.test", 40, 2, True)
+    assert len(labels) == len(fqdns) == 40
+    assert fqdns[2] == "h00002.stage.dev.bench.test"
+    with StandinServer(data) as srv:
+        res = bench_dns.run_scenario("resolve", srv.port, params)
+    assert res["found"] == 40
+    assert res["client_queries"] == 2 * (40 + 4)
+    assert res["p50_ms"] <= res["p99_ms"]
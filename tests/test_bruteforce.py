@@ -0,0 +1,53 @@
+import asyncio
+
+from bruteforce import AdaptiveLimiter, BruteforceStage, iter_wordlist
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+
+
+def test_iter_wordlist_filters_invalid(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("www\n# comment\n\nAPI\nbad label\n-dash\ndev.api\n", encoding="utf-8")
+    assert list(iter_wordlist(path)) == ["www", "api", "dev.api"]
+
+
+def test_adaptive_limiter_backs_off_and_grows():
+    async def go():
+        lim = AdaptiveLimiter(initial=100, minimum=10, maximum=200, step=20, interval=10)
+        for _ in range(10):
+            await lim.acquire()
+            await lim.release(failed=True)
+        assert lim.window == 50
+        for _ in range(10):
+            await lim.acquire()
+            await lim.release(failed=False)
+        assert lim.window == 70
+
+    asyncio.run(go())
+
+
+def test_stage_run(tmp_path):
+    d = StandinZoneData()
+    d.add_zone("example.test")
+    d.add("*.example.test", "A", "192.0.2.99")
+    d.add("www.example.test", "A", "192.0.2.1")
+    d.add("mail.example.test", "A", "192.0.2.2")
+    d.add("dev.example.test", "NS", "ns1.dev.example.test.")
+    d.add("dev.example.test", "AAAA", "2001:db8::1")
+    path = tmp_path / "words.txt"
+    path.write_text("www\nmail\ndev\nnope\nbad label\n", encoding="utf-8")
+    with StandinServer(d) as srv:
+        stage = BruteforceStage(
+            path, resolver=CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port),
+            nameservers=["127.0.0.1"], port=srv.port, max_inflight=4,
+        )
+        hits = asyncio.run(stage.run(
+            "example.test",
+            known=lambda h: h == "www.example.test",
+            is_wildcard=lambda ans: ans["A"] == ["192.0.2.99"],
+        ))
+        sent = srv.queries
+    # 発見済みの www は問い合わせず、ワイルドカード応答の nope は NS を引かずに捨てる
+    assert hits == {"mail.example.test": False, "dev.example.test": True}
+    assert stage.queries == sent == 3 + 3 + 2
+    assert stage.failures == 0 and stage.qps > 0
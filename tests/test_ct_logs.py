@@ -0,0 +1,97 @@
+import csv
+import gzip
+import io
+import json
+
+from async_enum import AsyncDomainEnumerator
+from ct_logs import iter_json, iter_records, normalize, scan
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+from domain2fqdns import DomainEnumerator
+from persistent_cache import PersistentCache
+
+# crt.sh の ?output=json と同じ形のレコード
+RECORDS = [
+    {"id": 1, "common_name": "example.test", "name_value": "example.test\nwww.example.test"},
+    {"id": 2, "common_name": "*.dev.example.test", "name_value": "*.dev.example.test\nlegacy.dev.example.test"},
+    {"id": 3, "common_name": "Old-Portal.Example.Test.", "name_value": "old-portal.example.test\nadmin@example.test"},
+    {"id": 4, "common_name": "gone.example.test", "name_value": "gone.example.test"},
+    {"id": 5, "common_name": "www.example.org", "name_value": "www.example.org\nexample.test.evil.net\n192.0.2.1"},
+]
+
+
+def write_dumps(tmp_path):
+    # 整形済みの配列、gzip した JSON Lines、値に改行を含む CSV
+    (tmp_path / "crtsh.json").write_text(json.dumps(RECORDS[:3], indent=2), encoding="utf-8")
+    with gzip.open(tmp_path / "more.jsonl.gz", "wt", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(r) for r in RECORDS[3:]) + "\n")
+    with open(tmp_path / "export.dat", "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["ID", "Common_Name", "Name_Value"])
+        w.writerow([6, "mail.example.test", "mail.example.test\nsmtp.example.test"])
+    return [tmp_path / "crtsh.json", tmp_path / "more.jsonl.gz", tmp_path / "export.dat"]
+
+
+def test_streaming_parsers(tmp_path):
+    assert normalize("*.Dev.Example.Test.") == "dev.example.test"
+    assert normalize("admin@example.test") == normalize("192.0.2.1") == normalize("localhost") == ""
+
+    # 小さな単位で読んでもレコードの途中で切れたものを続けて解析できる
+    text = json.dumps(RECORDS, indent=1)
+    assert list(iter_json(io.StringIO(text), chunk_size=7)) == RECORDS
+    concatenated = "".join(json.dumps(r) for r in RECORDS)
+    assert list(iter_json(io.StringIO(concatenated), chunk_size=5)) == RECORDS
+
+    paths = write_dumps(tmp_path)
+    # 拡張子の無いファイルは先頭の文字で形式を判定する
+    assert [r["id"] for r in iter_records(paths[2])] == ["6"]
+
+    found = scan(paths, ["example.test", "example.org", "dev.example.test"])
+    assert set(found) == {"example.test", "example.org", "dev.example.test"}
+    assert list(found["example.test"]) == [
+        "example.test", "dev.example.test", "legacy.dev.example.test", "gone.example.test",
+        "mail.example.test", "old-portal.example.test", "smtp.example.test", "www.example.test",
+    ]
+    assert list(found["example.org"]) == ["www.example.org"]
+    # 入れ子の対象ドメインにも配下の名前が入る
+    assert list(found["dev.example.test"]) == ["dev.example.test", "legacy.dev.example.test"]
+
+
+def make_zone() -> StandinZoneData:
+    d = StandinZoneData()
+    d.add_zone("example.test")
+    d.add("example.test", "A", "192.0.2.1")
+    d.add("example.test", "NS", "ns1.example.test.")
+    d.add("ns1.example.test", "A", "127.0.0.1")
+    d.add("www.example.test", "A", "192.0.2.2")
+    # 総当たりの語彙に無く、CTログにだけ現れる名前
+    d.add("old-portal.example.test", "A", "192.0.2.3")
+    d.add("legacy.dev.example.test", "AAAA", "2001:db8::4")
+    return d
+
+
+def test_enumerators_use_ct_candidates(tmp_path):
+    paths = write_dumps(tmp_path)
+    with StandinServer(make_zone()) as srv:
+        results = []
+        for cls, kw in (
+            (DomainEnumerator, {}),
+            (AsyncDomainEnumerator, {"nameservers": ["127.0.0.1"], "port": srv.port}),
+        ):
+            resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port)
+            en = cls("example.test", resolver=resolver, zone_walk=False, ct_files=paths, **kw)
+            results.append(en.run())
+        assert results[0] == results[1]
+        # 解決できない名前（gone・mail 等）は加えない
+        assert sorted(results[0]["fqdns"]) == [
+            "example.test", "legacy.dev.example.test", "ns1.example.test",
+            "old-portal.example.test", "www.example.test",
+        ]
+
+        # 取込み済みの候補はダンプを指定しなくても使う
+        store = PersistentCache(tmp_path / "cache.sqlite3")
+        store.put_candidates("ct", "example.test", scan(paths, ["example.test"])["example.test"])
+        resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(store=store), port=srv.port)
+        res = DomainEnumerator("example.test", resolver=resolver, zone_walk=False).run()
+        assert "old-portal.example.test" in res["fqdns"]
+        store.close()
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import dns.exception
+import dns.flags
+import dns.message
+import dns.rrset
+import pytest
+
+from async_enum import AsyncDomainEnumerator
+from dns_backend import RawAnswer, UdpBackend, build_query, parse_response
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+from domain2fqdns import DomainEnumerator
+from fqdn2ips import BatchResolver
+
+
+def make_zone() -> StandinZoneData:
+    d = StandinZoneData()
+    d.add_zone("example.test", soa_minimum=30)
+    d.add("example.test", "A", "192.0.2.1")
+    d.add("example.test", "NS", "ns1.example.test.")
+    d.add("example.test", "MX", "10 mail.example.test.")
+    d.add("example.test", "TXT", '"v=spf1 -all"')
+    d.add("ns1.example.test", "A", "127.0.0.1")
+    d.add("www.example.test", "CNAME", "web.example.test.")
+    d.add("web.example.test", "A", "192.0.2.5")
+    d.add("web.example.test", "AAAA", "2001:db8::5")
+    d.add("mail.example.test", "A", "192.0.2.6")
+    d.add("dev.example.test", "NS", "ns1.example.test.")
+    d.add("www.dev.example.test", "A", "192.0.2.7")
+    # EDNS0 のペイロード長にも収まらず TC になる応答
+    for i in range(100):
+        d.add("big.example.test", "A", f"198.51.100.{i}")
+    for i in range(300):
+        d.add(f"h{i}.example.test", "A", f"10.0.{i >> 8}.{i & 255}")
+    return d
+
+
+def test_wire_format():
+    q = dns.message.from_wire(build_query(0x1234, "www.example.test", 28))
+    assert q.id == 0x1234 and q.flags & dns.flags.RD
+    assert q.question[0].to_text() == "www.example.test. IN AAAA"
+    assert q.payload == 1232
+    assert not dns.message.from_wire(build_query(1, "example.test", 1, rd=False)).flags & dns.flags.RD
+
+    resp = dns.message.make_response(q)
+    resp.answer.append(dns.rrset.from_text("www.example.test.", 300, "IN", "CNAME", "web.example.test."))
+    resp.answer.append(dns.rrset.from_text("web.example.test.", 60, "IN", "AAAA", "2001:db8::5", "::ffff:1.2.3.4"))
+    ans = parse_response(resp.to_wire(), "www.example.test", 28)
+    assert isinstance(ans, RawAnswer)
+    assert sorted(ans) == ["2001:db8::5", "::ffff:1.2.3.4"]
+    # 期限は CNAME を含めた最小の TTL
+    assert 55 < ans.expiration - time.time() <= 60
+
+    # エスケープが要る名前は dnspython に任せ、同じ表記になる
+    resp = dns.message.make_response(dns.message.from_wire(build_query(1, "odd.example.test", 5)))
+    resp.answer.append(dns.rrset.from_text("odd.example.test.", 300, "IN", "CNAME", "a\\032b.example.test."))
+    ans = parse_response(resp.to_wire(), "odd.example.test", 5)
+    assert not isinstance(ans, RawAnswer)
+    assert [str(r) for r in ans] == ["a\\032b.example.test."]
+
+
+def test_matches_dnspython():
+    with StandinServer(make_zone()) as srv:
+        backend = UdpBackend(["127.0.0.1"], port=srv.port, timeout=0.5)
+        ref = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port)
+        raw = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port, backend=backend)
+        questions = [
+            ("example.test", "A"), ("example.test", "NS"), ("example.test", "MX"),
+            ("example.test", "TXT"), ("example.test", "SOA"), ("www.example.test", "CNAME"),
+            ("web.example.test", "AAAA"), ("www.example.test", "MX"), ("nx.example.test", "A"),
+            ("big.example.test", "A"),
+        ]
+        for name, rdtype in questions:
+            assert sorted(raw.resolve(name, rdtype)) == sorted(ref.resolve(name, rdtype)), (name, rdtype)
+        assert len(raw.resolve("big.example.test", "A")) == 100
+        # 否定応答は SOA の minimum でキャッシュされる
+        for name, rdtype in (("nx.example.test", "A"), ("www.example.test", "MX")):
+            expires = raw.cache._data[(name, rdtype)][0]
+            assert expires - ref.cache._data[(name, rdtype)][0] == pytest.approx(0, abs=1)
+            assert expires - raw.cache.clock() == pytest.approx(30, abs=1)
+        assert backend.stats()["truncated"] == 1
+        backend.close()
+
+
+def test_batch_retransmit_and_failover():
+    d = make_zone()
+    with StandinServer(d, loss=0.3, seed=1) as lossy, StandinServer(d, loss=1.0, host="127.0.0.2", port=lossy.port):
+        backend = UdpBackend(["127.0.0.1", "127.0.0.2"], port=lossy.port, timeout=0.1, retries=10)
+        results = {name: res for name, _, res in backend.resolve_many((f"h{i}.example.test", "A") for i in range(300))}
+        assert len(results) == 300
+        for i in range(300):
+            assert list(results[f"h{i}.example.test"]) == [f"10.0.{i >> 8}.{i & 255}"]
+        stats = backend.stats()
+        assert stats["retransmits"] > 0 and stats["timeouts"] == 0
+        # 応答の無いサーバだけに送るとタイムアウトになる
+        dead = UdpBackend(["127.0.0.2"], port=lossy.port, timeout=0.05, retries=1)
+        with pytest.raises(dns.exception.Timeout):
+            dead.query("www.example.test", "A")
+        backend.close()
+        dead.close()
+
+
+def test_async_backends_match():
+    d = make_zone()
+    with StandinServer(d) as srv:
+        names = [f"h{i}.example.test" for i in range(300)] + ["nx.example.test"]
+        engine = BatchResolver(
+            ["127.0.0.1"], concurrency=50, port=srv.port, timeout=0.5,
+            resolver=CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port), backend="udp",
+        )
+
+        async def drain():
+            return {f: ips async for f, ips in engine.stream(names)}
+
+        found = asyncio.run(drain())
+        engine.close()
+        assert found["h7.example.test"] == ["10.0.0.7"] and found["nx.example.test"] == []
+        assert sum(1 for ips in found.values() if ips) == 300
+
+        results = []
+        for cls, kind in ((DomainEnumerator, None), (DomainEnumerator, "udp"), (AsyncDomainEnumerator, "udp")):
+            backend = UdpBackend(["127.0.0.1"], port=srv.port, timeout=0.5) if kind else None
+            resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port)
+            en = cls("example.test", resolver=resolver, zone_walk=False, backend=backend)
+            results.append(en.run())
+            if backend is not None:
+                # 同期版の候補検証は asyncio.run を何度も呼ぶので、ループ毎に登録し直す
+                assert backend.stats()["sent"] > 0 and resolver.backend is backend
+                backend.close()
+        assert results[0] == results[1] == results[2]
+        assert "www.dev.example.test" in results[0]["fqdns"]
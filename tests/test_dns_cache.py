@@ -0,0 +1,74 @@
+import asyncio
+
+from dns_cache import CachingResolver, DNSCache
+from metrics import METRICS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    c = DNSCache(clock=clock)
+    c.put("WWW.Example.com.", "a", ["192.0.2.1"], ttl=30)
+    assert c.get("www.example.com", "A") == ["192.0.2.1"]
+    clock.now = 31
+    assert c.get("www.example.com", "A") is None
+    assert c.stats()["hits"] == 1
+    assert c.stats()["misses"] == 1
+
+
+def test_negative_answer_is_cached():
+    c = DNSCache(clock=FakeClock())
+    c.put("nx.example.com", "AAAA", [], ttl=60)
+    assert c.get("nx.example.com", "AAAA") == []
+    assert c.get("nx.example.com", "A") is None
+
+
+def test_lru_eviction():
+    c = DNSCache(maxsize=2, clock=FakeClock())
+    c.put("a.example.com", "A", ["192.0.2.1"], ttl=60)
+    c.put("b.example.com", "A", ["192.0.2.2"], ttl=60)
+    c.get("a.example.com", "A")
+    c.put("c.example.com", "A", ["192.0.2.3"], ttl=60)
+    assert c.get("b.example.com", "A") is None
+    assert c.get("a.example.com", "A") == ["192.0.2.1"]
+    assert c.stats()["evictions"] == 1
+
+
+def test_coalesced_waits_are_counted_alike():
+    class Answer:
+        rrset = True
+        expiration = float("inf")
+
+        def __iter__(self):
+            return iter(["192.0.2.1"])
+
+    async def slow_query(name, rdtype):
+        await asyncio.sleep(0.05)
+        return Answer()
+
+    async def run():
+        r = CachingResolver(cache=DNSCache())
+        with METRICS.stage("coalesce-test"):
+            results = await asyncio.gather(
+                *(r.aresolve("www.example.com", "A", query=slow_query) for _ in range(3))
+            )
+            await r.aresolve("www.example.com", "A", query=slow_query)
+        return r, results
+
+    r, results = asyncio.run(run())
+    assert results == [["192.0.2.1"]] * 3
+    # 完了待ちの2件はキャッシュ・metrics のどちらでも合流として数える
+    st = r.stats()
+    assert (st["hits"], st["misses"], st["coalesced"]) == (1, 1, 2)
+    assert st["hit_rate"] == 0.75
+    assert METRICS._sum("dns_cache_total", "result", stage="coalesce-test") == {
+        "hit": 1, "miss": 1, "coalesced": 2,
+    }
+    assert METRICS.snapshot()["stages"]["coalesce-test"]["cache_hit_rate"] == st["hit_rate"]
@@ -0,0 +1,63 @@
+import sys
+
+import pytest
+
+import domain2fqdns
+from domain2fqdns import DomainEnumerator
+
+
+def test_wildcard_fingerprint_filter():
+    en = DomainEnumerator("example.com")
+    en.wildcards["dev.example.com"] = {"A": {"192.0.2.99"}, "AAAA": set(), "NS": set()}
+    assert en._matches_wildcard("dev.example.com", {"A": ["192.0.2.99"], "AAAA": []})
+    assert not en._matches_wildcard("dev.example.com", {"A": ["192.0.2.99", "192.0.2.5"]})
+    assert not en._matches_wildcard("dev.example.com", {"NS": ["ns1.dev.example.com."]})
+    # ワイルドカードの無いゾーンでは何も除外しない
+    en.wildcards["example.com"] = {"A": set(), "AAAA": set(), "NS": set()}
+    assert not en._matches_wildcard("example.com", {"A": ["192.0.2.99"]})
+
+
+class StubResolver:
+    def __init__(self, records):
+        self.records = records
+        self.asked = []
+
+    async def aresolve(self, name, rdtype, query=None):
+        self.asked.append((name, rdtype))
+        return self.records.get((name, rdtype), [])
+
+
+def test_validate_candidates_batch():
+    stub = StubResolver({
+        ("www.example.com", "A"): ["192.0.2.1"],
+        ("dev.example.com", "AAAA"): ["2001:db8::1"],
+        ("dev.example.com", "NS"): ["ns1.dev.example.com."],
+        ("example.com", "A"): ["192.0.2.2"],
+        ("example.com", "NS"): ["ns1.example.com."],
+    })
+    en = DomainEnumerator("example.com", resolver=stub)
+    hits = en.validate_candidates(
+        ["WWW.example.com.", "dev.example.com", "nx.example.com", "example.com", "other.org"]
+    )
+    assert hits == {"www.example.com": False, "dev.example.com": True, "example.com": False}
+    # 範囲外の名前は問い合わせない
+    assert not any(name == "other.org" for name, _ in stub.asked)
+
+
+def test_main_closes_session_on_error(monkeypatch):
+    closed = []
+
+    class StubSession:
+        def close(self):
+            closed.append(True)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(domain2fqdns, "start_from_args", lambda args: StubSession())
+    monkeypatch.setattr(domain2fqdns, "domain2fqdns", fail)
+    monkeypatch.setattr(sys, "argv", ["domain2fqdns.py", "--domain", "example.com"])
+    # 列挙中の例外でもセッションを閉じる
+    with pytest.raises(RuntimeError):
+        domain2fqdns.main()
+    assert closed == [True]
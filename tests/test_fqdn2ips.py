@@ -0,0 +1,65 @@
+import asyncio
+import io
+import json
+import socket
+
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+from fqdn2ips import Checkpoint, format_result, run_batch
+
+
+def test_format_result():
+    assert format_result("a.example.com", ["192.0.2.1", "2001:db8::1"]) == (
+        "a.example.com\t192.0.2.1\na.example.com\t2001:db8::1"
+    )
+    assert format_result("b.example.com", []) == "b.example.com\t解決できませんでした"
+    assert json.loads(format_result("a.example.com", ["192.0.2.1"], "jsonl")) == {
+        "fqdn": "a.example.com", "ips": ["192.0.2.1"],
+    }
+
+
+def test_checkpoint_resume(tmp_path):
+    path = tmp_path / "ckpt.txt"
+    ck = Checkpoint(path)
+    ck.mark("a.example.com")
+    ck.close()
+
+    ck = Checkpoint(path)
+    assert "a.example.com" in ck
+    assert "b.example.com" not in ck
+    ck.close()
+
+
+def test_checkpoint_skips_unsettled_names(tmp_path):
+    d = StandinZoneData()
+    d.add_zone("example.test")
+    d.add("www.example.test", "A", "192.0.2.1")
+    d.add("v6.example.test", "AAAA", "2001:db8::1")
+    names = ["www.example.test", "gone.example.test", "v6.example.test"]
+    path = tmp_path / "ckpt.txt"
+
+    def run(port):
+        ck = Checkpoint(path)
+        resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=port)
+        try:
+            asyncio.run(run_batch(
+                names, io.StringIO(), checkpoint=ck, resolver=resolver,
+                nameservers=["127.0.0.1"], port=port, timeout=0.2, lifetime=0.5,
+            ))
+        finally:
+            ck.close()
+        return Checkpoint(path)
+
+    # 応答の無いサーバでは答えが確定しないので、どの名前も完了にしない
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        dead_port = s.getsockname()[1]
+        ck = run(dead_port)
+    assert ck.done == set()
+    ck.close()
+
+    # NXDOMAIN も確定した答えとして完了にする
+    with StandinServer(d) as srv:
+        ck = run(srv.port)
+    assert ck.done == set(names)
+    ck.close()
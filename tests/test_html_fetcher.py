@@ -0,0 +1,87 @@
+import asyncio
+
+import html_fetcher
+from html_fetcher import (
+    VirusTotalScraper, extract_domains, parse_relationship_payload, subdomain_response_pattern,
+)
+
+
+def test_extract_domains():
+    pairs = [
+        ("www.example.com", ""),
+        ("  api.example.com \n", "/gui/domain/api.example.com/relations"),
+        ("", "/gui/domain/dev.example.com/summary"),
+        ("https://link.example.com/", ""),
+        ("example", "/gui/domain/other.org"),
+        (None, None),
+    ]
+    assert extract_domains(pairs, "example.com") == {
+        "www.example.com", "api.example.com", "dev.example.com",
+    }
+
+
+def test_subdomain_response_pattern():
+    pattern = subdomain_response_pattern("example.com")
+    base = "https://www.virustotal.com/ui/domains"
+    assert pattern.search(f"{base}/example.com/subdomains?relationships=resolutions&limit=10")
+    assert pattern.search(f"{base}/example.com/relationships/subdomains")
+    assert pattern.search(f"{base}/example.com/subdomains?cursor=abc")
+    # 他のドメイン・他の一覧は対象外
+    assert not pattern.search(f"{base}/example.org/subdomains")
+    assert not pattern.search(f"{base}/exampleXcom/subdomains")
+    assert not pattern.search(f"{base}/sub.example.com/subdomains")
+    assert not pattern.search(f"{base}/example.com/siblings")
+    assert not pattern.search(f"{base}/example.com/subdomains-extra")
+
+
+def test_parse_relationship_payload():
+    payload = {
+        "data": [
+            {"type": "domain", "id": "www.example.com"},
+            {"type": "domain", "id": "API.Example.com."},
+            {"id": "dev.example.com"},
+            {"type": "ip_address", "id": "mail.example.com"},
+            {"type": "domain", "id": "example.com.evil.net"},
+            {"type": "domain", "id": "notexample.com"},
+            {"type": "domain", "id": ""},
+            "junk",
+        ],
+        "links": {"next": "https://www.virustotal.com/ui/domains/example.com/subdomains?cursor=x"},
+    }
+    assert parse_relationship_payload(payload, "example.com") == {
+        "www.example.com", "api.example.com", "dev.example.com",
+    }
+    assert parse_relationship_payload({}, "example.com") == set()
+    assert parse_relationship_payload(None, "example.com") == set()
+
+
+class StubStore:
+    def __init__(self, cached):
+        self.cached = cached
+        self.asked = []
+
+    def get_candidates(self, source, domain):
+        self.asked.append((source, domain))
+        return self.cached.get(domain)
+
+
+def test_cached_domains_skip_browser(monkeypatch):
+    def no_browser():
+        raise AssertionError("ブラウザを起動した")
+
+    monkeypatch.setattr(html_fetcher, "_load_playwright", no_browser)
+    store = StubStore({"example.com": {"www.example.com", "api.example.com"}, "example.org": set()})
+    scraper = VirusTotalScraper(headless=True, store=store)
+
+    async def collect():
+        return [r async for r in scraper.ascrape_many([" example.com", "example.org", ""])]
+
+    # 取得済みのドメインだけならブラウザを起動せずに返す
+    assert asyncio.run(collect()) == [
+        ("example.com", [{"subdomain": "api.example.com"}, {"subdomain": "www.example.com"}]),
+        ("example.org", []),
+    ]
+    assert ("virustotal", "example.com") in store.asked
+    assert dict(scraper.scrape_many(["example.com"])) == {
+        "example.com": [{"subdomain": "api.example.com"}, {"subdomain": "www.example.com"}],
+    }
@@ -0,0 +1,59 @@
+import argparse
+import json
+
+import dns.exception
+import dns.resolver
+
+from metrics import Metrics, MetricsSession, SnapshotWriter, dns_outcome
+
+
+def test_dns_outcome():
+    assert dns_outcome(None) == "ok"
+    assert dns_outcome(dns.resolver.NXDOMAIN()) == "nxdomain"
+    assert dns_outcome(dns.exception.Timeout()) == "timeout"
+    assert dns_outcome(dns.resolver.NoNameservers()) == "servfail"
+    assert dns_outcome(ValueError()) == "error"
+
+
+def test_stage_snapshot_and_prometheus():
+    m = Metrics()
+    with m.stage("bruteforce"):
+        m.observe_cache(False)
+        m.observe_dns("A", "nxdomain", 0.004)
+        m.observe_cache(True)
+    m.observe_dns("A", "timeout", 3.0)
+    m.observe_http("shodan", 429, 0.2)
+
+    snap = m.snapshot()
+    bf = snap["stages"]["bruteforce"]
+    assert bf["calls"] == 1 and bf["queries"] == 1
+    assert bf["outcomes"] == {"nxdomain": 1}
+    assert bf["cache_hit_rate"] == 0.5
+    assert bf["p99_ms"] == 5.0
+    # 段の外の問い合わせは other に入る
+    assert snap["stages"]["other"]["outcomes"] == {"timeout": 1}
+    assert snap["http"]["shodan"]["status"] == {"429": 1}
+
+    text = m.render_prometheus()
+    assert 'fqdn_dns_queries_total{outcome="nxdomain",rdtype="A",stage="bruteforce"} 1' in text
+    assert 'fqdn_dns_query_seconds_bucket{stage="other",le="+Inf"} 1' in text
+    assert "# TYPE fqdn_http_request_seconds histogram" in text
+
+
+def test_snapshot_writer(tmp_path):
+    m = Metrics()
+    m.observe_dns("A", "ok", 0.01)
+    w = SnapshotWriter(tmp_path / "m.json", interval=60, metrics=m)
+    w.close()
+    assert json.loads((tmp_path / "m.json").read_text())["stages"]["other"]["queries"] == 1
+
+
+def test_profile_goes_to_stderr(capsys):
+    m = Metrics()
+    with m.stage("resolve"):
+        m.observe_dns("A", "ok", 0.01)
+    MetricsSession(argparse.Namespace(profile=True), metrics=m).close()
+    out, err = capsys.readouterr()
+    # 標準出力の結果に混ざらない
+    assert out == ""
+    assert "resolve" in err
@@ -0,0 +1,68 @@
+import random
+
+from name_store import NameTrie
+
+
+def test_set_semantics():
+    t = NameTrie(["www.example.com", "example.com", "www.example.com"])
+    assert len(t) == 2
+    assert "www.example.com" in t
+    assert "example.com" in t
+    assert "com" not in t
+    assert "mail.example.com" not in t
+    assert "" not in t
+    t.discard("example.com")
+    t.discard("nope.example.com")
+    assert len(t) == 1
+    assert list(t) == ["www.example.com"]
+
+
+def test_canonical_order_matches_set():
+    names = {f"h{i}.{z}.example.com" for i in range(500) for z in ("dev", "api")}
+    names |= {"dev.example.com", "example.com", "a.example.com", "z.example.org"}
+    t = NameTrie()
+    for n in random.Random(0).sample(sorted(names), len(names)):
+        t.add(n)
+    assert len(t) == len(names)
+    assert set(t) == names
+    out = list(t)
+    # 親の直後に配下が続き、同じ階層はラベル順
+    assert out.index("dev.example.com") < out.index("h0.dev.example.com")
+    assert out == sorted(names, key=lambda n: n.split(".")[::-1])
+
+
+def test_zone_queries():
+    t = NameTrie([
+        "example.com", "dev.example.com", "www.dev.example.com",
+        "a.b.dev.example.com", "mail.example.com", "other.test",
+    ])
+    assert list(t.under("example.com")) == [
+        "dev.example.com", "a.b.dev.example.com", "www.dev.example.com", "mail.example.com",
+    ]
+    assert list(t.under("dev.example.com", include_self=True))[0] == "dev.example.com"
+    assert list(t.under("nope.example.com")) == []
+    # 中間の b.dev.example.com は登録されていない
+    assert list(t.children("dev.example.com")) == ["www.dev.example.com"]
+    assert t.covers("x.y.dev.example.com")
+    assert t.covers("other.test")
+    assert not t.covers("example.net")
+    assert not t.covers("com")
+    # 最上位の登録名を返す
+    assert t.covering("x.y.dev.example.com") == "example.com"
+    assert t.covering("other.test") == "other.test"
+    assert t.covering("example.net") is None
+
+
+def test_leaf_promotion_and_collapse():
+    t = NameTrie(["dev.example.com"])
+    t.add("www.dev.example.com")
+    assert "dev.example.com" in t
+    assert list(t.children("dev.example.com")) == ["www.dev.example.com"]
+    t.discard("www.dev.example.com")
+    assert list(t) == ["dev.example.com"]
+    assert "www.dev.example.com" not in t
+    t.discard("dev.example.com")
+    assert len(t) == 0
+    assert list(t) == []
+    t.add("dev.example.com")
+    assert list(t) == ["dev.example.com"]
@@ -0,0 +1,87 @@
+import asyncio
+import itertools
+import json
+
+from async_enum import AsyncDomainEnumerator
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+from domain2fqdns import DomainEnumerator
+from name_store import NameBloom
+from permutations import PermutationStage, TokenModel, generate
+
+
+def test_ranked_generation():
+    names = ["dev1.example.com", "api.example.com", "api-staging.example.com", "www.api.example.com"]
+    model = TokenModel(seeds=["prod"])
+    model.update(names, "example.com")
+    assert model.words["api"] == 3 and model.patterns["dash"] == 1 and model.patterns["sub"] == 1
+    # 学んだ語が種の語より先に並ぶ
+    assert [w for w, _ in model.ranked_words()][:2] == ["api", "dev"]
+
+    # 生成は遅延評価で、連番の前後が最初に来る
+    cands = list(itertools.islice(generate(names, model), 4))
+    assert cands == ["dev2.example.com", "dev0.example.com", "dev3.example.com", "api1.example.com"]
+    everything = list(generate(names, model))
+    for expected in ("api-dev.example.com", "dev.api.example.com", "api-prod.example.com", "prod.api.example.com"):
+        assert expected in everything
+    # ハイフンで付ける変形は語の点数が同じなら下位ラベルや連結より先
+    assert everything.index("api-dev.example.com") < everything.index("dev.api.example.com")
+    assert everything.index("dev.api.example.com") < everything.index("apidev.example.com")
+
+
+def test_name_bloom():
+    bloom = NameBloom(capacity=10000, error_rate=0.01)
+    names = [f"h{i}.example.com" for i in range(10000)]
+    added = sum(bloom.add(n) for n in names)
+    assert added == len(bloom) > 9900
+    # 偽陰性は無く、偽陽性はおおむね error_rate 程度
+    assert all(n in bloom for n in names)
+    assert not bloom.add(names[0])
+    false_positives = sum(f"x{i}.example.com" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def make_zone() -> StandinZoneData:
+    d = StandinZoneData()
+    d.add_zone("example.test")
+    d.add("example.test", "A", "192.0.2.1")
+    d.add("example.test", "NS", "ns1.example.test.")
+    d.add("ns1.example.test", "A", "127.0.0.1")
+    d.add("www.example.test", "A", "192.0.2.2")
+    d.add("app1.example.test", "A", "192.0.2.3")
+    d.add("api.example.test", "A", "192.0.2.4")
+    d.add("www-staging.example.test", "A", "192.0.2.5")
+    # 既存の手法では見つからず、上の名前の変形でだけ見つかる名前
+    d.add("app2.example.test", "A", "192.0.2.6")
+    d.add("app4.example.test", "A", "192.0.2.7")
+    d.add("api-staging.example.test", "A", "192.0.2.8")
+    d.add("staging.api.example.test", "AAAA", "2001:db8::9")
+    return d
+
+
+def test_enumerators_permute(tmp_path):
+    with StandinServer(make_zone()) as srv:
+        # 総当たりの語彙に無い名前は CT ログ由来の候補として与える
+        ct = tmp_path / "ct.json"
+        ct.write_text(json.dumps([
+            {"name_value": "api.example.test\napp1.example.test\nwww-staging.example.test"},
+        ]), encoding="utf-8")
+        results = []
+        for cls, kw in (
+            (DomainEnumerator, {}),
+            (AsyncDomainEnumerator, {"nameservers": ["127.0.0.1"], "port": srv.port, "rate_per_ns": 1000}),
+        ):
+            resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port)
+            en = cls("example.test", resolver=resolver, zone_walk=False, ct_files=[ct], permute_budget=300, **kw)
+            results.append(en.run())
+        assert results[0] == results[1]
+        fqdns = set(results[0]["fqdns"])
+        # app4 は見つかった app2 の変形として見つかる
+        assert {"app2.example.test", "app4.example.test", "api-staging.example.test", "staging.api.example.test"} <= fqdns
+
+        # 問い合わせ数はゾーンあたりの上限を越えない
+        resolver = CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port)
+        stage = PermutationStage(resolver, budget=30, batch=8)
+        hits = asyncio.run(stage.run("example.test", ["app1.example.test", "api.example.test"]))
+        assert 0 < stage.queries <= 30
+        assert "app2.example.test" in hits
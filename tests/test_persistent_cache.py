@@ -0,0 +1,28 @@
+from dns_cache import DNSCache
+from persistent_cache import PersistentCache
+
+
+def test_answers_survive_restart(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    store = PersistentCache(path)
+    DNSCache(store=store).put("www.example.com", "A", ["192.0.2.1"], ttl=300)
+    store.close()
+
+    store = PersistentCache(path)
+    assert DNSCache(store=store).get("www.example.com", "A") == ["192.0.2.1"]
+    assert store.stats()["dns_entries"] == 1
+
+
+def test_max_age_overrides_ttl(tmp_path):
+    store = PersistentCache(tmp_path / "cache.sqlite3")
+    store.put_dns("old.example.com", "A", ["192.0.2.1"], ttl=-1)
+    assert store.get_dns("old.example.com", "A") is None
+    store.max_age = 3600
+    assert store.get_dns("old.example.com", "A")[0] == ["192.0.2.1"]
+
+
+def test_candidate_lists(tmp_path):
+    store = PersistentCache(tmp_path / "cache.sqlite3")
+    assert store.get_candidates("shodan", "example.com") is None
+    store.put_candidates("shodan", "example.com", ["b.example.com", "a.example.com"])
+    assert store.get_candidates("shodan", "example.com") == {"a.example.com", "b.example.com"}
@@ -0,0 +1,42 @@
+import asyncio
+import io
+
+import pytest
+
+from pipeline import Pipeline
+
+
+def _pipeline(monkeypatch):
+    pipe = Pipeline("example.test", io.StringIO(), resolve_workers=1)
+    closed = []
+    monkeypatch.setattr(pipe.ip_resolver, "close", lambda: closed.append(True))
+    return pipe, closed
+
+
+def test_run_closes_ip_resolver(monkeypatch):
+    pipe, closed = _pipeline(monkeypatch)
+
+    async def enumerate_(names):
+        await names.put(("www.example.test", "stub"))
+
+    async def resolve(name):
+        return ["192.0.2.1"]
+
+    pipe._enumerate = enumerate_
+    monkeypatch.setattr(pipe.ip_resolver, "resolve", resolve)
+    stats = asyncio.run(pipe.run())
+    assert stats["resolved"] == 1
+    assert closed == [True]
+
+
+def test_run_closes_ip_resolver_on_error(monkeypatch):
+    pipe, closed = _pipeline(monkeypatch)
+
+    async def enumerate_(names):
+        raise RuntimeError("boom")
+
+    pipe._enumerate = enumerate_
+    # 情報源が例外を出しても BatchResolver は閉じる
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipe.run())
+    assert closed == [True]
@@ -0,0 +1,133 @@
+import asyncio
+
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+from rescan import EXISTS, GONE, UNKNOWN, IncrementalScan, QueryBudget, diff_snapshots, load_snapshot
+
+
+def make_zone() -> StandinZoneData:
+    d = StandinZoneData()
+    d.add_zone("example.test")
+    d.add("example.test", "A", "192.0.2.1")
+    d.add("example.test", "NS", "ns1.example.test.")
+    d.add("ns1.example.test", "A", "127.0.0.1")
+    d.add("www.example.test", "A", "192.0.2.2")
+    d.add("mail.example.test", "A", "192.0.2.3")
+    return d
+
+
+def scan(srv: StandinServer, state, budget=None) -> IncrementalScan:
+    s = IncrementalScan(
+        "example.test", state, budget=budget, nameservers=["127.0.0.1"], port=srv.port,
+        resolver=CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port),
+    )
+    s.enumerator.authoritative_port = srv.port
+    return s
+
+
+def test_diff_snapshots():
+    old = {"a": ["1"], "b": ["2"], "c": ["3"]}
+    new = {"a": ["1"], "b": ["4"], "d": ["5"]}
+    assert diff_snapshots(old, new) == [
+        {"op": "added", "fqdn": "d", "ips": ["5"]},
+        {"op": "removed", "fqdn": "c", "ips": ["3"]},
+        {"op": "changed", "fqdn": "b", "ips": ["4"], "old_ips": ["2"]},
+    ]
+
+
+def test_incremental_rescan(tmp_path):
+    state = tmp_path / "example.test.json"
+    d = make_zone()
+    with StandinServer(d) as srv:
+        first = asyncio.run(scan(srv, state).run())
+        assert {c["fqdn"] for c in first if c["op"] == "added"} == {
+            "example.test", "ns1.example.test", "www.example.test", "mail.example.test",
+        }
+        assert load_snapshot(state)["fqdns"]["www.example.test"] == ["192.0.2.2"]
+
+        d.remove("mail.example.test")
+        d.remove("www.example.test", "A")
+        d.add("www.example.test", "A", "192.0.2.20")
+        d.add("smtp.example.test", "A", "192.0.2.4")
+        s = scan(srv, state)
+        changes = asyncio.run(s.run())
+        assert changes == [
+            {"op": "added", "fqdn": "smtp.example.test", "ips": ["192.0.2.4"]},
+            {"op": "removed", "fqdn": "mail.example.test", "ips": ["192.0.2.3"]},
+            {"op": "changed", "fqdn": "www.example.test", "ips": ["192.0.2.20"], "old_ips": ["192.0.2.2"]},
+        ]
+        # 再確認は既知4件の A/AAAA のみ
+        assert s.stats["verify_queries"] == 8
+
+
+def test_budget_keeps_unverified_names(tmp_path):
+    state = tmp_path / "example.test.json"
+    d = make_zone()
+    with StandinServer(d) as srv:
+        asyncio.run(scan(srv, state).run())
+        d.remove("mail.example.test")
+        s = scan(srv, state, budget=2)
+        changes = asyncio.run(s.run())
+    # 予算内で確認できなかった名前は消えたと判断しない
+    assert changes == []
+    assert s.stats["budget_exhausted"] == 1
+
+
+def test_budget_caps_zone_walk(tmp_path):
+    d = make_zone()
+    for i in range(30):
+        d.add(f"h{i:02d}.example.test", "A", f"192.0.2.{100 + i}")
+    d.sign("example.test")
+    with StandinServer(d) as srv:
+        s = scan(srv, tmp_path / "example.test.json", budget=10)
+        asyncio.run(s.run())
+        sent = srv.queries
+    # AXFR と NSEC の辿りも予算に数える
+    assert s.budget.used <= 10
+    assert sent <= s.budget.used
+    assert s.stats["budget_exhausted"] == 1
+
+
+def test_reverify_keeps_unanswered_rdtype(tmp_path):
+    s = IncrementalScan("example.test", tmp_path / "state.json")
+    s.REVERIFY_BATCH = 1
+    pending = [0, 0]
+
+    async def lookup(name, rdtype):
+        pending[0] += 1
+        pending[1] = max(pending)
+        await asyncio.sleep(0)
+        pending[0] -= 1
+        # AAAA だけタイムアウト・予算切れになった
+        if rdtype == "AAAA":
+            return UNKNOWN, []
+        if rdtype == "NS":
+            return (EXISTS, ["ns1.example.test."]) if name == "dev.example.test" else (GONE, [])
+        return EXISTS, {"www.example.test": ["192.0.2.20"]}.get(name, [])
+
+    s._lookup = lookup
+    prev = {"subdomains": ["dev.example.test", "old.example.test"], "fqdns": {
+        "www.example.test": ["192.0.2.2", "2001:db8::2"],
+        "v6.example.test": ["2001:db8::3"],
+    }}
+    subs, fqdns = asyncio.run(s.reverify(prev))
+    assert subs == {"dev.example.test"}
+    assert fqdns == {
+        "www.example.test": ["192.0.2.20", "2001:db8::2"],
+        "v6.example.test": ["2001:db8::3"],
+    }
+    # REVERIFY_BATCH 件（A/AAAA で2問い合わせ）ずつしか同時に作らない
+    assert pending[1] == 2
+    assert diff_snapshots(prev["fqdns"], fqdns) == [
+        {"op": "changed", "fqdn": "www.example.test", "ips": ["192.0.2.20", "2001:db8::2"],
+         "old_ips": ["192.0.2.2", "2001:db8::2"]},
+    ]
+
+
+def test_query_budget():
+    async def query(name, rdtype):
+        return name
+
+    b = QueryBudget(query, 1)
+    assert asyncio.run(b.query("a", "A")) == "a"
+    assert b.exhausted
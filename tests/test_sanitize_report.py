@@ -1,4 +1,9 @@
-from sanitize_report import sanitize
+import io
+import random
+
+import pytest
+
+from sanitize_report import StreamSanitizer, sanitize, sanitize_file
 
 def test_company_redact():
     text = "株式会社テスト"
@@ -15,3 +20,58 @@ def test_domain_redact():
     text = "www.foresight-net.co.jp"
     out = sanitize(text)
     assert "www.example.com" in out
+
+def _stream(text, size, pseudonyms=False):
+    s = StreamSanitizer(pseudonyms)
+    return "".join(s.stream(text[i:i + size] for i in range(0, len(text), size)))
+
+def test_stream_matches_sanitize_on_rule_interactions():
+    cases = [
+        "foo.株式会社X と a.b-株式会社Y y",
+        "1.2株式会社X 株式会社漢a株example.com",
+        "スキャン元IPアドレス: 1.2.3.4\n",
+        "スキャン元IPアドレス:\n 1.2.3.4.foo",
+        "漢1.2.3.4 _1.2.3.4 (1.2.3.4)\n1.2.3.4.5.6.7.8",
+        "..-株式会社1.2.3.4) www.foresight-net.co.jp\n",
+    ]
+    for text in cases:
+        for size in (1, 3, 7, 1000):
+            assert _stream(text, size) == sanitize(text), (text, size)
+
+def test_stream_matches_sanitize_random():
+    toks = ["株式会社", "X", "テスト", "a", "1", "23", ".", "-", " ", "\n", ":", "スキャン元IPアドレス",
+            "漢", "_", "　", "ACME", "1.2.3.4", "example.com", "株"]
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "".join(rng.choice(toks) for _ in range(rng.randint(0, 40)))
+        assert _stream(text, rng.randint(1, 9)) == sanitize(text), text
+
+def test_sanitize_file_strips_like_main(tmp_path):
+    src = tmp_path / "raw.txt"
+    src.write_text("\n\n  サーバ: www.a.co.jp 10.0.0.1  \n\n" * 50 + "\n \n", encoding="utf-8")
+    out = io.StringIO()
+    sanitize_file(src, out, chunk_size=17)
+    assert out.getvalue() == sanitize(src.read_text(encoding="utf-8")).strip()
+
+def test_pseudonyms_are_consistent():
+    text = "www.a.co.jp 10.0.0.1\nmail.a.co.jp 10.0.0.2 a.co.jp\nwww.b.jp 10.0.0.1\nスキャン元IPアドレス: 192.0.2.7"
+    out = _stream(text, 5, pseudonyms=True).splitlines()
+    assert out[0] == "www.example1.com 198.18.0.1"
+    assert out[1] == "mail.example1.com 198.18.0.2 example1.com"
+    assert out[2] == "www.example2.com 198.18.0.1"
+    assert out[3] == "スキャン元IPアドレス: 198.51.100.5"
+
+def test_pseudonyms_follow_registrable_domain():
+    text = "a.co.jp b.co.jp secret-corp.co.jp foo.bar.Secret-Corp.co.jp"
+    out = _stream(text, 4, pseudonyms=True)
+    # 公開接尾辞（co.jp）ではなく組織の単位で別の仮名にし、組織のラベルは残さない
+    assert out == "example1.com example2.com example3.com foo.bar.example3.com"
+    assert "secret-corp.example" not in out
+
+def test_pseudonym_ips_do_not_wrap():
+    alias = StreamSanitizer._ip_alias
+    assert alias(1) == "198.18.0.1"
+    assert alias((1 << 17) - 1) == "198.19.255.255"
+    assert alias(1 << 17) == "240.0.0.0"
+    with pytest.raises(ValueError):
+        alias((1 << 17) + (1 << 28))
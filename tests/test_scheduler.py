@@ -0,0 +1,46 @@
+import json
+
+from public_suffix import PublicSuffixList
+from scheduler import completed_domains, provider_key, read_domains
+
+
+def test_provider_key():
+    assert provider_key(["ns1.example.net.", "ns2.example.net."]) == "example.net"
+    assert provider_key([]) == "unknown"
+    # ccTLD の2階層の接尾辞（co.jp 等）の下は別々の事業者
+    assert provider_key(["ns1.dns.example.co.jp.", "NS2.example.co.jp"]) == "example.co.jp"
+    assert provider_key(["ns1.other.co.jp."]) == "other.co.jp"
+    assert provider_key(["ns1.example.co.uk"]) == "example.co.uk"
+    # 複数の事業者にまたがる組は全体で1つのキー
+    assert provider_key(["ns2.example.net", "ns1.example.co.jp", "ns3.example.net"]) == "example.co.jp,example.net"
+    # Route 53 はホストゾーン毎に awsdns-NN の番号と TLD の違う4台を割り当てる
+    zone_a = ["ns-1204.awsdns-21.org.", "ns-1981.awsdns-55.co.uk.", "ns-236.awsdns-29.com.", "ns-931.awsdns-52.net."]
+    zone_b = ["ns-1536.awsdns-00.co.uk.", "ns-0.awsdns-00.com.", "ns-1024.awsdns-00.org.", "ns-512.awsdns-00.net."]
+    assert provider_key(zone_a) == provider_key(zone_b) == "awsdns"
+    assert provider_key(["ns1-01.azure-dns.com", "ns2-01.azure-dns.net", "ns3-01.azure-dns.org"]) == "azure-dns"
+    assert provider_key(["ns-1.awsdns-01.org", "ns1.example.net"]) == "awsdns,example.net"
+
+
+def test_registrable_domain_rules():
+    psl = PublicSuffixList(["jp", "co.jp", "*.ck", "!www.ck", "東京.jp"])
+    assert psl.registrable("a.b.example.co.jp") == "example.co.jp"
+    assert psl.registrable("co.jp") is None
+    assert psl.registrable("a.b.ck") == "a.b.ck"
+    assert psl.registrable("x.www.ck") == "www.ck"
+    assert psl.registrable("a.xn--1lqs71d.jp") == "a.xn--1lqs71d.jp"
+    # 一覧に無い TLD は1ラベルの接尾辞
+    assert psl.registrable("ns1.example.test") == "example.test"
+
+
+def test_read_domains_and_resume(tmp_path):
+    src = tmp_path / "apex.txt"
+    src.write_text("Example.com.\n# comment\nexample.org  # note\nexample.com\n\n", encoding="utf-8")
+    assert read_domains(src) == ["example.com", "example.org"]
+
+    out = tmp_path / "scan.jsonl"
+    out.write_text(
+        json.dumps({"domain": "example.com", "status": "ok"}) + "\n"
+        + json.dumps({"domain": "example.org", "status": "error"}) + "\n",
+        encoding="utf-8",
+    )
+    assert completed_domains(out) == {"example.com"}
@@ -0,0 +1,70 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from shodan_client import ShodanClient
+
+
+class MockShodan(BaseHTTPRequestHandler):
+    hits = []
+    throttle_once = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body or {}).encode())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        page = int(q.get("page", 1))
+        MockShodan.hits.append((url.path, q.get("query"), page))
+        if url.path == "/dns/domain/example.com":
+            self._send(200, {"subdomains": ["www", "mail"] if page == 1 else ["vpn"], "more": page == 1})
+        elif url.path == "/shodan/host/search":
+            if page == 2 and MockShodan.throttle_once:
+                MockShodan.throttle_once = False
+                return self._send(429)
+            matches = [{"hostnames": [f"h{page}.example.com"]}]
+            if page == 3:
+                matches.append({"ssl": {"cert": {"subject": {"CN": "cert.example.com"}}}})
+            self._send(200, {"total": 250, "matches": matches})
+        else:
+            self._send(404)
+
+
+@pytest.fixture
+def mock_server():
+    MockShodan.hits = []
+    MockShodan.throttle_once = True
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), MockShodan)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_pagination_retry_and_cache(mock_server):
+    client = ShodanClient("k", base_url=mock_server, rate=0, backoff=0.01)
+    names = client.hostnames("example.com")
+    assert {"www.example.com", "mail.example.com", "vpn.example.com"} <= names
+    assert {"h1.example.com", "h2.example.com", "h3.example.com", "cert.example.com"} <= names
+
+    # 429 は再試行される
+    assert MockShodan.hits.count(("/shodan/host/search", "domain:example.com", 2)) == 2
+    n = len(MockShodan.hits)
+    client.hostnames("example.com")
+    assert len(MockShodan.hits) == n
+
+
+def test_non_retryable_error(mock_server):
+    client = ShodanClient("k", base_url=mock_server, rate=0, backoff=0.01)
+    assert client.get("/missing") is None
+    assert len(MockShodan.hits) == 1
@@ -0,0 +1,38 @@
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+spec = importlib.util.spec_from_file_location("bench_startup", ROOT / "benchmarks" / "bench_startup.py")
+bench_startup = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_startup)
+
+
+def test_entry_points_defer_heavy_imports():
+    for module, allowed in [
+        ("domain2fqdns", {"sqlite3"}),
+        ("fqdn2ips", {"sqlite3"}),
+        ("metrics", set()),
+        # VirusTotal の取得は asyncio 上で動くが、playwright はブラウザ起動時まで読まない
+        ("html_fetcher", {"asyncio"}),
+    ]:
+        res = bench_startup.probe_import(module)
+        assert "error" not in res, res
+        assert set(res["heavy"]) <= allowed, (module, res["heavy"])
+        # import しただけではログ出力の設定を変えない
+        assert res["log_handlers"] == 0, module
+
+
+def test_cli_dispatch():
+    run = lambda *args: subprocess.run(
+        [sys.executable, "-m", "src", *args], capture_output=True, text=True, cwd=ROOT
+    )
+    res = run("--help")
+    assert res.returncode == 0 and "resolve" in res.stdout
+    res = run("enum", "--demo", "--domain", "example.com")
+    assert res.returncode == 0
+    assert res.stdout.split() == ["1.", "example.com", "2.", "mx.example.com", "3.", "www.example.com"]
+    res = run("resolve", "--help")
+    assert res.returncode == 0 and res.stdout.startswith("usage: python -m src resolve")
+    assert run("nope").returncode == 2
@@ -0,0 +1,108 @@
+from dns_cache import CachingResolver, DNSCache
+from dns_standin import StandinServer, StandinZoneData
+from domain2fqdns import DomainEnumerator
+from zone_walk import NSEC3Chain, ZoneListing, enumerate_zone, nsec3_collect, nsec3_crack, nsec_walk
+
+
+def make_zone() -> StandinZoneData:
+    d = StandinZoneData()
+    d.add_zone("example.test")
+    d.add("example.test", "A", "192.0.2.1")
+    d.add("example.test", "NS", "ns1.example.test.")
+    d.add("ns1.example.test", "A", "127.0.0.1")
+    d.add("www.example.test", "A", "192.0.2.2")
+    # 辞書にも典型ラベルにも無いホスト
+    d.add("hidden-host.example.test", "A", "192.0.2.9")
+    d.add("_dmarc.example.test", "TXT", '"v=DMARC1"')
+    d.add("dev.example.test", "NS", "ns1.example.test.")
+    return d
+
+
+def enumerator(srv: StandinServer) -> DomainEnumerator:
+    en = DomainEnumerator(
+        "example.test",
+        resolver=CachingResolver(["127.0.0.1"], cache=DNSCache(), port=srv.port),
+    )
+    en.authoritative_port = srv.port
+    return en
+
+
+def test_axfr_skips_bruteforce():
+    d = make_zone()
+    d.axfr_allowed.add("example.test")
+    with StandinServer(d) as srv:
+        en = enumerator(srv)
+        res = en.run()
+        assert "hidden-host.example.test" in res["fqdns"]
+        assert "_dmarc.example.test" not in res["fqdns"]
+        assert res["subdomains"] == ["dev.example.test"]
+        assert "example.test" in en.complete_zones
+        # 列挙済みゾーンでは典型ラベルを問い合わせない
+        assert en.resolver.cache.get("smtp.example.test", "A") is None
+
+
+def test_nsec_walk():
+    d = make_zone()
+    d.sign("example.test", "nsec")
+    with StandinServer(d) as srv:
+        listing = enumerate_zone("example.test", ["127.0.0.1"], srv.port)
+        assert listing.method == "nsec" and listing.complete
+        assert listing.hits() == {
+            "ns1.example.test": False, "www.example.test": False,
+            "hidden-host.example.test": False, "dev.example.test": True,
+        }
+
+
+def test_nsec_walk_stops_on_compact_denial():
+    d = make_zone()
+    d.sign("example.test", "compact")
+    with StandinServer(d) as srv:
+        assert nsec_walk("example.test", ["127.0.0.1"], srv.port) is None
+        # apex の NSEC の next（\000.example.test）を辿らない
+        assert srv.queries == 1
+
+
+def test_nsec3_collect_and_crack():
+    d = make_zone()
+    d.sign("example.test", "nsec3")
+    with StandinServer(d) as srv:
+        chain = nsec3_collect("example.test", ["127.0.0.1"], srv.port)
+        assert chain.closed and len(chain.records) == 6
+        listing = nsec3_crack("example.test", chain, ["www", "dev", "hidden-host", "nope"])
+        assert listing.hits() == {
+            "www.example.test": False, "hidden-host.example.test": False, "dev.example.test": True,
+        }
+        # ns1 と _dmarc が未解読なので列挙済みにはしない
+        assert not listing.complete
+
+
+def test_nsec3_chain_tracks_closure():
+    chain = NSEC3Chain()
+    assert not chain.closed
+    chain.add("A", "C", {"A"})
+    chain.add("E", "A", {"A"})
+    assert not chain.closed
+    chain.add("C", "E", {"NS"})
+    assert chain.closed
+    # 同じレコードを再び受け取っても変わらない
+    chain.add("C", "E", {"NS"})
+    assert chain.closed
+    # next が変わったら数え直す
+    chain.add("C", "D", {"NS"})
+    assert not chain.closed
+    chain.add("D", "E", {"A"})
+    assert chain.closed
+
+
+def test_listing_excludes_names_below_cuts():
+    listing = ZoneListing("example.test", "axfr", {
+        "example.test": {"SOA", "NS"},
+        "ns1.example.test": {"A"},
+        "www.example.test": {"A"},
+        "dev.example.test": {"NS"},
+        "ns.dev.example.test": {"A"},
+        "a.b.dev.example.test": {"AAAA"},
+        "*.example.test": {"A"},
+    }, True)
+    # 委任点より下のグルー等は親ゾーンの FQDN にしない
+    assert listing.hits() == {"ns1.example.test": False, "www.example.test": False, "dev.example.test": True}